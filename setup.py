@@ -48,6 +48,8 @@ setup(
                           'bin/videotagger',
                           'bin/updateFileNames',
                           'bin/MakeMKV_Watchdog',
-                          'bin/Plex_DVR_Watchdog'],
+                          'bin/Plex_DVR_Watchdog',
+                          'bin/transcodeWorker',
+                          'bin/batchTranscode'],
   zip_safe             = False
 )
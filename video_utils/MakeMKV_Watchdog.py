@@ -31,7 +31,12 @@ class MakeMKV_Watchdog( FileSystemEventHandler ):
     else:                                                                           # Else
       self.fileExt = fileExt                                                        # Set fileExt attribute using fileExt keyword value
 
-    self.converter = VideoConverter( **kwargs ) 
+    self.coordinator = kwargs.pop('coordinator', None)                              # If set, files are converted by distributed workers
+    if self.coordinator:
+      self.converter       = None
+      self.converterKwargs = kwargs                                                 # Sent to workers to build their VideoConverter
+    else:
+      self.converter = VideoConverter( **kwargs ) 
     self.Queue     = Queue()                                                         # Initialize queue for sending files to converting thread
     self.Observer  = Observer()                                                      # Initialize a watchdog Observer
     for arg in args:                                                                # Iterate over input arguments
@@ -111,6 +116,24 @@ class MakeMKV_Watchdog( FileSystemEventHandler ):
       prev = curr                                                                   # Set previous size to current size
       curr = os.path.getsize(file)                                                  # Update current size
 
+  def _submit(self, file):
+    """Queue file on coordinator for a worker to convert"""
+
+    self._checkSize( file )                                                   # Wait to make sure file finishes copying/moving
+    self.coordinator.submit( 'transcode', file, callback = self._remoteDone, **self.converterKwargs )
+
+  @sendEMail
+  def _remoteDone(self, job):
+    """Called by coordinator when a worker finishes converting a file"""
+
+    if job.error:
+      self.log.error( 'Failed to convert file on {}: {}'.format(job.worker, job.error) )
+      return
+    out_file, isEpisode = job.result
+    if out_file is not None and isRunning():
+      plexMediaScanner('scan', 'refresh', 
+        section = 'TV Shows' if isEpisode else 'Movies')
+
   @sendEMail
   def _process(self, file):
     self._checkSize( file )                                                   # Wait to make sure file finishes copying/moving
@@ -144,7 +167,10 @@ class MakeMKV_Watchdog( FileSystemEventHandler ):
       except:                                                                   # Catch exception
         continue                                                                # Do nothing
 
-      self._process( file )
+      if self.coordinator:
+        self._submit( file )
+      else:
+        self._process( file )
       self.Queue.task_done() 
 
     self.log.info('MakeMKV watchdog stopped!')
@@ -30,14 +30,21 @@ for cli in ['ffmpeg', 'mediainfo']:
 # Set up event and link event set to SIGINT and SIGTERM
 _sigintEvent  = Event()
 _sigtermEvent = Event()
+_sigCallbacks = []                                                            # Functions to run after SIGINT/SIGTERM; must be safe to call from signal handler
+
+def _run_sig_callbacks():
+  for func in _sigCallbacks:
+    func()
 
 def _handle_sigint(*args, **kwargs):
   _sigintEvent.set()
   log.error('Caught interrupt...')
+  _run_sig_callbacks()
 
 def _handle_sigterm(*args, **kwargs):
   _sigtermEvent.set()
   log.error('Caught terminate...')
+  _run_sig_callbacks()
 
 def isRunning():
   return (not _sigintEvent.is_set()) and (not _sigtermEvent.is_set())
@@ -89,7 +89,8 @@ def fileNameInfo( inFile, info = None ):
 def computeOffset(in1, in2, info1, info2, outDir):
   """Function to get offset between files."""
 
-  memSize = psutil.virtual_memory().total // 4;                                 # Set size to third of total memory
+  mem     = psutil.virtual_memory()
+  memSize = min( mem.total // 4, mem.available // 2 );                          # Set size to quarter of total memory, but no more than half of what is free; avoid swapping
   aLength = memSize / (48000 * 2 * 2) / 2;                                      # Length in seconds is the total memory divided by (48kHz sample rate, times 2 bytes per sample, times 2 channels)
   aLength = timedelta( seconds = aLength);
   in1_audio, in2_audio = [None], [None];                                        # Set up in1_audio and in2_audio as lists with None; used to get output from threads
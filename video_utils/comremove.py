@@ -4,8 +4,9 @@ from datetime import timedelta
 
 from . import config
 from .utils.checkCLI import checkCLI
-from .utils.ffmpeg_utils import getVideoLength, FFMetaData
+from .utils.ffmpeg_utils import getVideoLength, FFMetaData, writeCutList
 from .utils.handlers import RotatingFile
+from .utils.timeline import Timeline
 
 try:
   COMSKIP = checkCLI( 'comskip' )
@@ -14,6 +15,7 @@ except:
   COMSKIP = None
 
 from . import POPENPOOL
+from .utils.subprocPool import PRIORITY_BATCH
 
 #from .utils.subprocManager import SubprocManager;
 
@@ -40,6 +42,8 @@ class ComRemove( object ):
                    Default is to use .ini included in pacakge.
       threads (int): Number of threads comskip is allowed to use
       cpulimit (int): Set limit of cpu usage per thread
+      priority (int): Priority of subprocesses in the POPENPOOL queue;
+                   see video_utils.utils.subprocPool. Default is PRIORITY_BATCH
       verbose  (bool): Depricated
 
     """
@@ -67,12 +71,14 @@ class ComRemove( object ):
     self.threads     = threads                                                             # Set number of threads process will use; default is number of threads in POPENPOOL
     self.comskip_log = comskip_log 
     self.cpulimit    = kwargs.get('cpulimit',    None)
+    self.priority    = kwargs.get('priority',    PRIORITY_BATCH)
     self.verbose     = kwargs.get('verbose',     None)
     self.__outDir    = None
     self.__fileExt   = None
+    self.timeline    = Timeline()                                                          # Stage timing; replaced for each file by VideoConverter
 
   ########################################################
-  def removeCommercials(self, in_file, chapters = False, name = '' ):
+  def removeCommercials(self, in_file, chapters = False, name = '', cutList = False ):
     """
     Main method for commercial identification and removal.
 
@@ -86,6 +92,9 @@ class ComRemove( object ):
                   for FFmpeg.
       name    (str): Name of series or movie (Plex convention). Required
                   if trying to use specific comskip.ini file
+      cutList (bool): Set to leave the input file as is and write a
+                  .cut.ffconcat file that skips commercials when used as
+                  ffmpeg input; see comcutlist(). Ignored if chapters is set
 
     Returns:
       bool
@@ -98,7 +107,8 @@ class ComRemove( object ):
     tmp_Files    = None                                                             # Set the status to True by default
     cut_File     = None
     status       = False
-    edl_file     = self.comskip( in_file, name = name )                             # Attempt to run comskip and get edl file path
+    with self.timeline.span( 'comskip' ):
+      edl_file   = self.comskip( in_file, name = name )                             # Attempt to run comskip and get edl file path
     if edl_file:                                                                    # If eld file path returned
       if os.path.getsize( edl_file ) == 0:                                          # If edl_file size is zero (0)
         status = True                                                               # Set status True
@@ -106,10 +116,15 @@ class ComRemove( object ):
       elif chapters:                                                                # If chapters keyword set
         status = self.comchapter( in_file, edl_file )                               # Generate .chap file
         os.remove(edl_file)                                                         # Delete to edl file
+      elif cutList:                                                                 # Commercials skipped when file is read by transcode
+        status = self.comcutlist( in_file, edl_file )
+        os.remove(edl_file)                                                         # Delete to edl file
       else:                                                                         # Else, actually cut up file to remove commercials
-        tmp_Files  = self.comcut( in_file, edl_file )                               # Run the comcut method to extract just show segments; NOT comercials
+        with self.timeline.span( 'comcut' ):
+          tmp_Files  = self.comcut( in_file, edl_file )                             # Run the comcut method to extract just show segments; NOT comercials
         if tmp_Files:                                                               # If list of tmp_Files returned; None on failure
-          cut_File   = self.comjoin( tmp_Files )                                    # Attempt to join the files and update status using return code from comjoin
+          with self.timeline.span( 'comjoin' ):
+            cut_File = self.comjoin( tmp_Files )                                    # Attempt to join the files and update status using return code from comjoin
         if cut_File:                                                                # If path to output file returned; None on failure
           self.check_size( in_file, cut_File )                                      # Check size to see that not too much removed
           status = True                                                             # Set status to True
@@ -164,7 +179,7 @@ class ComRemove( object ):
                 'universal_newlines' : True}
     else:
       kwargs = {}
-    proc = POPENPOOL.Popen_async(cmd, threads = self.threads, **kwargs)
+    proc = POPENPOOL.Popen_async(cmd, threads = self.threads, priority = self.priority, **kwargs)
 
     if not proc.wait( timeout = 8 * 3600 ):                                     # Wait for 8 hours for comskip to finish; this should be more than enough time
       self.__log.error('comskip NOT finished after 8 hours; killing')
@@ -284,7 +299,7 @@ class ComRemove( object ):
         cmd      = cmdBase + ['-ss', str(segStart), '-t', str(segDura)];        # Append start time and duration to cmdBase to start cuting command;
         cmd     += ['-c', 'copy', outFile];                                     # Append more options to the command
         tmpFiles.append( outFile );                                             # Append temporary output file path to tmpFiles list
-        procs.append( POPENPOOL.Popen_async( cmd, threads=1 ) )                 # Add the command to the SubprocManager queue
+        procs.append( POPENPOOL.Popen_async( cmd, threads=1, priority=self.priority ) ) # Add the command to the POPENPOOL queue
       segStart = comEnd;                                                        # The start of the next segment of the show is the end time of the current commerical break 
       info     = fid.readline();                                                # Read next line from edl file
       fnum    += 1;                                                             # Increment the file number
@@ -304,6 +319,77 @@ class ComRemove( object ):
     os.remove( edl_file );                                                      # Delete the edl file
     return tmpFiles;
 
+  ########################################################
+  def comsegments(self, edl_file, duration = None):
+    """
+    Get show segments, i.e., everything that is NOT a commercial, from .edl file
+
+    Arguments:
+      edl_file (str): Full path of .edl file produced by comskip
+
+    Keyword arguments:
+      duration (float): Duration of the file, in seconds. If set, there is no
+        segment after a commercial that runs to the end of the file
+
+    Returns:
+      list: (start, end) tuples, in seconds, of show segments; end of last
+        segment is None, meaning end of file
+
+    """
+
+    segments = []
+    segStart = 0.0                                                              # Initial start time of the show segment; i.e., the beginning of the recording
+    with open(edl_file, 'r') as fid:
+      for info in fid:
+        if info.strip() == '': continue
+        comStart, comEnd = [float(i) for i in info.split()[:2]]                 # Get the start and ending times of the commercial
+        if comStart > 1.0:                                                      # If the start of the commercial is NOT near the very beginning of the file
+          segments.append( (segStart, comStart) )
+        segStart = comEnd                                                       # The start of the next segment of the show is the end time of the current commerical break 
+    if duration is None or segStart < duration - 1.0:                          # If the last commercial is NOT near the very end of the file
+      segments.append( (segStart, None) )                                       # Show after last commercial
+    return segments
+
+  ########################################################
+  def comcutlist(self, in_file, edl_file):
+    """
+    Write ffmpeg input list that skips commercials instead of cutting the file
+
+    The list uses the concat demuxer with inpoint/outpoint for each show
+    segment, so the transcode reads the source once and no intermediate
+    files are written. As with comcut, segments start on keyframes. The
+    same sanity check as check_size is applied to the duration kept.
+
+    Arguments:
+      in_file (str): Full path of file to run comskip on
+      edl_file (str): Full path of .edl file produced by comskip
+
+    Returns:
+      bool: True if list written, or not needed, False on error
+
+    """
+
+    self.__log.info('Creating list of show segments to skip commercials')
+    total = getVideoLength( in_file )
+    try:
+      segments = self.comsegments( edl_file, duration = total )
+    except Exception as err:
+      self.__log.critical( 'There was an error reading commercials: {}'.format(err) )
+      return False
+
+    kept  = sum( (total if end is None else end) - start for start, end in segments )
+    if not (1.1 > kept / total > 0.5):
+      self.__log.info(
+        'Show duration looked odd (too long/too short); keeping commercials: {:0.0f} s -> {:0.0f} s'.format(
+          total, kept )
+      )
+      return True
+
+    cutFile = os.path.splitext( in_file )[0] + '.cut.ffconcat'
+    writeCutList( cutFile, in_file, segments )
+    self.__log.info( 'Keeping {:0.0f} s of {:0.0f} s in {} segments'.format(kept, total, len(segments)) )
+    return True
+
   ########################################################
   def comjoin(self, tmpFiles):
     """
@@ -325,7 +411,7 @@ class ComRemove( object ):
     outFile = 'tmp_nocom.{}'.format(self.__fileExt);                                    # Output file name for joined file
     outFile = os.path.join(self.__outDir, outFile);                                     # Output file path for joined file
     cmd     = self._comjoin + [inFiles, '-c', 'copy', '-map', '0', outFile];            # Command for joining files
-    proc    = POPENPOOL.Popen_async( cmd )                                              # Run the command
+    proc    = POPENPOOL.Popen_async( cmd, priority = self.priority )                    # Run the command
     proc.wait()
     for file in tmpFiles:                                                       # Iterate over the input files
       self.__log.debug('Deleting temporary file: {}'.format(file));               # Debugging information 
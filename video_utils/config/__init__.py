@@ -3,7 +3,7 @@ import os, stat, yaml
 import argparse
 
 from ..version import __version__
-from ..utils.threadCheck import HALFTHREADS
+from ..utils.threadCheck import HALFTHREADS, MAXTHREADS
 
 PKGNAME  = __name__.split('.')[0]                                                        # Get root name of package 
 HOME     = os.path.expanduser('~')
@@ -68,6 +68,18 @@ MakeMKVFMT = {
                   stat.S_IROTH | stat.S_IWOTH
 }
 
+workerFMT  = {
+  'file'        : os.path.join( LOGDIR, 'transcodeWorker.log'),
+  'name'        : 'worker',
+  'level'       : logging.DEBUG,
+  'formatter'   : logging.Formatter( 
+                '%(levelname)-.4s - %(asctime)s - %(name)s.%(funcName)-15.15s - %(message)s',
+                '%Y-%m-%d %H:%M:%S'),
+  'permissions' : stat.S_IREAD | stat.S_IWRITE | stat.S_IEXEC | \
+                  stat.S_IRGRP | stat.S_IWGRP  | \
+                  stat.S_IROTH | stat.S_IWOTH
+}
+
 # do NOT use opensubtitles info in other programs, register for your own
 opensubtitles = {
   'url'        : 'https://api.opensubtitles.org:443/xml-rpc',
@@ -89,12 +101,48 @@ BASEPARSER = argparse.ArgumentParser(
 )                                                                                       # Initialize base parser
 BASEPARSER.add_argument("-t", "--threads",   type   = int, default=HALFTHREADS,      help = "Set number of CPUs to use.");
 BASEPARSER.add_argument("-c", "--cpulimit",  type   = int, default=75,               help = "Set to limit CPU usage. Set to 0 to disable CPU limiting. Has no effect if cpulimit CLI is not installed.")
+BASEPARSER.add_argument("--chunks",          type   = int, default=1,                help = "Set to split each video into this many segments that are transcoded at the same time; useful on machines with many CPUs. The --threads are divided between the segments.")
+BASEPARSER.add_argument("--checkpoint",      type   = float, default=0,              help = "Set to write each encode as segments of this many seconds (e.g., 300) so an interrupted encode resumes after the last finished segment instead of starting over. Not used with --chunks.")
+BASEPARSER.add_argument("--cache",           action = "store_true",                  help = "Set to keep transcoded files in a cache, so an identical source converted with the same settings is linked into place instead of encoded again; see TRANSCODE_CACHE_* in the settings file.")
+BASEPARSER.add_argument("--remux",           action = "store_true",                  help = "Set to copy the video stream, instead of re-encoding it, when the source already has the target codec, profile, level, and bit rate; e.g., many DVR recordings. Finishes in seconds instead of hours.")
+BASEPARSER.add_argument("--renditions",      type   = int, nargs = "+",           help = "Set to also create lower resolution copies of each video at these heights (e.g., 720 480), encoded from the same decode as the main output. Cannot be used with --chunks, --tune, --checkpoint, --cache, or --remux.")
+BASEPARSER.add_argument("--tune",            action = "store_true",                  help = "Set to choose the encoder preset for each video by encoding short samples with several presets; see TUNE_* in the settings file for targets.")
+BASEPARSER.add_argument("--trace",           action = "store_true",                  help = "Set to also write the time, CPU, and disk I/O of each stage of every file in Chrome trace format (open in chrome://tracing or Perfetto), next to the JSON timeline in the timelines directory beside the transcode log.")
+BASEPARSER.add_argument("--adaptive",        action = "store_true",                  help = "Set to adjust the total number of CPUs used by all processes based on system load; e.g., back off while other programs are busy.")
+BASEPARSER.add_argument("--min-threads",     type   = int, default=1,                help = "Lowest total number of CPUs to use when --adaptive is set.")
+BASEPARSER.add_argument("--max-threads",     type   = int, default=MAXTHREADS,       help = "Highest total number of CPUs to use when --adaptive is set.")
+BASEPARSER.add_argument("--listen",          type   = str,                           help = "Set to [HOST:]PORT to queue files for transcodeWorker processes, possibly on other machines, instead of converting them here.")
+BASEPARSER.add_argument("--authkey",         type   = str,                           help = "Shared key for --listen and transcodeWorker; default is WORKER_AUTHKEY from environment or settings file.")
 BASEPARSER.add_argument("--lang",            type   = str, default='eng', nargs='+', help = "Set audio and subtitle language(s) using three (3) character codes (ISO 639-2). For multiple langauges, seperate using spaces; e.g., '--lage eng fra' for English and French.")
 BASEPARSER.add_argument("--no-remove",       action = "store_true",                  help = "Set to disbale removing input file after transcode. Default is to delete soruce file.")
 BASEPARSER.add_argument("--no-srt",          action = "store_true",                  help = "Set to disbale conversion of VobSub(s) to SRT")
 BASEPARSER.add_argument("--loglevel",        type   = int,                           help = "Set logging level")
 BASEPARSER.add_argument('--version',         action = 'version', version = '%(prog)s '+__version__)
 
+def renditionConflicts( chunks = 1, tune = False, checkpoint = None, cache = False, remux = False ):
+  """
+  Return names of options that cannot be used with renditions
+
+  All renditions are written by one ffmpeg command from one decode, so the
+  encode is never split, tuned, checkpointed, cached, or remuxed.
+
+  Returns:
+    list: Command line names of options that are set
+
+  """
+
+  opts = (('--chunks', chunks and chunks > 1), ('--tune', tune), ('--checkpoint', checkpoint),
+          ('--cache', cache), ('--remux', remux))
+  return [name for name, val in opts if val]
+
+def checkArgs( parser, args ):
+  """Exit with usage message if options from BASEPARSER that cannot be used together are set"""
+
+  if args.renditions:
+    conflicts = renditionConflicts( args.chunks, args.tune, args.checkpoint, args.cache, args.remux )
+    if conflicts:
+      parser.error( '--renditions cannot be used with {}'.format( ', '.join(conflicts) ) )
+
 def getComskipLog(progName, logdir = None):
   if logdir is None: logdir = LOGDIR
   return os.path.join( logdir, '{}_Comskip.log'.format(progName) )
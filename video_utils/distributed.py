@@ -0,0 +1,389 @@
+import logging
+
+import os, time, socket, itertools
+from collections import deque
+from threading import Thread, Lock, Condition, Event
+from multiprocessing.connection import Listener, Client
+
+from . import isRunning
+from .config import CONFIG
+
+PORT    = 52425                                                                         # Default port for coordinator
+POLL    =  5.0                                                                          # Seconds a worker waits for a job before asking again
+RETRY   = 30.0                                                                          # Seconds between attempts to reconnect to coordinator
+AUTHKEY = os.environ.get('WORKER_AUTHKEY', CONFIG.get('WORKER_AUTHKEY', None))          # Shared secret for coordinator and workers
+
+def parseAddress( address ):
+  """
+  Convert 'host:port', 'host', or ':port' string to (host, port) tuple
+
+  Arguments:
+    address (str): Address to parse
+
+  Keyword arguments:
+    None
+
+  Returns:
+    tuple: Host and port; host is empty (all interfaces) and port is PORT
+      if not given
+
+  """
+
+  if isinstance(address, tuple): return address
+  host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+  return (host, int(port) if port else PORT)
+
+def _authkey( authkey ):
+  """Return authentication key as bytes; raise exception if not set"""
+
+  if authkey is None: authkey = AUTHKEY
+  if not authkey:
+    raise Exception( 'No authentication key set for coordinator/workers; use WORKER_AUTHKEY' )
+  return authkey.encode() if isinstance(authkey, str) else authkey
+
+########################################################################################
+def _transcode( file, **kwargs ):
+  """Job run on worker for MakeMKV_Watchdog; returns output file and if episode"""
+
+  from .videoconverter import VideoConverter
+  converter = VideoConverter( **kwargs )
+  outFile   = converter.transcode( file )
+  isEpisode = converter.metaData.isEpisode if converter.metaData else False
+  return outFile, isEpisode
+
+def _dvr( file, **kwargs ):
+  """Job run on worker for Plex_DVR_Watchdog; returns status and output file"""
+
+  from .plex.DVRconverter import DVRconverter
+  return DVRconverter( **kwargs ).convert( file )
+
+JOBTYPES = {'transcode' : _transcode,
+            'dvr'       : _dvr}                                                         # Functions workers can run, by name
+
+########################################################################################
+class Job( object ):
+  """A file queued on the Coordinator"""
+
+  _ids = itertools.count(1)
+
+  def __init__(self, jobType, file, kwargs, callback = None):
+    self.id       = next(self._ids)
+    self.jobType  = jobType
+    self.file     = file
+    self.kwargs   = kwargs
+    self.callback = callback
+    self.worker   = None                                                                # Name of worker running the job
+    self.progress = None                                                                # Last message logged by worker
+    self.result   = None                                                                # Value returned by the job function
+    self.error    = None                                                                # Error message if job failed
+    self.__done   = Event()
+
+  def __repr__(self):
+    return '<Job {} : {}>'.format( self.id, self.file )
+
+  def done(self):
+    """Return True if job finished or failed"""
+
+    return self.__done.is_set()
+
+  def wait(self, timeout = None):
+    """Wait for job to finish; returns False on timeout"""
+
+    return self.__done.wait( timeout = timeout )
+
+  def _finish(self, result = None, error = None):
+    self.result, self.error = result, error
+    self.__done.set()
+    if self.callback:
+      try:
+        self.callback( self )
+      except:
+        logging.getLogger(__name__).exception( 'Error in callback for {}'.format(self) )
+
+########################################################################################
+class Coordinator( Thread ):
+  """
+  Queue of files to convert that is served to Worker processes
+
+  The coordinator listens on a socket (multiprocessing.connection, so all
+  messages are authenticated with a shared key) and hands jobs to workers as
+  they ask for them, so faster machines simply take more jobs. Workers send
+  back log messages while a job runs, and the value returned when it finishes.
+  If a worker disconnects, or is stopped, while running a job, the job is put
+  back at the front of the queue for another worker.
+
+  All machines must see input and output files at the same paths; e.g., an
+  NFS-mounted library.
+
+  """
+
+  def __init__(self, address = None, authkey = None):
+    """
+    Keyword arguments:
+      address (str,tuple): Address to listen on as 'host:port' string or
+        (host, port) tuple; default is all interfaces on PORT
+      authkey (str,bytes): Shared key for workers; default is AUTHKEY
+
+    Returns:
+      Coordinator instance; thread is started automatically
+
+    """
+
+    super().__init__( daemon = True )
+    self.__log      = logging.getLogger(__name__)
+    self.__listener = Listener( parseAddress( address or ('', PORT) ), authkey = _authkey( authkey ) )
+    self.__queue    = deque()                                                           # Jobs waiting for a worker
+    self.__running  = {}                                                                # Jobs running, by job id
+    self.__workers  = set()                                                             # Names of connected workers
+    self.__cond     = Condition()
+    self.__closed   = Event()
+    self.start()
+
+  @property
+  def address(self):
+    """Address the coordinator is listening on"""
+
+    return self.__listener.address
+
+  @property
+  def workers(self):
+    """Names of connected workers"""
+
+    with self.__cond:
+      return sorted( self.__workers )
+
+  def submit(self, jobType, file, callback = None, **kwargs):
+    """
+    Queue a file for conversion on a worker
+
+    Arguments:
+      jobType (str): Type of job; key in JOBTYPES
+      file (str): Path to file to convert
+
+    Keyword arguments:
+      callback: Function called with the Job instance when it finishes
+      **kwargs: Keyword arguments for the converter on the worker
+
+    Returns:
+      Job: Use the wait() method to wait for the job to finish
+
+    """
+
+    if jobType not in JOBTYPES:
+      raise Exception( 'Unknown job type: {}'.format(jobType) )
+    job = Job( jobType, file, kwargs, callback )
+    with self.__cond:
+      self.__queue.append( job )
+      self.__cond.notify_all()
+    self.__log.info( 'Queued for workers: {}'.format(file) )
+    return job
+
+  def close(self):
+    """Stop accepting workers; workers are told to stop when they next ask for a job"""
+
+    self.__closed.set()
+    with self.__cond:
+      self.__cond.notify_all()
+    try:
+      self.__listener.close()
+    except:
+      pass
+
+  def run(self):
+    self.__log.info( 'Coordinator listening on {}'.format(self.address) )
+    while not self.__closed.is_set():
+      try:
+        conn = self.__listener.accept()
+      except Exception as err:
+        if self.__closed.is_set(): break
+        self.__log.warning( 'Failed to accept worker: {}'.format(err) )                 # Bad key, or worker dropped during handshake
+        continue
+      Thread( target = self.__serve, args = (conn,), daemon = True ).start()
+
+  def __next(self):
+    """Get next job for worker; None if none queued within POLL seconds"""
+
+    with self.__cond:
+      self.__cond.wait_for( lambda: self.__queue or self.__closed.is_set(), timeout = POLL )
+      if self.__queue and not self.__closed.is_set():
+        job = self.__queue.popleft()
+        self.__running[job.id] = job
+        return job
+    return None
+
+  def __requeue(self, job):
+    """Put job back at front of queue"""
+
+    with self.__cond:
+      self.__running.pop( job.id, None )
+      job.worker = None
+      self.__queue.appendleft( job )
+      self.__cond.notify_all()
+
+  def __serve(self, conn):
+    """Handle messages from one worker; runs in its own thread"""
+
+    job, name = None, None
+    try:
+      _, name = conn.recv()                                                             # Worker sends its name first
+      with self.__cond:
+        self.__workers.add( name )
+      self.__log.info( 'Worker connected: {}'.format(name) )
+      while True:
+        msg = conn.recv()
+        if msg[0] == 'get':
+          if self.__closed.is_set():
+            conn.send( ('stop',) )
+            break
+          job = self.__next()
+          if job is None:
+            conn.send( ('wait',) )
+            continue
+          job.worker = name
+          self.__log.info( 'Sending {} to {}'.format(job.file, name) )
+          conn.send( ('job', job.id, job.jobType, job.file, job.kwargs) )
+        elif msg[0] == 'log':
+          job.progress = msg[2]
+          self.__log.log( msg[1], '{} : {}'.format(name, msg[2]) )
+        elif msg[0] == 'requeue':                                                       # Worker stopped before job finished
+          self.__log.info( '{} stopped; requeuing {}'.format(name, job.file) )
+          self.__requeue( job )
+          job = None
+        elif msg[0] in ('done', 'error'):
+          with self.__cond:
+            self.__running.pop( job.id, None )
+          if msg[0] == 'done':
+            self.__log.info( '{} finished {}'.format(name, job.file) )
+            job._finish( result = msg[1] )
+          else:
+            self.__log.error( '{} failed {} : {}'.format(name, job.file, msg[1]) )
+            job._finish( error = msg[1] )
+          job = None
+    except (EOFError, OSError):
+      if job is not None:
+        self.__log.warning( 'Lost worker {}; requeuing {}'.format(name, job.file) )
+        self.__requeue( job )
+    except:
+      self.__log.exception( 'Error talking to worker' )
+      if job is not None: self.__requeue( job )
+    finally:
+      with self.__cond:
+        self.__workers.discard( name )
+      conn.close()
+
+########################################################################################
+class _LogForwarder( logging.Handler ):
+  """Send log records for a job back to the coordinator"""
+
+  def __init__(self, conn, lock, level = logging.INFO):
+    super().__init__( level = level )
+    self.conn     = conn
+    self.connLock = lock                                                                # Handler already has a 'lock' attribute
+
+  def emit(self, record):
+    try:
+      msg = self.format( record )
+      with self.connLock:
+        self.conn.send( ('log', record.levelno, msg) )
+    except:
+      pass                                                                              # Coordinator gone; worker notices on next send
+
+class Worker( object ):
+  """
+  Run jobs from a Coordinator
+
+  A worker runs one job at a time; the job's subprocesses still go through
+  the local POPENPOOL, so `threads` limits the CPUs used on this machine.
+  Run several workers to share a machine between coordinators, or use more
+  threads per job.
+
+  """
+
+  def __init__(self, address, authkey = None, name = None, **kwargs):
+    """
+    Arguments:
+      address (str,tuple): Address of coordinator as 'host:port' string or
+        (host, port) tuple
+
+    Keyword arguments:
+      authkey (str,bytes): Shared key for coordinator; default is AUTHKEY
+      name (str): Name of worker; default is hostname-pid
+      **kwargs: Override converter keywords sent by the coordinator;
+        e.g., threads, cpulimit, transcode_log, comskip_log
+
+    Returns:
+      Worker instance
+
+    """
+
+    self.__log     = logging.getLogger(__name__)
+    self.address   = parseAddress( address )
+    self.__authkey = _authkey( authkey )
+    self.name      = name or '{}-{}'.format( socket.gethostname(), os.getpid() )
+    self.overrides = kwargs
+
+  def run(self, once = False):
+    """
+    Connect to coordinator and run jobs until stopped
+
+    Keyword arguments:
+      once (bool): Return when disconnected instead of trying to reconnect
+
+    Returns:
+      None
+
+    """
+
+    while isRunning():
+      try:
+        conn = Client( self.address, authkey = self.__authkey )
+      except Exception as err:
+        self.__log.warning( 'Failed to connect to coordinator {}: {}'.format(self.address, err) )
+      else:
+        self.__log.info( 'Connected to coordinator {}'.format(self.address) )
+        try:
+          if self.__serve( conn ): return                                               # Told to stop
+        except (EOFError, OSError):
+          self.__log.warning( 'Lost connection to coordinator' )
+        finally:
+          conn.close()
+      if once: return
+      for _ in range(int(RETRY)):                                                       # Check for interrupt every second
+        if not isRunning(): return
+        time.sleep( 1.0 )
+
+  def __serve(self, conn):
+    """Ask for and run jobs; returns True if coordinator said stop"""
+
+    lock = Lock()
+    conn.send( ('hello', self.name) )
+    while isRunning():
+      with lock:
+        conn.send( ('get',) )
+      msg = conn.recv()
+      if msg[0] == 'stop':
+        return True
+      if msg[0] != 'job':
+        continue
+      _, jobID, jobType, file, kwargs = msg
+      kwargs.update( self.overrides )
+      self.__log.info( 'Running job {}: {}'.format(jobID, file) )
+
+      handler = _LogForwarder( conn, lock )
+      pkgLog  = logging.getLogger( __name__.split('.')[0] )
+      pkgLog.addHandler( handler )
+      try:
+        result = JOBTYPES[jobType]( file, **kwargs )
+      except Exception as err:
+        self.__log.exception( 'Job failed' )
+        reply = ('error', str(err))
+      else:
+        reply = ('done', result)
+      finally:
+        pkgLog.removeHandler( handler )
+
+      if not isRunning():                                                               # Interrupted, so job likely did not finish
+        reply = ('requeue',)
+      with lock:
+        conn.send( reply )
+    return False
@@ -3,6 +3,8 @@ import re
 import subprocess as subproc
 from xml.etree import ElementTree as ET
 
+from .utils.probeCache import getProbeCache, probeKey
+
 cmd  = ['mediainfo', '--version']
 try:
   proc = subproc.Popen( cmd, stdout = subproc.PIPE, stderr = subproc.PIPE );
@@ -23,6 +25,14 @@ elif (int(MediaInfoLib[0]) == 17) and (int(MediaInfoLib[1]) >= 10):
 else:                                                                           # Else
   OUTPUT_FMT = 'XML';                                                           # Set output format to XML
 
+ENCODE = 'encode'                                                               # Re-encode video
+COPY   = 'copy'                                                                 # Copy video; select and label audio as for encode
+REMUX  = 'remux'                                                                # Copy video and all audio as is
+
+COPY_RULES = {'x264' : {'format' : 'AVC',  'profiles' : ('Main', 'High'),    'level' : 4.0},
+              'x265' : {'format' : 'HEVC', 'profiles' : ('Main', 'Main 10'), 'level' : 5.1}} # Source video that may be copied, by encoder that would be used
+CRF          = {480 : 22, 720 : 23, 1080 : 24, 2160 : 26}                       # Rate factor by resolution; see get_video_info()
+COPY_MAXRATE = {480 : 3.0e6, 720 : 6.0e6, 1080 : 12.0e6, 2160 : 40.0e6}        # Highest video bit rate, in bits per second, that is copied instead of encoded
 
 class MediaInfo( object ):
   """Class that acts as wrapper for mediainfo CLI"""
@@ -135,6 +145,15 @@ class MediaInfo( object ):
   def __parse_output(self):
     """Method that will run when the file attribute is changed"""
 
+    cache = getProbeCache()                                                     # Shared between processes; None if disabled
+    key   = probeKey( self.inFile ) if cache else None                          # Taken before probing, so a file changed during the probe is probed again next time
+    tool  = 'mediainfo {} {}'.format( '.'.join(MediaInfoLib or []), OUTPUT_FMT )  # Parsed output differs between versions
+    data  = cache.get( key, tool ) if cache else None
+    if data is not None:
+      self.__log.debug( 'Using cached mediainfo output' )
+      self.__mediainfo = None if len(data) == 0 else data
+      return
+
     self.__log.info('Running mediainfo command...');                              # If verbose is set, print some output
     xmlstr = subproc.check_output( self.cmd  + [self.inFile] );                # Run the command
     root   = ET.fromstring( xmlstr );                                           # Parse xml tree
@@ -174,6 +193,7 @@ class MediaInfo( object ):
           except:
             data[tag][order][cur_tag] = elem.text;
     self.__mediainfo = None if len(data) == 0 else data;
+    if cache: cache.put( key, data, tool )
 
   ################################################################################
   def __eq__(self, other): return self.__mediainfo == other;
@@ -350,16 +370,16 @@ class MediaInfo( object ):
     # Set resolution and rate factor based on video height
     if video_data['Height'] <= 480:
       resolution = 480
-      info['-opts'].extend( ['-crf', '22'] );
+      info['-opts'].extend( ['-crf', str(CRF[480])] );
     elif video_data['Height'] <= 720:
       resolution =  720;
-      info['-opts'].extend( ['-crf', '23'] );
+      info['-opts'].extend( ['-crf', str(CRF[720])] );
     elif video_data['Height'] <= 1080:
       resolution = 1080;
-      info['-opts'].extend( ['-crf', '24'] );
+      info['-opts'].extend( ['-crf', str(CRF[1080])] );
     elif video_data['Height'] <= 2160:
       resolution = 2160;
-      info['-opts'].extend( ['-crf', '26'] );
+      info['-opts'].extend( ['-crf', str(CRF[2160])] );
     if resolution is None: return None;                                         # If resolution is NOT set, return None
 
     # I cannot remember why there is the extra check for 'Frame_rate_mode'
@@ -389,6 +409,69 @@ class MediaInfo( object ):
       info['-filter'] = ['-vf', ','.join(info['-filter'])];
     return info;
 
+  ################################################################################
+  def get_policy( self, video_info, audio_info ):
+    """
+    Decide whether the video stream must be re-encoded
+
+    The video can be copied if it already has the codec that get_video_info()
+    chose, with an allowed profile and a level and bit rate no higher than
+    given in COPY_RULES and COPY_MAXRATE, and needs no filters (i.e.,
+    deinterlacing or aspect ratio fix). If all audio streams were also kept
+    by get_audio_info(), the file can simply be remuxed.
+
+    Arguments:
+      video_info (dict): From get_video_info()
+      audio_info (dict): From get_audio_info()
+
+    Keyword arguments:
+      None
+
+    Returns:
+      str: One of ENCODE, COPY, REMUX
+
+    """
+
+    try:
+      video   = self.__mediainfo['Video'][0]
+      height, encoder = video_info['file_info']
+      rules   = COPY_RULES[ encoder ]
+      profile, _, level = video.get('Format_profile', '').partition('@')
+      level   = float( level.split('@')[0].lstrip('Ll') or 'inf' )
+      bitrate = self.__videoBitrate()
+    except:
+      self.__log.debug( 'Not enough information to copy video' )
+      return ENCODE
+
+    reasons = []
+    if video.get('Format', '') != rules['format']:
+      reasons.append( 'codec {}'.format( video.get('Format', '') ) )
+    if profile not in rules['profiles'] or level > rules['level']:
+      reasons.append( 'profile {}@{}'.format(profile, level) )
+    if bitrate is None or bitrate > COPY_MAXRATE[ int(height[:-1]) ]:
+      reasons.append( 'bit rate {}'.format(bitrate) )
+    if len( video_info['-filter'] ) > 0:
+      reasons.append( 'filters {}'.format( video_info['-filter'][-1] ) )
+    if reasons:
+      self.__log.debug( 'Video must be encoded; {}'.format( ', '.join(reasons) ) )
+      return ENCODE
+
+    nAudio = len( audio_info['-map'] ) // 2 if audio_info else 0
+    return REMUX if nAudio == len( self.__mediainfo.get('Audio', []) ) else COPY
+
+  ################################################################################
+  def __videoBitrate( self ):
+    """Video bit rate, in bits per second, from stream or estimated from file; None if unknown"""
+
+    video = self.__mediainfo['Video'][0]
+    if isinstance( video.get('Bit_rate', None), (int, float) ):
+      return video['Bit_rate']
+    general = self.__mediainfo['General'][0]
+    if not isinstance( general.get('Overall_bit_rate', None), (int, float) ):
+      return None
+    audio = [track.get('Bit_rate', 0) for track in self.__mediainfo.get('Audio', [])]   # Overall rate includes audio
+    return general['Overall_bit_rate'] - sum( i for i in audio if isinstance(i, (int, float)) )
+
   ################################################################################
   def get_text_info( self, language ):
     """
@@ -5,6 +5,8 @@ from .. import log, isRunning#_sigintEvent, _sigtermEvent
 from ..config import CONFIG, plexFMT
 from ..videoconverter import VideoConverter
 from ..utils.ffmpeg_utils import checkIntegrity
+from ..utils.subprocPool import PRIORITY_DVR
+from ..utils.timeline import Timeline
 
 from .plexMediaScanner import plexMediaScanner
 from .utils import plexDVR_Rename
@@ -41,6 +43,9 @@ class DVRconverter(VideoConverter):
                      not delete content if commercials misidentified
       no_remove (bool): If set, input file will NOT be deleted
       no_srt    (bool): If set, no SRT subtitle files created
+      priority  (int) : Priority of subprocesses in the POPENPOOL queue.
+                     Default is PRIORITY_DVR so that recordings are processed
+                     ahead of batch work
       Any other keyword argument is ignored
 
     Returns:
@@ -48,6 +53,12 @@ class DVRconverter(VideoConverter):
 
     """
 
+    initKwargs = {key : val for key, val in locals().items()
+                    if key not in ('self', 'kwargs', '__class__')}
+    initKwargs.update( kwargs )
+    self._initArgs = (DVRconverter, initKwargs,)                                    # Used by transcode_many() to create more converters
+
+    kwargs.setdefault('priority', PRIORITY_DVR)
     super().__init__(
       log_dir       = logdir,
       in_place      = True,
@@ -80,12 +91,23 @@ class DVRconverter(VideoConverter):
 
     """
 
+    self.timeline = Timeline( inFile )                                              # All stages, including transcode(), are timed in one timeline
+    try:
+      with self.timeline.span( 'convert' ):
+        return self._convert( inFile )
+    finally:
+      self._saveTimeline()
+
+  def _convert(self, inFile):
+    """Run all steps of convert(); see that method for arguments"""
+
     inFile       = os.path.realpath( inFile )                                       # Get real input file path 
     out_file     = None                                                             # Set out_file to None
     info         = None
     no_remove    = not self.remove                                                  # Set local no_remove value as opposite of remove flag 
     success      = False                                                            # Default success to bad
-    self.inFile  = inFile                                                           # Set inFile class attribute; this will trigger mediainfo parsing
+    with self.timeline.span( 'mediainfo' ):
+      self.inFile = inFile                                                          # Set inFile class attribute; this will trigger mediainfo parsing
 
     self.log.info('Input file: {}'.format( inFile ) )
 
@@ -96,7 +118,8 @@ class DVRconverter(VideoConverter):
       no_remove = True                                                              # Set local no_remove variable to True; done so that directory is not scanned twice when the Plex Media Scanner command is run
       self._cleanUp( inFile )                                                       # If infile exists, delete it
     else:                                                                           # Is, is a valid file
-      file, metaData = plexDVR_Rename( inFile )                                     # Try to rename the input file using standard convention and get parsed file info; creates hard link to source file
+      with self.timeline.span( 'plexDVR_Rename' ):
+        file, metaData = plexDVR_Rename( inFile )                                   # Try to rename the input file using standard convention and get parsed file info; creates hard link to source file
       if not file:                                                                  # if the rename fails
         self.log.critical('Error renaming file: {}'.foramt(inFile))                 # Log error
         return success, out_file                                                    # Return from function
@@ -126,11 +149,13 @@ class DVRconverter(VideoConverter):
       args   = ('scan',)                                                            # Set arguements for plexMediaScanner function
       kwargs = {'section'   : 'TV Shows',
                 'directory' : os.path.dirname( inFile )}                            # Set keyword arguments for plexMediaScanner function
-      plexMediaScanner( *args, **kwargs )
+      with self.timeline.span( 'plex_scan' ):
+        plexMediaScanner( *args, **kwargs )
       if not no_remove:                                                             # If no_remove is NOT set, then we want to delete inFile and rescan the directory so original file is removed from Plex
         self._cleanUp( inFile )                                                     # Delete the file
         if not os.path.isfile( inFile ):                                            # If file no longer exists; if it exists, don't want to run Plex Media Scanner for no reason
           self.log.debug('Original file removed, rescanning: {}'.format(inFile))    # Debug information
-          plexMediaScanner( *args, **kwargs )                                       # Run Ple Media Scanner to remove deleted file from library
+          with self.timeline.span( 'plex_scan' ):
+            plexMediaScanner( *args, **kwargs )                                     # Run Ple Media Scanner to remove deleted file from library
 
     return success, out_file                                                        # Return transcode success, new file path, and info
@@ -29,9 +29,15 @@ class Plex_DVR_Watchdog( FileSystemEventHandler ):
     self.recordings    = []                                                             # Initialize list to store paths of newly started DVR recordings
     self.converting    = DVRqueue( plex_dvr['queueFile'] )                              # Initialize DVRqueue, this is a subclass of list that, when items modified, will save pickled list to file as backup
       
-    self.converter = None
-    self.script    = kwargs.get('script', None)
-    if not self.script:
+    self.converter   = None
+    self.coordinator = kwargs.pop('coordinator', None)                                  # If set, files are converted by distributed workers
+    self.submitted   = set()                                                            # Files queued on the coordinator
+    self.script      = kwargs.get('script', None)
+    if self.script:
+      self.coordinator = None
+    elif self.coordinator:
+      self.converterKwargs = kwargs                                                     # Sent to workers to build their DVRconverter
+    else:
       self.converter = DVRconverter( **kwargs )
 
     self.__Lock      = Lock()                                                       # Lock for ensuring threads are safe
@@ -215,6 +221,41 @@ class Plex_DVR_Watchdog( FileSystemEventHandler ):
       except:
         self.log.exception('Failed to convert file')
 
+  def _submit(self, file):
+    """Queue file on coordinator for a worker to convert"""
+
+    try:
+      self._checkSize( file )                                                 # Wait to make sure file finishes copying/moving
+    except Exception as err:
+      self.log.warning( 'Error checking file, assuming not exist: Error - {}'.format(err) )
+      with self.__Lock:
+        self.converting.remove( file )
+      return
+    self.submitted.add( file )
+    self.coordinator.submit( 'dvr', file, callback = self._remoteDone, **self.converterKwargs )
+
+  @sendEMail
+  def _remoteDone(self, job):
+    """Called by coordinator when a worker finishes converting a file"""
+
+    if job.error:
+      self.log.error( 'Failed to convert file on {}: {}'.format(job.worker, job.error) )
+    if isRunning():                                                           # Same as local conversion; keep file in queue if interrupted
+      with self.__Lock:
+        self.submitted.discard( job.file )
+        self.converting.remove( job.file )
+
+  def __runRemote(self):
+    """Submit every file in the converting list to the coordinator"""
+
+    while isRunning():
+      with self.__Lock:
+        files = [f for f in self.converting if f not in self.submitted]
+      if len(files) == 0:
+        time.sleep(TIMEOUT)
+      else:
+        self._submit( files[0] )
+
   def __run(self):
     """
     A thread to dequeue video file paths and convert them
@@ -230,6 +271,7 @@ class Plex_DVR_Watchdog( FileSystemEventHandler ):
 
     """
 
+    if self.coordinator: self.__runRemote()                                     # Workers convert files; returns on interrupt
     while isRunning():                                                          # While the kill event is NOT set
       try:                                                                      # Try
         file = self.converting[0]                                               # Get a file from the queue; block for 0.5 seconds then raise exception
@@ -196,3 +196,62 @@ def srtCleanup( fname, verbose = False ):
   oid.close();
   os.rename( out_file, fname );
   return 0;                                                                     # Return zero
+
+def _srtTime( text ):
+  """Convert SRT time stamp, HH:MM:SS,mmm, to seconds"""
+
+  hms, _, ms = text.strip().partition(',')
+  hh, mm, ss = [int(i) for i in hms.split(':')]
+  return hh * 3600 + mm * 60 + ss + int(ms or 0) / 1000.0
+
+def _srtStamp( sec ):
+  """Convert seconds to SRT time stamp, HH:MM:SS,mmm"""
+
+  ms = int( round( max(sec, 0.0) * 1000 ) )
+  return '{:02d}:{:02d}:{:02d},{:03d}'.format( ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000 )
+
+def srtCut( fname, segments ):
+  """
+  Keep only subtitles in given segments, shifting them to match a cut video
+
+  Used when commercials are skipped while transcoding (see
+  ComRemove.comcutlist), so that subtitles extracted from the uncut source
+  line up with the output file.
+
+  Arguments:
+    fname (str): Path to an SRT file. This file will be overwritten.
+    segments (list): (start, end) tuples, in seconds, of the parts of the
+      source that were kept; end may be None for end of file
+
+  Keyword arguments:
+    None
+
+  Returns:
+    int: Number of subtitles kept
+
+  """
+
+  with open(fname, 'r') as fid:
+    blocks = re.split( r'\n\s*\n', fid.read().replace('\r\n', '\n').strip() )
+
+  subs = []
+  for block in blocks:
+    lines = block.split('\n')
+    if len(lines) < 2 or '-->' not in lines[1]: continue
+    start, _, end = lines[1].partition('-->')
+    start, end    = _srtTime( start ), _srtTime( end.split()[0] )
+    offset = 0.0                                                                # Time, in output, at which current segment starts
+    for segStart, segEnd in segments:
+      if segEnd is None: segEnd = float('inf')
+      if start < segEnd and end > segStart:                                     # Subtitle overlaps kept segment
+        subs.append( (offset + max(start, segStart) - segStart,
+                      offset + min(end,   segEnd)   - segStart, lines[2:]) )
+        break
+      offset += segEnd - segStart
+
+  out_file = fname + '.tmp'
+  with open(out_file, 'w') as fid:
+    for i, (start, end, text) in enumerate( subs ):
+      fid.write( '{}\n{} --> {}\n{}\n\n'.format( i+1, _srtStamp(start), _srtStamp(end), '\n'.join(text) ) )
+  os.rename( out_file, fname )
+  return len(subs)
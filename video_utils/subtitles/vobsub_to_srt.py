@@ -1,6 +1,5 @@
 import logging
 import os, time
-from subprocess import Popen, DEVNULL, STDOUT
 
 from ..utils.checkCLI import checkCLI
 
@@ -14,7 +13,7 @@ except:
 from ..utils.subprocManager import SubprocManager;
 from .srtUtils import srtCleanup;
 
-def vobsub_to_srt( out_file, text_info, vobsub_delete = False, cpulimit = None, threads = None ):
+def vobsub_to_srt( out_file, text_info, vobsub_delete = False, cpulimit = None, threads = None, priority = None ):
   """
   Convert VobSub(s) to SRT(s).
 
@@ -25,7 +24,11 @@ def vobsub_to_srt( out_file, text_info, vobsub_delete = False, cpulimit = None,
     None
 
   Keyword arguments:
-    None
+    vobsub_delete (bool): Delete VobSub files after conversion
+    cpulimit (int): Percentage of CPU each vobsub2srt process may use
+    threads (int): Maximum number of vobsub2srt processes to run at once;
+      processes also count against the POPENPOOL threads
+    priority (int): Priority of the processes in the POPENPOOL
 
   Returns:
     int: Updates vobsub_status and creates/updates list of VobSubs that failed vobsub2srt conversion.
@@ -45,12 +48,12 @@ def vobsub_to_srt( out_file, text_info, vobsub_delete = False, cpulimit = None,
   if text_info is None: return 2, files;                                        # If text info has not yet been defined, return
   log.info('Converting VobSub(s) to SRT(s)...');                                # Print logging info
   fmt     = '  {:2d} of {:2d} - {}';                                            # Format for counter in logging
-  subproc = SubprocManager(cpulimit = cpulimit, threads = threads);             # Initialize SubprocManager
+  subproc = SubprocManager(cpulimit = cpulimit, threads = threads, priority = priority); # Initialize SubprocManager
   subproc._logFMT = fmt;                                                        # Set format for counter in the SubprocManager
 
   failed   = 0
   skipped  = 0  
-  newFiles = []
+  futures  = {}                                                                 # Futures for queued commands, keyed by index in text_info
   n_tags   = len(text_info)                                                     # Get number of entries in dictionary
   for i in range(n_tags):                                                       # Iterate over all VobSub file(s)
     info = text_info[i];                                                        # Store current info in info
@@ -67,15 +70,14 @@ def vobsub_to_srt( out_file, text_info, vobsub_delete = False, cpulimit = None,
       if info['lang2'] != '' and info['lang3'] != '':                           # If the two(2) and three (3) character language codes are NOT empty
         cmd.extend( ['--tesseract-lang', info['lang3']] );                      # Append tesseract language option
         cmd.extend( ['--lang', info['lang2']] );                                # Append language option
-      newFiles.append( '{}.srt'.format( file) );
       cmd.append( file );                                                       # Append input file to cmd
-      subproc.addProc( cmd, single = True );                                    # Add command to queue
+      futures[i] = subproc.addProc( cmd, single = True );                       # Add command to queue
   subproc.run();                                                                # Run all the commands
 
-  for i in range( len(subproc.returncodes) ):                                   # Iterate over all the return codes
-    if subproc.returncodes[i] == 0:                                             # If the return code is zero (0)
+  for i, future in futures.items():                                             # Iterate over futures; keys are indices in text_info
+    if not future.cancelled() and future.exception() is None and future.result() == 0: # If the return code is zero (0)
       text_info[i]['srt'] = True;                                               # Set srt exists flag in text_info dictionary to True
-      status = srtCleanup( newFiles[i] )                                       # Run SRT music notes on the file
+      status = srtCleanup( files[i] )                                           # Run SRT music notes on the file
     else:                                                                       # Else
       failed += 1;                                                              # Increment failed by one (1)
 
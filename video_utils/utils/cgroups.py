@@ -0,0 +1,253 @@
+import logging
+import os, sys
+from threading import Lock
+
+CGROUP_ROOT = '/sys/fs/cgroup'                                                          # Mount point of the cgroup v2 unified hierarchy
+CPU_PERIOD  = 100000                                                                    # Period, in microseconds, for cpu.max
+SUPERVISOR  = 'supervisor'                                                              # Name of leaf cgroup this process is moved into
+
+def _read( path ):
+  with open(path, 'r') as fid:
+    return fid.read().strip()
+
+def _write( path, val ):
+  with open(path, 'w') as fid:
+    fid.write( str(val) )
+
+########################################################################################
+class Cgroup( object ):
+  """
+  Represents a single cgroup v2 sub-group used to limit a process
+
+  Limits are enforced by the kernel, so no helper process is needed and all
+  children of the process are limited as well.
+
+  """
+
+  def __init__(self, path):
+    """
+    Arguments:
+      path (str): Full path to the cgroup directory; must already exist
+
+    Keyword arguments:
+      None
+
+    Returns:
+      Cgroup instance
+
+    """
+
+    self.__log = logging.getLogger(__name__)
+    self.path  = path
+
+  def __repr__(self):
+    return '<Cgroup : {}>'.format(self.path)
+
+  def setCPU(self, percent):
+    """
+    Set CPU limit through cpu.max
+
+    Arguments:
+      percent (int): Percentage of one CPU the group may use; e.g., 400 for
+        four (4) full CPUs
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if limit set, False otherwise
+
+    """
+
+    quota = max( int(percent * CPU_PERIOD / 100), 1000 )                                # Quota in microseconds per period; kernel minimum is 1 ms
+    return self.__set( 'cpu.max', '{} {}'.format(quota, CPU_PERIOD) )
+
+  def setMemory(self, nbytes):
+    """
+    Set memory throttling threshold through memory.high
+
+    Arguments:
+      nbytes (int): Memory, in bytes, above which the group is throttled
+        and reclaimed
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if limit set, False otherwise
+
+    """
+
+    return self.__set( 'memory.high', int(nbytes) )
+
+  def memoryCurrent(self):
+    """Memory, in bytes, used by all processes in the group; None if not available"""
+
+    try:
+      return int( _read( os.path.join(self.path, 'memory.current') ) )
+    except (OSError, ValueError):
+      return None
+
+  def addProcess(self, pid):
+    """Move process, and all of its threads, into the cgroup"""
+
+    return self.__set( 'cgroup.procs', pid )
+
+  def close(self):
+    """
+    Remove the cgroup
+
+    If processes are still in the group (e.g., orphaned grandchildren), they
+    are killed first.
+
+    """
+
+    try:
+      os.rmdir( self.path )
+    except OSError:
+      self.__set( 'cgroup.kill', 1 )                                                    # Kill anything left; requires Linux 5.14+
+      try:
+        os.rmdir( self.path )
+      except OSError as err:
+        self.__log.debug( 'Failed to remove cgroup {} : {}'.format(self.path, err) )
+        return False
+    return True
+
+  def __set(self, key, val):
+    try:
+      _write( os.path.join(self.path, key), val )
+    except OSError as err:
+      self.__log.debug( 'Failed to write {} to {} : {}'.format(val, key, err) )
+      return False
+    return True
+
+########################################################################################
+class CgroupManager( object ):
+  """
+  Create cgroup v2 sub-groups for subprocesses
+
+  The cgroup this process lives in must be delegated to the user running it;
+  e.g., with Delegate=yes in a systemd service file. Because cgroup v2 does not
+  allow processes in a group that hands controllers down to sub-groups, this
+  process is moved into a leaf sub-group before the cpu and memory controllers
+  are enabled. If anything fails, the manager evaluates to False and callers
+  should fall back to another method of limiting CPU usage, such as cpulimit.
+
+  Setup is done lazily, the first time the manager is used.
+
+  """
+
+  def __init__(self):
+    self.__log   = logging.getLogger(__name__)
+    self.__lock  = Lock()
+    self.__base  = None
+    self.__ready = False
+    self.__count = 0
+    self.__controllers = ()
+
+  def __bool__(self):
+    return self.base is not None
+
+  @property
+  def base(self):
+    """Path to delegated cgroup that job sub-groups are created in; None if not available"""
+
+    with self.__lock:
+      if not self.__ready:
+        self.__base  = self.__setup()
+        self.__ready = True
+    return self.__base
+
+  @property
+  def controllers(self):
+    """Controllers enabled for job sub-groups"""
+
+    return self.__controllers if self else ()
+
+  def create(self, cpulimit = None, memory = None):
+    """
+    Create a new sub-group with given limits
+
+    Keyword arguments:
+      cpulimit (int): Percentage of one CPU the group may use; e.g., 400 for
+        four (4) full CPUs
+      memory (int): Memory, in bytes, above which the group is throttled
+
+    Returns:
+      Cgroup instance if created, None otherwise
+
+    """
+
+    base = self.base
+    if base is None: return None
+    with self.__lock:
+      self.__count += 1
+      name = 'job-{}-{}'.format( os.getpid(), self.__count )
+    path = os.path.join( base, name )
+    try:
+      os.mkdir( path )
+    except OSError as err:
+      self.__log.warning( 'Failed to create cgroup : {}'.format(err) )
+      return None
+
+    cgroup = Cgroup( path )
+    if cpulimit and 'cpu' in self.__controllers:
+      cgroup.setCPU( cpulimit )
+    if memory and 'memory' in self.__controllers:
+      cgroup.setMemory( memory )
+    return cgroup
+
+  def __setup(self):
+    """Locate delegated cgroup and enable controllers for sub-groups"""
+
+    if not sys.platform.startswith('linux'): return None
+    if not os.path.isfile( os.path.join(CGROUP_ROOT, 'cgroup.controllers') ):          # Not the cgroup v2 unified hierarchy
+      return None
+
+    try:
+      lines = _read( '/proc/self/cgroup' ).splitlines()
+    except OSError:
+      return None
+    rel = [line[3:] for line in lines if line.startswith('0::')]                        # cgroup v2 entry has hierarchy ID zero (0)
+    if len(rel) != 1: return None
+
+    base = os.path.join( CGROUP_ROOT, rel[0].lstrip('/') )
+    orig = base                                                                         # Where this process is now; moved back here on failure
+    if os.path.basename( base ) == SUPERVISOR:                                          # Already moved into leaf; e.g., module reloaded
+      base = os.path.dirname( base )
+
+    try:
+      available = _read( os.path.join(base, 'cgroup.controllers') ).split()
+    except OSError:
+      return None
+    controllers = [c for c in ('cpu', 'memory',) if c in available]
+    if len(controllers) == 0 or not os.access( base, os.W_OK ):                         # No controllers delegated or cannot create sub-groups
+      return None
+
+    leaf    = os.path.join( base, SUPERVISOR )
+    created = False
+    moved   = False
+    try:
+      if not os.path.isdir( leaf ):
+        os.mkdir( leaf )
+        created = True
+      _write( os.path.join(leaf, 'cgroup.procs'), os.getpid() )                         # Move this process out of base
+      moved = True
+      _write( os.path.join(base, 'cgroup.subtree_control'),
+              ' '.join( ['+'+c for c in controllers] ) )                                # Enable controllers for sub-groups; e.g., EBUSY if base has other processes
+    except OSError as err:
+      self.__log.debug( 'cgroup delegation not available : {}'.format(err) )
+      try:                                                                              # Leave cgroups as they were
+        if moved and orig != leaf:
+          _write( os.path.join(orig, 'cgroup.procs'), os.getpid() )
+        if created:
+          os.rmdir( leaf )
+      except OSError as err:
+        self.__log.warning( 'Failed to undo cgroup setup : {}'.format(err) )
+      return None
+
+    self.__controllers = tuple(controllers)
+    self.__log.debug( 'Using cgroup {} for process limits'.format(base) )
+    return base
+
+CGROUPS = CgroupManager()
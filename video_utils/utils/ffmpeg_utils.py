@@ -1,11 +1,14 @@
 import logging
-import os, time, re, json
+import os, time, re, json, csv, shutil, tempfile
 import numpy as np
 from datetime import datetime, timedelta
+from threading import Thread
 from subprocess import Popen, check_output, PIPE, STDOUT, DEVNULL
 
 from .. import _sigintEvent, _sigtermEvent
 from .. import POPENPOOL
+from ..config import CONFIG
+from .presetTuner import sampleTimes
 
 _progPat = re.compile( r'time=(\d{2}:\d{2}:\d{2}.\d{2})' )                              # Regex pattern for locating file duration in ffmpeg ouput 
 _durPat  = re.compile( r'Duration: (\d{2}:\d{2}:\d{2}.\d{2})' )                         # Regex pattern for locating file processing location
@@ -15,7 +18,14 @@ _durPat  = re.compile( r'Duration: ([^,]*)' )
 _info    = 'Estimated Completion Time: {}'                                              # String formatter for conversion progress
 
 _toSec   = np.array( [3600, 60, 1], dtype = np.float32 )                                # Array for conversion of hour/minutes/seconds to total seconds
-_chunk   = np.full( (128, 4), np.nan )                                                  # Base numpy chunk
+
+CROP_WINDOWS = 8                                                                        # Number of windows sampled by cropdetect
+CROP_METHOD  = CONFIG.get('CROP_METHOD', None) or 'windows'                             # Default cropdetect method; 'windows' or 'keyframes'
+
+_lookahead = {'x264' : {'slow' : 60, 'default' :  40},
+              'x265' : {'slow' : 150, 'default' : 100}}                                # Approximate number of frames an encoder keeps in memory
+
+PROGRESS    = ['-progress', 'pipe:1', '-nostats']                                       # ffmpeg options to write key=value progress to stdout instead of stats to stderr
 
 TIME_BASE   = '1/1000000000'                                                            # Default time_base for chapters
 PREROLL     = -1.0                                                                      # Padding before beginning of chapter
@@ -305,104 +315,301 @@ class Chapter( object ):
       self.start_time += offset                                                         # Offset start time
 
 ###############################################################################
-def cropdetect( infile, dt = 20, threads = None):
+def _cropWindow( logFile ):
   """
-  Use FFmpeg to to detect a cropping region for video files
+  Parse ffmpeg cropdetect output of one window
 
   Arguments:
-    infile (str): Path to input file for crop detection
+    logFile (str): File with ffmpeg output
 
   Keyword arguments:
-    dt  : Length of video, in seconds, starting from beginning to use
-          for crop detection, default is 20 seconds
+    None
 
   Returns:
-    Returns string for FFmpeg video filter in the format crop=w:h:x:y
-    or None if no cropping detected
+    tuple: Video resolution [width, height] and largest crop region
+      [width, height, x, y] in the window; either is None if not found
 
   """
 
-  log     = logging.getLogger(__name__);                                                # Get a logger
+  res  = None
+  crop = None
+  with open(logFile, 'r') as fid:
+    for line in fid:
+      if res is None:                                                                   # If resolution not yet found
+        tmp = _resPat.findall( line )                                                   # Try to find resolution information
+        if len(tmp) == 1: res = [int(i) for i in tmp[0].split('x')]
+      tmp = _cropPat.findall( line )
+      if len(tmp) == 1:
+        vals = [int(i) for i in tmp[0].split(':')]
+        crop = vals if crop is None else [max(a, b) for a, b in zip(crop, vals)]        # Largest region; dark frames detect too small a region
+  return res, crop
+
+def cropdetect( infile, dt = 20, threads = None, windows = CROP_WINDOWS, priority = None, method = None ):
+  """
+  Use FFmpeg to to detect a cropping region for video files
 
-  threads = threads if isinstance(threads, int) else POPENPOOL.threads                  # Set default value for number of threads
-  if threads < 0: threads = 1
+  Windows spread evenly over the video are run through cropdetect at the
+  same time in the POPENPOOL, with input seeking so each ffmpeg only decodes
+  its own window. The largest region found in each window is used, so dark
+  scenes do not shrink the crop, and the median across windows is used, so
+  that one odd window (e.g., credits) does not change it. Detection time
+  does not depend on the length of the video.
 
-  def buildCmd(infile, ss, dt, threads):                                                # Local function to build command for ffmpeg
-    """
-    Generate ffmpeg command list for cropping
+  With the 'keyframes' method, borderCrop() is used instead; it decodes
+  only keyframes from the whole video and finds the borders with numpy.
 
-    Arguments:
-      infile (str): File to read from
-      ss       : timedelta; Start time for segment
-      dt       : timedelta; Length of segment for crop detection
-      threads  : int; number of threads to let ffmpeg use
+  Arguments:
+    infile (str): Path to input file for crop detection
 
-    Keyword arguments:
-      None.
+  Keyword arguments:
+    dt  : Length of each window, in seconds, default is 20 seconds
+    threads (int): Threads each ffmpeg uses; default is one (1)
+    windows (int): Number of windows to sample
+    priority (int): Priority of the ffmpeg processes in the POPENPOOL queue
+    method (str): 'windows' or 'keyframes'; default is CROP_METHOD, which
+      may be set with CROP_METHOD in settings
 
-    Returns:
-      List of strings containing ffmpeg command
+  Returns:
+    Returns string for FFmpeg video filter in the format crop=w:h:x:y
+    or None if no cropping detected
 
-    """
+  """
 
-    if not isinstance(ss,      str): ss = str(ss)
-    if not isinstance(dt,      str): dt = str(dt)
-    if not isinstance(threads, str): threads = str(threads)
-    cmd = ['ffmpeg', '-nostats', '-threads', threads, '-ss', ss, '-i', infile]          # Base command for crop detection
-    return cmd + ['-t', dt, '-vf', 'cropdetect', '-f', 'null', '-']                     # Add length, cropdetec filter and pipe to null muxer
-
-  if not isinstance(threads, int): threads = 1
-  whxy    = [ [] for i in range(4) ];                                                   # Initialize list of 4 lists for crop parameters
-  res     = None;                                                                       # Initialize video resolution to None
-  dt      = timedelta(seconds = dt)                                                     # Get nicely formatted time
-  ss      = timedelta(seconds = 0)
-  nn      = 0;                                                                          # Counter for number of crop regions detected
-  crop    = _chunk.copy();                                                              # List of crop regions
-
-  log.debug( 'Detecting crop using chunks of length {}'.format( dt ) );
-
-  detect = True;                                                                    # Set detect to True; flag for crop detected
-  while detect and (not _sigintEvent.is_set()) and (not _sigtermEvent.is_set()):    # While detect is True, keep iterating
-    detect = False;                                                                 # Set detect to False; i.e., at beginning of iteration, assume no crop found
-    log.debug( 'Checking crop starting at {}'.format( ss ) );
-    cmd    = buildCmd( infile, ss, dt, threads )
-    proc   = Popen( cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True )          # Start the command, piping stdout and stderr to a pipe
-    line   = proc.stdout.readline()                                                     # Read line from pipe
-    while line != '':                                                                   # While line is not empty
-      if res is None:                                                                   # If resolution not yet found
-        res = _resPat.findall( line )                                                   # Try to find resolution information
-        res = [int(i) for i in res[0].split('x')] if len(res) == 1 else None            # Set res to resolution if len of res is 1, else set back to None
-      whxy = _cropPat.findall( line )                                                   # Try to find pattern in line
-    
-      if len(whxy) == 1:                                                                # If found the pattern
-        if not detect: detect = True                                                    # If detect is False, set to True
-        if (nn == crop.shape[0]):                                                       # If the current row is outside of the number of rows
-          crop = np.concatenate( [crop, _chunk], axis = 0 )                             # Concat a new chunk onto the array
-        #log.debug( 'Crop : {}'.format(whxy) )
-        crop[nn,:] = np.array( [int(i) for i in whxy[0].split(':')] )                   # Split the string on colon
-        nn += 1                                                                         # Increment nn counter
-      line = proc.stdout.readline()                                                     # Read another line form pipe
-    proc.communicate()                                                                  # Wait for FFmpeg to finish cleanly
-    ss += timedelta( seconds = 60 * 5 )                                                 # Increment ss by 5 minutes
-
-  maxVals = np.nanmax(crop, axis = 0)                                                   # Compute maximum across all values
-  xWidth  = maxVals[0]                                                                  # First value is maximum width
-  yWidth  = maxVals[1]                                                                  # Second is maximum height
+  log     = logging.getLogger(__name__);                                                # Get a logger
+
+  threads = threads if isinstance(threads, int) and threads > 0 else 1                  # Windows run at the same time, so one thread each
+  method  = method or CROP_METHOD
+  if method == 'keyframes':
+    return borderCrop( infile, threads = threads, priority = priority )
+  elif method != 'windows':
+    raise Exception( 'Unknown cropdetect method: {}'.format(method) )
+  starts  = sampleTimes( getVideoLength( infile ), windows, dt )
+  tmpDir  = tempfile.mkdtemp( prefix = 'cropdetect_' )
+
+  log.debug( 'Detecting crop using {} windows of length {}'.format( len(starts), timedelta(seconds = dt) ) );
+
+  procs = []
+  for i, ss in enumerate( starts ):
+    logFile = os.path.join( tmpDir, '{}.log'.format(i) )
+    cmd     = ['ffmpeg', '-nostdin', '-nostats', '-threads', str(threads)]
+    cmd    += ['-ss', '{:0.3f}'.format(ss), '-i', infile]                               # Seek before input, so is fast
+    cmd    += ['-t', str(dt), '-vf', 'cropdetect', '-f', 'null', '-']                   # Add length, cropdetec filter and pipe to null muxer
+    procs.append( (logFile, POPENPOOL.Popen_async( cmd, threads = threads, priority = priority,
+                                                   stderr = logFile )) )
+
+  res   = None
+  crops = np.full( (len(procs), 4), np.nan )                                            # Largest crop region of each window
+  for i, (logFile, proc) in enumerate( procs ):
+    proc.wait()
+    if os.path.isfile( logFile ):
+      tmp, crop = _cropWindow( logFile )
+      if res is None: res = tmp
+      if crop is not None: crops[i,:] = crop
+  shutil.rmtree( tmpDir, ignore_errors = True )
+
+  if res is None or np.isnan(crops).all():
+    log.debug( 'No cropping region detected' )
+    return None
+
+  xWidth, yWidth = np.nanmedian( crops[:,:2], axis = 0 ).astype( int )                 # Median width and height across windows
+  xWidth -= xWidth % 2                                                                  # Round down to even for chroma subsampling
+  yWidth -= yWidth % 2
 
   if (xWidth/res[0] > 0.5) and (yWidth/res[1] > 0.5):                                   # If crop width and height are atleast 50% of video width and height
     xOffset = (res[0] - xWidth) // 2                                                    # Compute x-offset, this is half of the difference between video width and crop width because applies to both sizes of video
     yOffset = (res[1] - yWidth) // 2                                                    # Compute x-offset, this is half of the difference between video height and crop height because applies to both top and bottom of video
     crop    = np.asarray( (xWidth, yWidth, xOffset, yOffset), dtype = np.uint16 )       # Numpy array containing crop width/height of offsets as unsigned 16-bit integers
 
-    if res is not None:                                                                 # If input resolution was found
-      if (crop[0] == res[0]) and (crop[1] == res[1]):                                   # If the crop size is the same as the input size
-        log.debug( 'Crop size same as input size, NOT cropping' )                       # Debug info
-        return None                                                                     # Return None
+    if (crop[0] == res[0]) and (crop[1] == res[1]):                                     # If the crop size is the same as the input size
+      log.debug( 'Crop size same as input size, NOT cropping' )                         # Debug info
+      return None                                                                       # Return None
     log.debug( 'Values for crop: {}'.format(crop) )                                     # Debug info
     return 'crop={}:{}:{}:{}'.format( *crop )                                           # Return formatted string with crop option
   log.debug( 'No cropping region detected' )
   return None                                                                           # Return None b/c if made here, no crop detected
 
+###############################################################################
+def _probe( infile ):
+  """Return duration, in seconds, and [width, height] of video from ffmpeg -i output; None for missing"""
+
+  proc = Popen( ['ffmpeg', '-nostdin', '-i', infile], stdout = PIPE, stderr = STDOUT )
+  info = proc.communicate()[0].decode( errors = 'replace' )
+  dur  = _durPat.findall( info )
+  res  = _resPat.findall( info )
+  try:
+    dur = float( totalSeconds( dur[0] )[0] )
+  except:
+    dur = None
+  res = [int(i) for i in res[0].split('x')] if len(res) > 0 else None
+  return dur, res
+
+def sampleKeyframes( infile, maxFrames = 200, scale = 2, threads = 1, priority = None ):
+  """
+  Decode keyframes spread over a video into grayscale numpy arrays
+
+  Only keyframes are decoded (-skip_frame nokey), thinned with the select
+  filter so at most maxFrames, spread evenly over the video, are kept. Frames
+  are read as raw 8-bit luma from the ffmpeg stdout pipe; no files are
+  written. Much cheaper than a full decode, so useful for anything that
+  needs to look at a few hundred frames; e.g., borders, black frames, or
+  thumbnails. ffmpeg runs in the POPENPOOL like any other process, so this
+  waits for free threads and memory.
+
+  Arguments:
+    infile (str): Path to input file
+
+  Keyword arguments:
+    maxFrames (int): Most frames to return
+    scale (int): Divide width and height by this; reduces memory, which is
+      maxFrames * width * height / scale**2 bytes
+    threads (int): Threads ffmpeg uses to decode
+    priority (int): Priority of the ffmpeg process in the POPENPOOL queue
+
+  Returns:
+    numpy.ndarray: uint8 array of shape (frames, height, width); None if the
+      input could not be read
+
+  """
+
+  log      = logging.getLogger(__name__)
+  dur, res = _probe( infile )
+  if res is None:
+    log.error( 'Failed to get video resolution: {}'.format(infile) )
+    return None
+  width    = res[0] // scale // 2 * 2                                                   # Even size for scaler
+  height   = res[1] // scale // 2 * 2
+  interval = (dur or 0.0) / maxFrames
+  filters  = ["select='isnan(prev_selected_t)+gte(t-prev_selected_t,{:0.3f})'".format(interval)]
+  filters += ['scale={}:{}'.format(width, height)]
+
+  cmd  = ['ffmpeg', '-nostdin', '-v', 'error', '-threads', str(threads)]
+  cmd += ['-skip_frame', 'nokey', '-i', infile, '-map', '0:v:0']
+  cmd += ['-vf', ','.join(filters), '-vsync', '0', '-frames:v', str(maxFrames)]
+  cmd += ['-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+
+  size   = width * height
+  frames = np.empty( (maxFrames, height, width), dtype = np.uint8 )                    # Filled in place; no copies as frames arrive
+  buf    = memoryview( frames ).cast( 'B' )
+  nn     = 0
+  rfd, wfd = os.pipe()
+  with os.fdopen( rfd, 'rb' ) as fid:
+    proc = POPENPOOL.Popen_async( cmd, threads = threads, priority = priority,
+                                  stdout = os.fdopen( wfd, 'wb' ), stderr = DEVNULL )   # Pool closes write end when ffmpeg exits, is skipped, or is cancelled
+    while nn < maxFrames:
+      got = fid.readinto( buf[nn*size:(nn+1)*size] )
+      if not got: break
+      while got < size:                                                                 # Pipe may return part of a frame
+        more = fid.readinto( buf[nn*size+got:(nn+1)*size] )
+        if not more: break
+        got += more
+      if got < size: break
+      nn += 1
+  proc.wait()
+  log.debug( 'Sampled {} keyframes of {}x{}'.format(nn, width, height) )
+  return frames[:nn]
+
+def detectBorders( frames, threshold = 24, fraction = 0.02 ):
+  """
+  Find letterbox/pillarbox borders in a stack of grayscale frames
+
+  Computes, in one pass over the whole stack, the fraction of pixels in each
+  row and each column, over all frames, that are brighter than threshold.
+  Rows and columns at the edges where that fraction is below fraction are
+  border. Dark scenes do not matter as long as some frames are bright where
+  the picture is.
+
+  Arguments:
+    frames (numpy.ndarray): Frames from sampleKeyframes()
+
+  Keyword arguments:
+    threshold (int): Luma at or below which a pixel is black
+    fraction (float): Largest fraction of bright pixels in a border row/column;
+      allows for noise and logos
+
+  Returns:
+    tuple: (width, height, x, y) of the picture in the frames; None if no
+      frames or no picture found
+
+  """
+
+  if frames is None or len(frames) == 0: return None
+  bright = frames > threshold                                                           # One comparison over whole stack
+  rows   = np.flatnonzero( bright.mean( axis = (0, 2) ) > fraction )                    # Rows with picture
+  cols   = np.flatnonzero( bright.mean( axis = (0, 1) ) > fraction )
+  if rows.size == 0 or cols.size == 0: return None
+  return (int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1), int(cols[0]), int(rows[0]))
+
+def borderCrop( infile, maxFrames = 200, scale = 2, threads = 1, priority = None, **kwargs ):
+  """
+  Detect cropping region from keyframes; used by cropdetect( method = 'keyframes' )
+
+  Arguments:
+    infile (str): Path to input file
+
+  Keyword arguments:
+    maxFrames (int): Most keyframes to sample; see sampleKeyframes()
+    scale (int): Downscale factor for sampled frames; see sampleKeyframes()
+    threads (int): Threads ffmpeg uses to decode
+    priority (int): Priority of the ffmpeg process in the POPENPOOL queue
+    **kwargs: Passed to detectBorders()
+
+  Returns:
+    Returns string for FFmpeg video filter in the format crop=w:h:x:y
+    or None if no cropping detected
+
+  """
+
+  log    = logging.getLogger(__name__)
+  frames = sampleKeyframes( infile, maxFrames = maxFrames, scale = scale,
+                            threads = threads, priority = priority )
+  box    = detectBorders( frames, **kwargs )
+  if box is None:
+    log.debug( 'No cropping region detected' )
+    return None
+
+  res      = _probe( infile )[1]
+  x0, y0   = box[2] * scale, box[3] * scale                                             # Back to input size; picture edges may be up to scale pixels inside
+  x1       = min( (box[2] + box[0]) * scale, res[0] )
+  y1       = min( (box[3] + box[1]) * scale, res[1] )
+  x0, y0   = x0 + x0 % 2, y0 + y0 % 2                                                   # Even offsets and sizes for chroma subsampling
+  w, h     = (x1 - x0) // 2 * 2, (y1 - y0) // 2 * 2
+  if (w/res[0] <= 0.5) or (h/res[1] <= 0.5):                                            # Same sanity check as cropdetect()
+    log.debug( 'No cropping region detected' )
+    return None
+  if (w == res[0]) and (h == res[1]):
+    log.debug( 'Crop size same as input size, NOT cropping' )
+    return None
+  log.debug( 'Values for crop: {}'.format((w, h, x0, y0)) )
+  return 'crop={}:{}:{}:{}'.format( w, h, x0, y0 )
+
+###############################################################################
+def estimateMemory( height, encoder = 'x264', preset = 'slow', width = None ):
+  """
+  Estimate memory used by an ffmpeg encode
+
+  The estimate is the size of one raw 4:2:0 frame times the approximate
+  number of frames the encoder keeps for lookahead and reference, plus a
+  fixed overhead for ffmpeg itself. It is intended to be generous; e.g.,
+  about 2 GB for a 2160p libx265 slow encode.
+
+  Arguments:
+    height (int): Height of the video, in pixels
+
+  Keyword arguments:
+    encoder (str): Encoder used; 'x264' or 'x265'
+    preset (str): Encoder preset
+    width (int): Width of the video, in pixels. Default assumes 16:9
+
+  Returns:
+    int: Estimated memory usage in bytes
+
+  """
+
+  if width is None: width = height * 16 // 9                                            # Assume 16:9 if no width
+  frames = _lookahead.get( encoder, _lookahead['x265'] )                               # Default to the larger of the estimates
+  frames = frames.get( preset, frames['default'] )
+  return 200 * 1024**2 + int( width * height * 1.5 ) * frames                           # 200 MB overhead plus frames; 1.5 bytes per pixel for 8-bit 4:2:0
+
 ###############################################################################
 def totalSeconds( *args ):
   """
@@ -480,15 +687,179 @@ class FFmpegProgress(object):
       self.t1  = time.time();                                                  # Update the time at which we are logging
       tmp      = _progPat.findall( line );                                     # Look for progress time in the line
       if len(tmp) == 1:                                                   # If progress time found
-        elapsed = self.t1 - self.t0                                              # Compute the elapsed time
-        prog    = totalSeconds( tmp[0] )[0]                             # Compute total number of seconds comverted so far, take element zero as returns list
-        ratio   = elapsed / prog                                       # Ratio of real-time seconds per seconds of video processed
-        remain  = ratio * (self.dur - prog)                                 # Multiply ratio by the number of seconds of video left to convert
-        endTime = datetime.now() + timedelta( seconds=remain )         # Compute estimated completion time
-        self.log.info( _info.format( endTime ) )                            # Log information
-        if (self.nintervals is not None) and (self.nintervals > 1):               # If the adaptive interval keyword is set AND nn is greater than zero
-          self.nintervals -= 1                                            # Decrement nintervals
-          self.interval    = remain / float(self.nintervals)                   # Set interval to remaining time divided by nn
+        self._logETA( totalSeconds( tmp[0] )[0] )                         # Compute total number of seconds comverted so far, take element zero as returns list
+
+  def update( self, status ):
+    """
+    Log estimated completion time from a Progress instance
+
+    Use as a ProgressPipe callback; no text is parsed, so this is much
+    cheaper than progress() for each update.
+
+    Arguments:
+      status (Progress): Progress of the encode
+
+    Keyword arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    if self.dur is None: self.dur = status.duration
+    if self.dur and status.out_time and (time.time()-self.t1) >= self.interval:
+      self.t1 = time.time()
+      self._logETA( status.out_time )
+
+  def _logETA( self, prog ):
+    elapsed = self.t1 - self.t0                                              # Compute the elapsed time
+    if prog <= 0: return
+    ratio   = elapsed / prog                                       # Ratio of real-time seconds per seconds of video processed
+    remain  = ratio * (self.dur - prog)                                 # Multiply ratio by the number of seconds of video left to convert
+    endTime = datetime.now() + timedelta( seconds=remain )         # Compute estimated completion time
+    self.log.info( _info.format( endTime ) )                            # Log information
+    if (self.nintervals is not None) and (self.nintervals > 1):               # If the adaptive interval keyword is set AND nn is greater than zero
+      self.nintervals -= 1                                            # Decrement nintervals
+      self.interval    = remain / float(self.nintervals)                   # Set interval to remaining time divided by nn
+
+###############################################################################
+def _number( val, unit = '', cast = float ):
+  """Convert ffmpeg progress value to number, removing unit; None if 'N/A'"""
+
+  try:
+    return cast( val[:-len(unit)] if unit and val.endswith(unit) else val )
+  except:
+    return None
+
+class Progress( object ):
+  """
+  One update from ffmpeg's -progress output
+
+  Attributes:
+    frame (int): Frames encoded
+    fps (float): Encode speed, in frames per second
+    bitrate (float): Output bit rate so far, in kbit/s
+    total_size (int): Bytes written so far
+    out_time (float): Position in the output, in seconds
+    speed (float): Encode speed relative to real time
+    done (bool): True for the last update
+    elapsed (float): Seconds since the pipe was opened
+    duration (float): Length of output, in seconds, if known; else None
+
+  """
+
+  def __init__(self, data, elapsed = 0.0, duration = None):
+    """
+    Arguments:
+      data (dict): key/value strings from one block of -progress output
+
+    Keyword arguments:
+      elapsed (float): Seconds since the encode started
+      duration (float): Length of output, in seconds
+
+    Returns:
+      Progress instance
+
+    """
+
+    outTime         = _number( data.get('out_time_us', data.get('out_time_ms', '')), cast = int )  # out_time_ms is also microseconds
+    self.frame      = _number( data.get('frame',      ''), cast = int )
+    self.fps        = _number( data.get('fps',        '') )
+    self.bitrate    = _number( data.get('bitrate',    ''), 'kbits/s' )
+    self.total_size = _number( data.get('total_size', ''), cast = int )
+    self.out_time   = outTime / 1.0e6 if outTime is not None else None
+    self.speed      = _number( data.get('speed',      ''), 'x' )
+    self.done       = data.get('progress', '') == 'end'
+    self.elapsed    = elapsed
+    self.duration   = duration
+
+  def __repr__(self):
+    return '<Progress : {}s of {}s, {} fps, {}x>'.format(
+      self.out_time, self.duration, self.fps, self.speed )
+
+  @property
+  def percent(self):
+    """Percent of output written; None if duration not known"""
+
+    if not self.duration or self.out_time is None: return None
+    return min( 100.0 * self.out_time / self.duration, 100.0 )
+
+  @property
+  def remaining(self):
+    """Estimated seconds until done; None if not known"""
+
+    if not self.duration or not self.out_time: return None
+    return max( self.elapsed * (self.duration - self.out_time) / self.out_time, 0.0 )
+
+class ProgressPipe( Thread ):
+  """
+  Read ffmpeg's -progress output from a pipe and pass Progress instances to callbacks
+
+  Pass an instance as stdout of an ffmpeg command that includes PROGRESS
+  options; like RotatingFile, the pipe is opened when fileno() is first
+  called and lines are read in a separate thread. ffmpeg writes a block of
+  key=value lines about every half second; each block is turned into one
+  Progress instance.
+
+  """
+
+  def __init__(self, duration = None, callbacks = None):
+    """
+    Keyword arguments:
+      duration (float): Length of output, in seconds; used for percent and
+        remaining time
+      callbacks (list): Functions that take a Progress instance
+
+    Returns:
+      ProgressPipe instance
+
+    """
+
+    super().__init__( daemon = True )
+    self.__log     = logging.getLogger(__name__)
+    self.rw        = None
+    self.duration  = duration
+    self.callbacks = list( callbacks or [] )
+    self.last      = None                                                               # Most recent Progress instance
+    self.t0        = time.time()
+
+  def subscribe(self, func):
+    """Add a function to call with each Progress instance"""
+
+    self.callbacks.append( func )
+
+  def start(self):
+    self.rw = os.pipe()
+    super().start()
+
+  def run(self):
+    data = {}
+    with os.fdopen(self.rw[0]) as fid:
+      for line in iter(fid.readline, ''):
+        key, sep, val = line.strip().partition('=')
+        if not sep: continue
+        data[key] = val
+        if key == 'progress':                                                           # Last key of each block
+          self.last = Progress( data, time.time() - self.t0, self.duration )
+          data      = {}
+          for func in self.callbacks:
+            try:
+              func( self.last )
+            except:
+              self.__log.exception( 'Error in progress callback' )
+
+  def close(self):
+    """Close the write-end of the pipe; reading stops once ffmpeg has exited"""
+
+    if self.rw:
+      os.close(self.rw[1])
+      self.rw = None
+
+  def fileno(self):
+    if not self.rw:
+      self.start()
+    return self.rw[1]
 
 
 ###############################################################################
@@ -813,3 +1184,161 @@ def combine_mp4_files(outFile, *args):
 #  args = parser.parse_args()
 #  combine_mp4_files( args.output, *args.inputs );
 
+
+###############################################################################
+def splitKeyframes( inFile, outDir, nSegments, stream = '0:v:0', priority = None,
+                    inputOpts = None, duration = None ):
+  """
+  Split a stream into segments at keyframes without re-encoding
+
+  Segments are cut by the ffmpeg segment muxer at the first keyframe after
+  each of `nSegments` evenly spaced times, so they can be encoded separately
+  and joined back together with concatSegments(). Run through POPENPOOL.
+
+  Arguments:
+    inFile (str): Path of file to split
+    outDir (str): Directory to write segments and segment list to
+    nSegments (int): Number of segments to split into; fewer may be created
+      if there are not enough keyframes
+
+  Keyword arguments:
+    stream (str): Stream specifier of stream to split; default is first
+      video stream
+    priority (int): Priority in the POPENPOOL queue
+    inputOpts (list): ffmpeg options to use as input, in place of
+      ['-i', inFile]; e.g., to read a list from writeCutList()
+    duration (float): Duration of input, in seconds; default is to get it
+      from inFile
+
+  Returns:
+    list: Paths of segments, in order; None on error
+
+  """
+
+  log      = logging.getLogger( __name__ )
+  listFile = os.path.join( outDir, 'segments.ffconcat' )
+  if duration is None: duration = getVideoLength( inFile )
+  times    = [duration * i / nSegments for i in range(1, nSegments)]
+  os.makedirs( outDir, exist_ok = True )
+  cmd  = ['ffmpeg', '-nostdin', '-y', '-v', 'error']
+  cmd += inputOpts if inputOpts else ['-i', inFile]
+  cmd += ['-map', stream, '-c', 'copy']
+  cmd += ['-f', 'segment', '-reset_timestamps', '1']
+  cmd += ['-segment_list', listFile, '-segment_list_type', 'ffconcat']
+  if times:
+    cmd += ['-segment_times', ','.join( '{:0.3f}'.format(t) for t in times )]
+  cmd += [os.path.join( outDir, 'segment_%04d.mkv' )]
+  proc = POPENPOOL.Popen_async( cmd, priority = priority, outputs = [listFile] )
+  proc.wait()
+  if proc.returncode != 0:
+    log.error( 'Failed to split file into segments: {}'.format(inFile) )
+    return None
+  return readConcatList( listFile )
+
+def readConcatList( listFile ):
+  """Return absolute paths of files in an ffconcat list"""
+
+  fdir  = os.path.dirname( listFile )
+  files = []
+  with open(listFile, 'r') as fid:
+    for line in fid:
+      line = line.strip()
+      if line.startswith('file '):
+        path = line[5:].strip()
+        if path.startswith("'") and path.endswith("'"):
+          path = path[1:-1].replace("'\\''", "'")                                      # Undo quoting done by writeConcatList()
+        files.append( os.path.join( fdir, path ) )                                      # Relative paths are relative to list
+  return files
+
+def writeConcatList( listFile, files ):
+  """Write ffconcat list for the concat demuxer"""
+
+  with open(listFile, 'w') as fid:
+    fid.write( 'ffconcat version 1.0' + os.linesep )
+    for path in files:
+      fid.write( "file '{}'".format( path.replace("'", "'\\''") ) + os.linesep )
+
+def concatSegments( outFile, files, priority = None ):
+  """
+  Join segments into one file without re-encoding
+
+  Uses the concat demuxer, so all segments must have the same codec and
+  settings; e.g., segments from splitKeyframes() that were encoded the same way.
+
+  Arguments:
+    outFile (str): Path of joined file
+    files (list): Paths of segments, in order
+
+  Keyword arguments:
+    priority (int): Priority in the POPENPOOL queue
+
+  Returns:
+    bool: True on success, False otherwise
+
+  """
+
+  listFile = os.path.splitext( outFile )[0] + '.ffconcat'
+  writeConcatList( listFile, files )
+  cmd  = ['ffmpeg', '-nostdin', '-y', '-v', 'error']
+  cmd += ['-f', 'concat', '-safe', '0', '-i', listFile]
+  cmd += ['-map', '0', '-c', 'copy', outFile]
+  proc = POPENPOOL.Popen_async( cmd, priority = priority, outputs = [outFile] )
+  proc.wait()
+  os.remove( listFile )
+  return proc.returncode == 0
+
+def writeCutList( listFile, inFile, segments ):
+  """
+  Write ffconcat list that reads only some segments of a file
+
+  Used as input to ffmpeg (with '-f concat -safe 0') so that commercials
+  are skipped while the source is read, instead of cutting them out to
+  intermediate files first.
+
+  Arguments:
+    listFile (str): Path of list to write
+    inFile (str): Path of file to read segments from
+    segments (list): (start, end) tuples of segments to keep, in seconds;
+      end may be None for end of file
+
+  Keyword arguments:
+    None
+
+  Returns:
+    None
+
+  """
+
+  path = os.path.abspath( inFile ).replace("'", "'\\''")
+  with open(listFile, 'w') as fid:
+    fid.write( 'ffconcat version 1.0' + os.linesep )
+    for start, end in segments:
+      fid.write( "file '{}'".format( path ) + os.linesep )
+      fid.write( 'inpoint {:0.3f}'.format( start ) + os.linesep )
+      if end is not None:
+        fid.write( 'outpoint {:0.3f}'.format( end ) + os.linesep )
+
+def readCutList( listFile ):
+  """Return (start, end) segments from list written by writeCutList()"""
+
+  segments = []
+  with open(listFile, 'r') as fid:
+    for line in fid:
+      key, _, val = line.strip().partition(' ')
+      if key == 'inpoint':
+        segments.append( [float(val), None] )
+      elif key == 'outpoint':
+        segments[-1][1] = float(val)
+  return [tuple(seg) for seg in segments]
+
+def readSegmentList( listFile ):
+  """Return (path, start, end) of segments in csv list written by the segment muxer; [] if no list"""
+
+  if not os.path.isfile( listFile ): return []
+  fdir     = os.path.dirname( listFile )
+  segments = []
+  with open(listFile, 'r') as fid:
+    for row in csv.reader( fid ):
+      if len(row) == 3:                                                                 # Only complete rows; list may be cut short by a crash
+        segments.append( (os.path.join( fdir, row[0] ), float(row[1]), float(row[2])) )
+  return segments
@@ -13,6 +13,9 @@ from ..config import CONFIG, ROTATING_FORMAT
 
 EMAILNAME = 'emailer'
 
+_shared     = {}                                                                        # RotatingFileHandler and user count keyed by file path
+_sharedLock = Lock()
+
 ############################################################################### 
 def sendEMail( func ):
   """
@@ -150,6 +153,43 @@ class EMailHandler( logging.Handler ):
     return True
 
 ########################################################################################
+def _openShared( formatter, filename, *args, **kwargs ):
+  """
+  Return RotatingFileHandler for file, creating it if no other RotatingFile has it open
+
+  Several encodes (e.g., chunks, or files in transcode_many) may log to the
+  same file at once; with a handler each, they would roll the file over
+  independently and rename it out from under one another.
+
+  """
+
+  path = os.path.abspath( filename )
+  with _sharedLock:
+    if path in _shared:
+      _shared[path][1] += 1
+      return _shared[path][0]
+    handler = RotatingFileHandler( filename, *args, **kwargs )
+    if isinstance(formatter, logging.Formatter):
+      handler.setFormatter( formatter )                                                 # Set formatting
+    else:
+      handler.setFormatter( logging.Formatter( '%(asctime)s - %(message)s' ) )
+    _shared[path] = [handler, 1]
+    return handler
+
+def _closeShared( handler ):
+  """Release handler from _openShared(); closed when last user releases it"""
+
+  with _sharedLock:
+    for path, (shared, count) in _shared.items():
+      if shared is handler: break
+    else:
+      return
+    if count > 1:
+      _shared[path][1] -= 1
+      return
+    del _shared[path]
+  handler.close()
+
 class RotatingFile( Thread ):
   """
   A class that acts like the logging.handlers.RotatingFileHander;
@@ -171,11 +211,7 @@ class RotatingFile( Thread ):
         kwargs[key] = val
 
     formatter       = kwargs.pop('formatter', None)
-    self.log        = RotatingFileHandler(*args, **kwargs)                              # Initialize rotating file handler
-    if isinstance(formatter, logging.Formatter):
-      self.log.setFormatter( formatter )                                                # Set formatting
-    else:
-      self.log.setFormatter( logging.Formatter( '%(asctime)s - %(message)s' ) )
+    self.log        = _openShared( formatter, *args, **kwargs )                         # Rotating file handler shared by all instances writing the file
 
   def __enter__(self, *args, **kwargs):
     self.start()
@@ -210,7 +246,7 @@ class RotatingFile( Thread ):
     with os.fdopen(self.rw[0]) as fid:                                                  # Open the read-end of pipe
       for line in iter(fid.readline, ''):                                               # Iterate over all lines
         record = logging.LogRecord('', 20, '', '', line.rstrip(), '', '')
-        self.log.emit( record )                                                         # Pass line to rotating logger
+        self.log.handle( record )                                                       # Pass line to rotating logger; handle() locks, as handler is shared
         if self.callback:                                                               # If call back is set
           self.callback( line )                                                         # Pass line to call back
     self.close()
@@ -221,7 +257,10 @@ class RotatingFile( Thread ):
     if self.rw:                                                                         # If rw is set
       os.close(self.rw[1])                                                              # Close the write-end of pipe
       self.rw = None                                                                    # Set rw to None
-    self.log.close()                                                                    # Close the log
+      if self.is_alive(): return                                                        # Reader thread closes log once pipe drained
+    if self.log:
+      _closeShared( self.log )                                                          # Close the log once no instance uses it
+      self.log = None
  
   def fileno(self):
     """Method to get underlying file pointer; in this case pipe"""
@@ -0,0 +1,216 @@
+import logging
+import os, json, time, hashlib
+import sqlite3
+import psutil
+from threading import Lock
+
+from ..config import APPDIR
+
+JOURNAL     = os.path.join( APPDIR, 'jobs.sqlite' )                                     # Default journal file
+QUEUED      = 'queued'
+DONE        = 'done'
+FAILED      = 'failed'
+INTERRUPTED = 'interrupted'
+
+_schema = (
+  'CREATE TABLE IF NOT EXISTS jobs ('
+    'key TEXT PRIMARY KEY, cmd TEXT, state TEXT, returncode INTEGER, '
+    'pid INTEGER, created REAL, updated REAL)',
+  'CREATE TABLE IF NOT EXISTS outputs ('
+    'path TEXT PRIMARY KEY, key TEXT, size INTEGER, mtime_ns INTEGER)',
+  'CREATE INDEX IF NOT EXISTS outputs_key ON outputs (key)',
+)
+
+def jobKey( cmd ):
+  """Return unique key for a command; same command gives same key"""
+
+  if isinstance(cmd, str): cmd = [cmd]
+  return hashlib.sha1( json.dumps( [str(c) for c in cmd] ).encode() ).hexdigest()
+
+def _stat( path ):
+  """Return size and modification time of file; None if it does not exist"""
+
+  try:
+    st = os.stat( path )
+  except OSError:
+    return None
+  return st.st_size, st.st_mtime_ns
+
+class JobJournal( object ):
+  """
+  Crash-safe record of pool jobs and the files they produce
+
+  Jobs are recorded in an SQLite database in WAL mode with full synchronous
+  writes, so a job that finished is still marked as finished after a crash
+  or power loss. When a job with the same command is submitted again, e.g.,
+  after the watchdog restarts, it is skipped if it finished and all of its
+  output files still exist unchanged.
+
+  Only jobs submitted with the `outputs` keyword are recorded, as there is no
+  other way to check that their work is still valid.
+
+  """
+
+  def __init__(self, path = None):
+    """
+    Keyword arguments:
+      path (str): Path to journal file; default is JOURNAL
+
+    Returns:
+      JobJournal instance
+
+    """
+
+    self.__log  = logging.getLogger(__name__)
+    self.__lock = Lock()
+    self.path   = path or JOURNAL
+    fdir = os.path.dirname( self.path )
+    if fdir != '': os.makedirs( fdir, exist_ok = True )
+    self.__db   = sqlite3.connect( self.path, check_same_thread = False, isolation_level = None )
+    self.__db.execute( 'PRAGMA journal_mode=WAL' )
+    self.__db.execute( 'PRAGMA synchronous=FULL' )                                      # Commits survive power loss
+    for sql in _schema:
+      self.__db.execute( sql )
+    interrupted = self.recover()
+    if len(interrupted) > 0:
+      self.__log.info( '{} job(s) were interrupted by a restart and will be run again when resubmitted'.format(
+        len(interrupted) ) )
+
+  def close(self):
+    with self.__lock:
+      self.__db.close()
+
+  def queued(self, cmd, outputs):
+    """
+    Record that job was queued
+
+    Arguments:
+      cmd (list): Command for the job
+      outputs (list): Paths to files the job creates
+
+    Keyword arguments:
+      None
+
+    Returns:
+      str: Key for the job
+
+    """
+
+    key = jobKey( cmd )
+    now = time.time()
+    with self.__lock, self.__db:
+      self.__db.execute( 'BEGIN' )
+      self.__db.execute(
+        'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, NULL, ?, ?, ?)',
+        (key, json.dumps( [str(c) for c in cmd] ), QUEUED, os.getpid(), now, now) )
+      self.__db.execute( 'DELETE FROM outputs WHERE key = ?', (key,) )
+      self.__db.executemany( 'INSERT OR REPLACE INTO outputs VALUES (?, ?, NULL, NULL)',
+        [(os.path.abspath(path), key) for path in outputs] )
+    return key
+
+  def finished(self, key, returncode, interrupted = False):
+    """
+    Record that job finished; sizes/times of outputs are stored if successful
+
+    Arguments:
+      key (str): Key for the job from queued()
+      returncode (int): Return code of the job
+
+    Keyword arguments:
+      interrupted (bool): Set if job was stopped by SIGINT/SIGTERM
+
+    Returns:
+      None
+
+    """
+
+    if returncode == 0:
+      state = DONE
+    else:
+      state = INTERRUPTED if interrupted else FAILED
+    with self.__lock, self.__db:
+      self.__db.execute( 'BEGIN' )
+      if state == DONE:
+        paths = [row[0] for row in self.__db.execute( 'SELECT path FROM outputs WHERE key = ?', (key,) )]
+        for path in paths:
+          info = _stat( path )
+          if info is None:                                                              # Output missing, so cannot skip job later
+            state = FAILED
+            break
+          self.__db.execute( 'UPDATE outputs SET size = ?, mtime_ns = ? WHERE path = ?', info + (path,) )
+      self.__db.execute( 'UPDATE jobs SET state = ?, returncode = ?, updated = ? WHERE key = ?',
+        (state, returncode, time.time(), key) )
+
+  def completed(self, cmd, outputs):
+    """
+    Check if job finished in a previous run and its outputs are unchanged
+
+    Arguments:
+      cmd (list): Command for the job
+      outputs (list): Paths to files the job creates
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if job can be skipped
+
+    """
+
+    key = jobKey( cmd )
+    with self.__lock:
+      row = self.__db.execute( 'SELECT state FROM jobs WHERE key = ?', (key,) ).fetchone()
+      if row is None or row[0] != DONE: return False
+      rows = self.__db.execute( 'SELECT path, size, mtime_ns FROM outputs WHERE key = ?', (key,) ).fetchall()
+    recorded = {path : (size, mtime) for path, size, mtime in rows}
+    paths    = [os.path.abspath(path) for path in outputs]
+    if set(paths) != set(recorded): return False
+    return all( _stat(path) == recorded[path] for path in paths )
+
+  def produced(self, path):
+    """
+    Check if file was fully written by a job that finished
+
+    Arguments:
+      path (str): Path to file
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if file was created by job that finished successfully and
+        has not changed since
+
+    """
+
+    path = os.path.abspath( path )
+    with self.__lock:
+      row = self.__db.execute(
+        'SELECT outputs.size, outputs.mtime_ns FROM outputs JOIN jobs ON outputs.key = jobs.key '
+        'WHERE outputs.path = ? AND jobs.state = ?', (path, DONE) ).fetchone()
+    return row is not None and _stat( path ) == tuple(row)
+
+  def recover(self):
+    """
+    Mark jobs left queued by a process that no longer exists as interrupted
+
+    Returns:
+      list: Commands of the interrupted jobs
+
+    """
+
+    with self.__lock, self.__db:
+      self.__db.execute( 'BEGIN' )
+      rows = self.__db.execute( 'SELECT key, cmd, pid FROM jobs WHERE state = ?', (QUEUED,) ).fetchall()
+      rows = [row for row in rows if row[2] == os.getpid() or not psutil.pid_exists( row[2] )]
+      self.__db.executemany( 'UPDATE jobs SET state = ? WHERE key = ?', [(INTERRUPTED, row[0]) for row in rows] )
+    return [json.loads( row[1] ) for row in rows]
+
+  def purge(self, age = 30 * 86400.0):
+    """Remove jobs that were last updated more than `age` seconds ago"""
+
+    with self.__lock, self.__db:
+      self.__db.execute( 'BEGIN' )
+      keys = self.__db.execute( 'SELECT key FROM jobs WHERE updated < ?', (time.time() - age,) ).fetchall()
+      self.__db.executemany( 'DELETE FROM outputs WHERE key = ?', keys )
+      self.__db.executemany( 'DELETE FROM jobs WHERE key = ?', keys )
@@ -0,0 +1,124 @@
+import logging
+import psutil
+from threading import Thread, Event
+
+from .. import _sigtermEvent
+from .subprocPool import PROCLOCK
+from .threadCheck import MINTHREADS, MAXTHREADS
+
+INTERVAL = 30.0                                                                         # Seconds between load checks
+TARGET   = 0.9                                                                          # Fraction of CPUs to keep busy
+
+def runQueue():
+  """
+  Number of runnable tasks on the system
+
+  Read from /proc/loadavg; falls back to the one (1) minute load average on
+  systems without /proc.
+
+  """
+
+  try:
+    with open('/proc/loadavg', 'r') as fid:
+      return float( fid.read().split()[3].split('/')[0] )                               # Fourth field is running/total tasks
+  except (OSError, IndexError, ValueError):
+    return psutil.getloadavg()[0]
+
+class LoadController( Thread ):
+  """
+  Adjust number of threads a PopenPool may use based on system load
+
+  Every `interval` seconds, the load average, run-queue length, and CPU steal
+  time are sampled with psutil. Load not caused by the pool (e.g., a Plex
+  transcoder) is estimated by subtracting the threads the pool currently uses,
+  and the pool threads are set so that total load stays near `target` times
+  the number of CPUs. Threads are lowered right away when the machine gets
+  busy, but only raised one (1) at a time so the controller does not
+  oscillate. Processes already running are never stopped; a lower value only
+  keeps new ones from starting.
+
+  """
+
+  def __init__(self, pool, minThreads = None, maxThreads = None, interval = None, target = None):
+    """
+    Arguments:
+      pool (PopenPool): Pool to control
+
+    Keyword arguments:
+      minThreads (int): Lowest number of threads to allow; default is MINTHREADS
+      maxThreads (int): Highest number of threads to allow; default is MAXTHREADS
+      interval (float): Seconds between load checks; default is INTERVAL
+      target (float): Fraction of CPUs to keep busy; default is TARGET
+
+    Returns:
+      LoadController instance; thread is started automatically
+
+    """
+
+    super().__init__( daemon = True )
+    self.__log      = logging.getLogger(__name__)
+    self.__stop     = Event()
+    self.pool       = pool
+    self.minThreads = MINTHREADS if minThreads is None else max(int(minThreads), MINTHREADS)
+    self.maxThreads = MAXTHREADS if maxThreads is None else min(int(maxThreads), MAXTHREADS)
+    self.maxThreads = max( self.maxThreads, self.minThreads )
+    self.interval   = INTERVAL   if interval   is None else float(interval)
+    self.target     = TARGET     if target     is None else float(target)
+    psutil.cpu_times_percent( interval = None )                                         # First call only primes the counters
+    self.start()
+
+  def stop(self):
+    """Stop adjusting pool threads"""
+
+    self.__stop.set()
+
+  def sample(self):
+    """
+    Sample system load
+
+    Returns:
+      tuple: Load average (1 minute), run-queue length, and CPU steal percent
+
+    """
+
+    load  = psutil.getloadavg()[0]
+    queue = runQueue()
+    steal = getattr( psutil.cpu_times_percent( interval = None ), 'steal', 0.0 )        # Only available on Linux
+    return load, queue, steal
+
+  def compute(self, load, queue, steal):
+    """
+    Compute new number of pool threads
+
+    Arguments:
+      load (float): Load average
+      queue (float): Run-queue length
+      steal (float): CPU steal percent
+
+    Returns:
+      int: New number of threads, within minThreads and maxThreads
+
+    """
+
+    cpus     = (psutil.cpu_count() or 1) * (1.0 - steal / 100.0)                        # CPUs actually available to this machine
+    external = max( max(load, queue) - PROCLOCK.n, 0.0 )                                 # Load not caused by the pool
+    threads  = int( cpus * self.target - external )                                     # Threads pool can use and stay on target
+    current  = self.pool.threads
+    if threads > current:
+      threads = current + 1                                                             # Ramp up slowly
+    return min( max( threads, self.minThreads ), self.maxThreads )
+
+  def run(self):
+    self.__log.debug( 'Load controller started; threads between {} and {}'.format(
+      self.minThreads, self.maxThreads) )
+    while not self.__stop.wait( self.interval ) and not _sigtermEvent.is_set():
+      try:
+        load, queue, steal = self.sample()
+        threads = self.compute( load, queue, steal )
+      except:
+        self.__log.exception( 'Failed to sample system load' )
+        continue
+      if threads != self.pool.threads:
+        self.__log.info( 'Setting pool threads to {}; load {:0.2f}, run-queue {:0.0f}, steal {:0.1f}%'.format(
+          threads, load, queue, steal) )
+        self.pool.threads = threads
@@ -0,0 +1,211 @@
+import logging
+import os, re, shutil
+
+from .. import POPENPOOL
+from ..config import CONFIG
+
+PRESETS    = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast',
+              'medium', 'slow', 'slower', 'veryslow')                                   # x264/x265 presets, fastest to slowest
+CANDIDATES = ('veryfast', 'fast', 'medium', 'slow')                                     # Presets tried by default
+WINDOWS    =  3                                                                         # Number of windows of the input to sample
+WINDOW     = 10.0                                                                       # Length, in seconds, of each window
+MINGAIN    = CONFIG.get('TUNE_MIN_GAIN', None) or 0.03                                  # Smallest size reduction worth a slower preset
+MINFPS     = CONFIG.get('TUNE_MIN_FPS',  None)                                          # Throughput target for full encode, in frames per second
+DEADLINE   = CONFIG.get('TUNE_DEADLINE', None)                                          # Target time for full encode, in seconds
+
+_framePat  = re.compile( r'frame=\s*(\d+)' )
+_benchPat  = re.compile( r'bench: utime=([\d.]+)s stime=([\d.]+)s' )
+
+def sampleTimes( duration, nWindows = WINDOWS, window = WINDOW ):
+  """
+  Start times of evenly spaced windows, skipping the first and last 10% of the file
+
+  Arguments:
+    duration (float): Length of the input, in seconds
+
+  Keyword arguments:
+    nWindows (int): Number of windows
+    window (float): Length of each window, in seconds
+
+  Returns:
+    list: Start times, in seconds
+
+  """
+
+  start = 0.1 * duration
+  span  = max( 0.8 * duration - window, 0.0 )
+  if nWindows < 2 or span == 0.0:
+    return [start]
+  return [start + span * i / (nWindows - 1) for i in range(nWindows)]
+
+def setPreset( opts, preset ):
+  """Return copy of ffmpeg options with the value of -preset replaced"""
+
+  opts = list( opts )
+  if '-preset' in opts:
+    opts[ opts.index('-preset')+1 ] = preset
+  else:
+    opts += ['-preset', preset]
+  return opts
+
+def _parseLog( logFile ):
+  """Return frames encoded and CPU seconds used from ffmpeg -stats -benchmark output"""
+
+  with open(logFile, 'r') as fid:
+    text = fid.read()
+  frames = _framePat.findall( text )
+  bench  = _benchPat.findall( text )
+  if len(frames) == 0 or len(bench) == 0:
+    return None
+  return int( frames[-1] ), sum( float(i) for i in bench[-1] )
+
+class PresetTuner( object ):
+  """
+  Choose encoder preset by encoding short samples of the input
+
+  A few windows of the input are encoded with each candidate preset, through
+  POPENPOOL so the samples run at the same time. Each sample uses one (1)
+  thread and the CPU time reported by ffmpeg's -benchmark is used, so
+  samples do not skew each other's speed. Encode speed at `threads` threads
+  is then estimated assuming the encoder keeps all threads busy, which is
+  somewhat optimistic for large thread counts.
+
+  The preset chosen is the slowest one that meets the throughput target
+  (minFPS, or the frame rate needed to finish within deadline); if there is
+  no target, presets stop getting slower once the output is less than
+  minGain smaller than the next faster preset.
+
+  """
+
+  def __init__(self, inFile, videoOpts, duration, threads = 1,
+               mapping = '0:v:0', priority = None, workDir = None):
+    """
+    Arguments:
+      inFile (str): Path to input file
+      videoOpts (list): ffmpeg video options for the encode; e.g., from
+        VideoConverter._videoOpts(). The -preset option is replaced for
+        each sample
+      duration (float): Length of the video that will be encoded, in seconds
+
+    Keyword arguments:
+      threads (int): Threads the full encode will use
+      mapping (str): Stream specifier of the video stream
+      priority (int): Priority in the POPENPOOL queue
+      workDir (str): Directory for sample files; removed when done. Default
+        is next to the input file
+
+    Returns:
+      PresetTuner instance
+
+    """
+
+    self.__log     = logging.getLogger(__name__)
+    self.inFile    = inFile
+    self.videoOpts = list( videoOpts )
+    self.duration  = float( duration )
+    self.threads   = max( int(threads), 1 )
+    self.mapping   = mapping
+    self.priority  = priority
+    self.workDir   = workDir or '{}.tune'.format( os.path.splitext(inFile)[0] )
+    self.results   = {}                                                                 # fps, bytes, and seconds for full encode, by preset
+
+  def calibrate(self, presets = None, nWindows = WINDOWS, window = WINDOW):
+    """
+    Encode samples with each preset and estimate full encode speed and size
+
+    Keyword arguments:
+      presets (list): Presets to try; default is CANDIDATES
+      nWindows (int): Number of windows of the input to sample
+      window (float): Length of each window, in seconds
+
+    Returns:
+      dict: Estimates for the full encode keyed by preset; each is a dict with
+        'fps', 'bytes', and 'seconds'. Presets whose samples failed are missing
+
+    """
+
+    presets = [p for p in PRESETS if p in (presets or CANDIDATES)]                      # Order fastest to slowest
+    starts  = sampleTimes( self.duration, nWindows, window )
+    os.makedirs( self.workDir, exist_ok = True )
+    self.__log.info( 'Sampling {} window(s) of {:0.0f} s with presets: {}'.format(
+      len(starts), window, ', '.join(presets) ) )
+
+    procs = []
+    for preset in presets:
+      opts = setPreset( self.videoOpts, preset )
+      for i, start in enumerate( starts ):
+        base = os.path.join( self.workDir, '{}_{}'.format(preset, i) )
+        cmd  = ['ffmpeg', '-nostdin', '-y', '-stats', '-benchmark']
+        cmd += ['-ss', '{:0.3f}'.format(start), '-i', self.inFile, '-t', str(window)]
+        cmd += ['-map', self.mapping, '-threads', '1'] + opts + [base + '.mkv']
+        proc = POPENPOOL.Popen_async( cmd, threads = 1, priority = self.priority,
+                 stderr = base + '.log' )
+        procs.append( (preset, base, proc) )
+
+    samples = {preset : [] for preset in presets}
+    for preset, base, proc in procs:
+      proc.wait()
+      info = _parseLog( base + '.log' ) if proc.returncode == 0 else None
+      if info is None or not os.path.isfile( base + '.mkv' ):
+        self.__log.warning( 'Sample failed: {}'.format(base) )
+        continue
+      samples[preset].append( info + (os.stat(base + '.mkv').st_size,) )
+    shutil.rmtree( self.workDir, ignore_errors = True )
+
+    self.results = {}
+    for preset in presets:
+      if len(samples[preset]) != len(starts): continue                                  # Compare presets on same windows only
+      frames, cpu, size = [sum(i) for i in zip( *samples[preset] )]
+      sampled = min( window, self.duration ) * len(starts)
+      fps     = frames / max(cpu, 1e-3) * self.threads
+      total   = frames * self.duration / sampled                                        # Estimated frames in full encode
+      self.results[preset] = {'fps'     : fps,
+                              'bytes'   : int( size * self.duration / sampled ),
+                              'seconds' : total / fps}
+      self.__log.info( 'Preset {:9}: {:6.1f} fps, {:7.1f} MB, {:6.0f} s'.format(
+        preset, fps, self.results[preset]['bytes'] / 1024**2, self.results[preset]['seconds'] ) )
+    return self.results
+
+  def choose(self, minFPS = None, deadline = None, minGain = None):
+    """
+    Choose preset from calibrate() results
+
+    Keyword arguments:
+      minFPS (float): Slowest acceptable encode speed; default is MINFPS
+      deadline (float): Longest acceptable encode time, in seconds; default
+        is DEADLINE
+      minGain (float): Smallest fractional size reduction that makes a
+        slower preset worth it; default is MINGAIN
+
+    Returns:
+      str: Preset name; None if calibrate() found no usable results
+
+    """
+
+    if len(self.results) == 0: return None
+    minFPS   = MINFPS   if minFPS   is None else minFPS
+    deadline = DEADLINE if deadline is None else deadline
+    minGain  = MINGAIN  if minGain  is None else minGain
+    presets  = [p for p in PRESETS if p in self.results]
+
+    if minFPS or deadline:
+      ok = [p for p in presets
+              if (not minFPS   or self.results[p]['fps']     >= minFPS) and
+                 (not deadline or self.results[p]['seconds'] <= deadline)]
+      preset = ok[-1] if ok else presets[0]                                             # Fastest preset if none meet target
+      if not ok:
+        self.__log.warning( 'No preset meets target; using fastest tried' )
+    else:
+      preset = presets[0]
+      for p in presets[1:]:
+        gain = 1.0 - self.results[p]['bytes'] / max(self.results[preset]['bytes'], 1)
+        if gain < minGain: break                                                        # Diminishing returns
+        preset = p
+    self.__log.info( 'Chose preset {}'.format(preset) )
+    return preset
+
+  def estimate(self, preset):
+    """Return (bytes, seconds) estimate for full encode with preset; None if not calibrated"""
+
+    info = self.results.get( preset, None )
+    return (info['bytes'], info['seconds']) if info else None
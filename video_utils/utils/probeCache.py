@@ -0,0 +1,158 @@
+import logging
+import os, json, time
+import sqlite3
+from threading import Lock
+
+from ..config import CACHEDIR, CONFIG
+
+CACHE   = os.path.join( CACHEDIR, 'probes.sqlite' )                                     # Default cache file
+ENABLED = CONFIG.get('PROBE_CACHE', None) is not False                                  # Only disabled if set to false in settings
+MAXAGE  = float( CONFIG.get('PROBE_CACHE_DAYS', None) or 30 ) * 86400                   # Entries not used for this many seconds are removed
+
+_schema = (
+  'CREATE TABLE IF NOT EXISTS probes ('
+    'dev INTEGER, ino INTEGER, tool TEXT, size INTEGER, mtime_ns INTEGER, '
+    'data TEXT, used REAL, PRIMARY KEY (dev, ino, tool))',
+)
+
+_cache = None
+_lock  = Lock()
+
+def probeKey( path ):
+  """
+  Return key that identifies a file and its contents
+
+  A file that is renamed or hard linked keeps its key; one that is written
+  to gets a new key.
+
+  Arguments:
+    path (str): Path to file
+
+  Keyword arguments:
+    None
+
+  Returns:
+    tuple: (device, inode, size, mtime_ns); None if the file does not exist
+
+  """
+
+  try:
+    st = os.stat( path )
+  except OSError:
+    return None
+  return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+def getProbeCache():
+  """Return the shared ProbeCache, opening it on first use; None if disabled or it cannot be opened"""
+
+  global _cache
+  if not ENABLED: return None
+  with _lock:
+    if _cache is None:
+      try:
+        _cache = ProbeCache()
+      except:
+        logging.getLogger(__name__).warning( 'Failed to open probe cache; files will be probed every time' )
+        _cache = False                                                                  # Do not try again
+  return _cache or None
+
+class ProbeCache( object ):
+  """
+  Cache of parsed probe output (e.g., mediainfo) for files
+
+  Entries are stored in an SQLite database in WAL mode, so several processes
+  (e.g., both watchdogs and batch jobs) can share it. An entry is found by
+  the device and inode of a file, and is only used if the size and
+  modification time of the file are unchanged, so changed files are probed
+  again without any explicit invalidation. The tool string lets output of
+  different programs, or program versions, be kept apart.
+
+  """
+
+  def __init__(self, path = None, maxAge = None):
+    """
+    Keyword arguments:
+      path (str): Path to cache file; default is CACHE
+      maxAge (float): Remove entries not used for this many seconds; default
+        is MAXAGE
+
+    Returns:
+      ProbeCache instance
+
+    """
+
+    self.__log  = logging.getLogger(__name__)
+    self.__lock = Lock()
+    self.path   = path or CACHE
+    self.maxAge = MAXAGE if maxAge is None else maxAge
+    fdir = os.path.dirname( self.path )
+    if fdir != '': os.makedirs( fdir, exist_ok = True )
+    self.__db   = sqlite3.connect( self.path, timeout = 30, check_same_thread = False, isolation_level = None )
+    self.__db.execute( 'PRAGMA journal_mode=WAL' )
+    self.__db.execute( 'PRAGMA synchronous=NORMAL' )                                    # Losing recent entries on power loss only means probing again
+    for sql in _schema:
+      self.__db.execute( sql )
+    self.evict()
+
+  def close(self):
+    with self.__lock:
+      self.__db.close()
+
+  def get(self, key, tool = ''):
+    """
+    Return cached data for a file
+
+    Arguments:
+      key (tuple): Key from probeKey()
+
+    Keyword arguments:
+      tool (str): Name and version of program that made the data
+
+    Returns:
+      Data stored with put(); None if not cached or file changed
+
+    """
+
+    if key is None: return None
+    try:
+      with self.__lock:
+        row = self.__db.execute(
+          'SELECT data FROM probes WHERE dev = ? AND ino = ? AND tool = ? AND size = ? AND mtime_ns = ?',
+          (key[0], key[1], tool, key[2], key[3]) ).fetchone()
+        if row is None: return None
+        self.__db.execute( 'UPDATE probes SET used = ? WHERE dev = ? AND ino = ? AND tool = ?',
+          (time.time(), key[0], key[1], tool) )
+      return json.loads( row[0] )
+    except:
+      self.__log.warning( 'Failed to read probe cache' )
+      return None
+
+  def put(self, key, data, tool = ''):
+    """
+    Store data for a file; replaces data stored for an older version of the file
+
+    Arguments:
+      key (tuple): Key from probeKey(), taken before the file was probed
+      data: JSON serializable data
+
+    Keyword arguments:
+      tool (str): Name and version of program that made the data
+
+    Returns:
+      None
+
+    """
+
+    if key is None: return
+    try:
+      with self.__lock:
+        self.__db.execute( 'INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?)',
+          (key[0], key[1], tool, key[2], key[3], json.dumps( data ), time.time()) )
+    except:
+      self.__log.warning( 'Failed to write probe cache' )
+
+  def evict(self):
+    """Remove entries not used in maxAge seconds"""
+
+    with self.__lock:
+      self.__db.execute( 'DELETE FROM probes WHERE used < ?', (time.time() - self.maxAge,) )
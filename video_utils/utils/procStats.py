@@ -0,0 +1,181 @@
+import logging
+import os, json, time
+from threading import Lock, local, get_native_id
+
+_local = local()                                                                         # Per thread stack of Collector lists
+
+def readProcIO( pid ):
+  """
+  Read I/O counters for a process from /proc
+
+  Must be called before the process is reaped.
+
+  Arguments:
+    pid (int): Process ID
+
+  Keyword arguments:
+    None
+
+  Returns:
+    dict: Counters from /proc/PID/io (rchar, wchar, read_bytes, write_bytes, ...);
+      None if not available
+
+  """
+
+  try:
+    with open( '/proc/{}/io'.format(pid), 'r' ) as fid:
+      lines = fid.readlines()
+  except OSError:
+    return None
+  io = {}
+  for line in lines:
+    key, _, val = line.partition(':')
+    try:
+      io[key.strip()] = int(val)
+    except ValueError:
+      pass
+  return io
+
+def readThreadIO():
+  """Read I/O counters for the calling thread from /proc; see readProcIO()"""
+
+  return readProcIO( 'self/task/{}'.format( get_native_id() ) )
+
+def collect( stats ):
+  """
+  Pass ProcStats to every Collector open in the calling thread
+
+  Called by the pool when a subprocess is submitted, so the statistics,
+  which are filled in when the process finishes, can be added to the
+  stage that started the process.
+
+  Arguments:
+    stats (ProcStats): Statistics of the new process
+
+  Keyword arguments:
+    None
+
+  Returns:
+    None
+
+  """
+
+  for collector in getattr( _local, 'collectors', () ):
+    collector.append( stats )
+
+class Collector( list ):
+  """
+  Context manager that collects ProcStats of subprocesses submitted from this thread
+
+  Collectors can be nested; a process is added to all open collectors.
+
+  """
+
+  def __enter__(self):
+    if not hasattr( _local, 'collectors' ): _local.collectors = []
+    _local.collectors.append( self )
+    return self
+
+  def __exit__(self, *args):
+    _local.collectors.remove( self )
+
+########################################################################################
+class ProcStats( object ):
+  """
+  Resource usage of a single pool subprocess
+
+  Times are in seconds and memory/IO values in bytes. Values that could not
+  be measured (e.g., no rusage for processes reaped by asyncio) are None.
+
+  """
+
+  FIELDS = ('name', 'pid', 'returncode', 'priority', 'threads', 'submitted',
+            'queue_wait', 'lock_wait', 'wall', 'cpu_user', 'cpu_sys', 'max_rss',
+            'read_bytes', 'write_bytes')
+
+  def __init__(self, **kwargs):
+    for key in self.FIELDS:
+      setattr( self, key, kwargs.get(key, None) )
+
+  def __repr__(self):
+    return '<ProcStats : {}>'.format( self.name )
+
+  def __str__(self):
+    info = ['{}={}'.format(key, self._fmt(getattr(self, key))) for key in self.FIELDS[1:]]
+    return '{} : {}'.format( self.name, ', '.join(info) )
+
+  @staticmethod
+  def _fmt( val ):
+    return '{:0.3f}'.format(val) if isinstance(val, float) else str(val)
+
+  @property
+  def cpu(self):
+    """Total CPU seconds; None if not available"""
+
+    if self.cpu_user is None or self.cpu_sys is None: return None
+    return self.cpu_user + self.cpu_sys
+
+  def update(self, rusage = None, io = None):
+    """
+    Update values from resource usage and I/O counters
+
+    Keyword arguments:
+      rusage (resource.struct_rusage): Resource usage from os.wait4()
+      io (dict): I/O counters from readProcIO()
+
+    Returns:
+      None
+
+    """
+
+    if rusage is not None:
+      self.cpu_user = rusage.ru_utime
+      self.cpu_sys  = rusage.ru_stime
+      self.max_rss  = rusage.ru_maxrss * 1024                                           # Linux reports kilobytes
+    if io is not None:
+      self.read_bytes  = io.get('read_bytes',  None)
+      self.write_bytes = io.get('write_bytes', None)
+
+  def asdict(self):
+    """Return values as a dictionary"""
+
+    return {key : getattr(self, key) for key in self.FIELDS}
+
+########################################################################################
+class JSONLinesSink( object ):
+  """Append ProcStats to a file, one JSON object per line"""
+
+  def __init__(self, path):
+    """
+    Arguments:
+      path (str): File to append statistics to
+
+    """
+
+    self.path   = path
+    self.__lock = Lock()
+    fdir = os.path.dirname( path )
+    if fdir != '': os.makedirs( fdir, exist_ok = True )
+
+  def __call__(self, stats):
+    line = json.dumps( stats.asdict() ) + '\n'
+    with self.__lock:
+      with open( self.path, 'a' ) as fid:
+        fid.write( line )
+
+class LoggingSink( object ):
+  """Log ProcStats"""
+
+  def __init__(self, logger = None, level = logging.INFO):
+    """
+    Keyword arguments:
+      logger (logging.Logger): Logger to use; default is logger for this module
+      level (int): Logging level
+
+    """
+
+    self.log   = logger or logging.getLogger(__name__)
+    self.level = level
+
+  def __call__(self, stats):
+    self.log.log( self.level, str(stats) )
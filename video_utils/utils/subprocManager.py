@@ -1,58 +1,55 @@
 import logging
-import os, time
-from subprocess import Popen, STDOUT, DEVNULL
-from threading import Thread, Event
-from multiprocessing import cpu_count
-
-from .. import _sigintEvent, _sigtermEvent                             # Import kill event
-from ..utils.checkCLI import checkCLI
-
-nthreads = cpu_count() // 2                                                     # Set global nthreads as half the number of cpus
-
-try:
-  cpulimitInstalled = checkCLI( 'cpulimit' )
-except:
-  logging.getLogger(__name__).warning(
-    'cpulimit NOT found! Cannot limit CPU usage!'
-  );                                                                            # Log a warning
-  cpulimitInstalled = False;                                                    # Set global cpulimitInstalled flag to False;
-else:
-  cpulimitInstalled = True;                                                       # Set global cpulimitInstalled flag to True
+import os
+import time
+from concurrent.futures import Future
+from threading import Lock, Event
+
+from .. import POPENPOOL, isRunning
+from .subprocPool import PRIORITY_BATCH
+from .threadCheck import threadCheck, HALFTHREADS
 
 class SubprocManager(object):
-  def __init__(self, cpulimit = None, threads = None, interval = None, **kwargs):
-    """ 
+  """
+  Run a batch of commands through the global POPENPOOL
+
+  All commands are admitted by the pool, so they share the thread budget
+  with every other subprocess (e.g., an ffmpeg encode) instead of running on
+  top of it. At most `threads` commands from the batch are in the pool at
+  one time, and each command gets a concurrent.futures.Future that resolves
+  to its return code.
+
+  """
+
+  def __init__(self, cpulimit = None, threads = None, interval = None, priority = None, **kwargs):
+    """
     Keyword arguments:
-       cpulimit : Limit, in percent, for CPU usage. 
+       cpulimit : Limit, in percent, for CPU usage.
                    Values range from 1 - 100.
                    A value of 0 means no limiting.
-                   Default is 75%
+                   Default is to use the POPENPOOL cpulimit
        threads  : Number of processes that can be run at one time.
                    Default is half the number of cores, or 1
-       interval : Update interval for checking process completion.
-                   Default is 0.5 seconds. 
-                   Smallest interval is 0.01 seconds or 10 ms
-                   Smaller values will catch process completions faster,
-                   but will also use more resources while checking for
-                   process completion.
+       interval : Ignored; kept for backwards compatibility. Process
+                   completion is signaled by the pool, not polled.
+       priority : Priority of the processes in the pool; see
+                   PopenPool.Popen_async. Default is PRIORITY_BATCH
 
     """
 
     super().__init__(**kwargs);
-    self.__log           = logging.getLogger(__name__);                         # Get logger for the class
+    self.__log         = logging.getLogger(__name__);                           # Get logger for the class
     self.cpulimit      = cpulimit;                                              # Set cpulimit attribute to user input cpulimit; see @properties at bottom for defaults
     self.threads       = threads;                                               # Set threads attribute to user input threads; see @properties at bottom for defaults
-    self.interval      = interval;                                              # Set interval attribute to user input interval; see @properties at bottom for defaults
+    self.interval      = interval;
+    self.priority      = PRIORITY_BATCH if priority is None else priority
     self._logFMT       = 'Process {:3d} of {:3d} - {}';                         # Format for logging message
-    self.__n           =  0;                                                    # Counter for the process number being run
+    self.__lock        = Lock()                                                 # Protects queue, running, and futures
+    self.__queue       = [];                                                    # Commands waiting to be submitted to the pool
+    self.__running     = [];                                                    # PopenThread instances submitted to the pool
+    self.__nRunning    =  0;                                                    # Number of commands submitted, or being submitted, to the pool
+    self.__futures     = [];                                                    # Futures for all commands, in order added
     self.__nPopen      =  0;                                                    # Total number of process added
-    self.__queue       = [];                                                    # Empty list to queue process information
-    self.__procs       = [];                                                    # Empty list for Popen handles for process
-    self.__returncodes = [];
-    self.__cpuProcs    = [];                                                    # Empty list for Popen handles from cpulimit instances
-    self.__exitID      = None
-    self.__threadID    = None;                                                  # Set _threadID attribute to None
-    self.__runEvent    = Event()
+    self.__runEvent    = Event()                                                # Set once run() called; commands are submitted after that
 
   ##############################################################################
   def addProc(self, args, **kwargs):
@@ -72,10 +69,18 @@ class SubprocManager(object):
       Accepts all subprocess.Popen arguments. Only difference is that
       by default stdout and stderr are piped to DEVNULL
 
+    Returns:
+      concurrent.futures.Future: Resolves to the return code of the command
+
     """
 
-    self.__queue.append( (args, kwargs,) );                                     # Append the Popen info to the queue as a tuple
-    self.__nPopen += 1;                                                         # Increment the number of processes to be run
+    future = Future()
+    with self.__lock:
+      self.__nPopen += 1;                                                       # Increment the number of processes to be run
+      self.__queue.append( (self.__nPopen, args, kwargs, future,) );            # Append the Popen info to the queue as a tuple
+      self.__futures.append( future )
+    if self.__runEvent.is_set(): self.__submit()                                # If already running, maybe submit now
+    return future
 
   ##############################################################################
   def run(self, block = True):
@@ -83,20 +88,16 @@ class SubprocManager(object):
     Method to start running the commands in the queue
 
     Keyword arguments:
-      block (bool): Wait for all commands to finish before returning. 
+      block (bool): Wait for all commands to finish before returning.
                  Default is to wait. Set to False to return right away.
-                 Returning right away may be useful if you want to add 
+                 Returning right away may be useful if you want to add
                  more processes the to process queue. You can then use
                  the .wait() method to wait for processes to finish.
 
     """
 
     self.__runEvent.set()
-    self.__returncodes = [];                                                    # Reset __return codes to empty list
-    self.__exitID      = Thread( target = self.__exit )
-    self.__threadID    = Thread( target = self.__thread );                      # Initialize Thread class
-    self.__exitID.start()
-    self.__threadID.start();                                                    # Start the thread
+    self.__submit()
     if block: self.wait();                                                      # If block (default), wait for processes to complete
 
   ##############################################################################
@@ -105,23 +106,38 @@ class SubprocManager(object):
     Similar to Popen.wait(), however, returns False if timed out
 
     Keyword arguments:
-      timeout : Time, in seconds, to wait for process to finish.
+      timeout : Time, in seconds, to wait for all processes to finish.
 
     """
 
-    if self.__threadID:                                                         # If the _threadID attribute valid; i.e., not None
-      self.__threadID.join(timeout = timeout);                                  # Try to join the thread
-      if self.__threadID.is_alive():                                            # If the thread is still alive
-        return False;                                                           # Return False
-      else:                                                                     # Else, thread is done
-        self.__threadID = None;                                                 # Set _threadID attribute to None;
-    self.__nPopen = 0;                                                          # Reste number of processes to zero (0)
+    deadline = None if timeout is None else time.monotonic() + timeout          # One timeout for the whole batch
+    for future in self.futures:
+      remain = None if deadline is None else max( deadline - time.monotonic(), 0 )
+      try:
+        future.exception( timeout = remain )
+      except:                                                                   # Timed out or cancelled
+        if not future.cancelled(): return False
     return True;                                                                # Return True by default
+
   ##############################################################################
   def kill(self):
-    """Method to kill all running processes"""
+    """Method to kill all running processes and cancel queued ones"""
+
+    self.__cancelQueued()                                                       # Cancel commands never submitted
+    with self.__lock:
+      running = list( self.__running )
+    for proc in running:
+      if not POPENPOOL.cancel( proc ):                                          # Still waiting in pool queue; never started
+        proc.kill()                                                             # Kill the process
+
+  ##############################################################################
+  def __cancelQueued(self):
+    """Private method to cancel all commands not yet submitted to the pool"""
+
+    with self.__lock:
+      queue, self.__queue = self.__queue, []
+    for _, _, _, future in queue: future.cancel()
 
-    for proc in self.__procs: proc[0].terminate()                               # Terminate all of the processes 
   ##############################################################################
   def applyFunc(self, func, args=None, kwargs=None):
     """
@@ -140,41 +156,53 @@ class SubprocManager(object):
     self.__log.debug('Attempting to apply function to process')
     if args   is None: args   = ()
     if kwargs is None: kwargs = {}
-    if len(self.__procs) != 1: time.sleep(0.5);                                 # If no processes running, sleep for 500 ms to see if one will start
-    if len(self.__procs) != 1:                                                  # If there is NOT one process running
-      if len(self.__procs) == 0:                                                # Check if no processes running
-        self.__log.error('No processes running!');                                # Log error
+    with self.__lock:
+      running = list( self.__running )
+    if len(running) != 1:                                                       # If there is NOT one process running
+      if len(running) == 0:                                                     # Check if no processes running
+        self.__log.error('No processes running!');                              # Log error
       else:                                                                     # Else, more than one
-        self.__log.error('More than one (1) process running!');                   # Log error
+        self.__log.error('More than one (1) process running!');                 # Log error
       return False;                                                             # Return False
-    func( self.__procs[0][0], *args, **kwargs );                                # Apply the function to the only running process
-    return True;                                                                # Return True
+    return running[0].applyFunc( func, *args, **kwargs )
 
   ##############################################################################
-  def __thread(self):
-    """ 
-    Private method for actually running all the process.
-    This is done in a thread so that blocking can be disabled; i.e.,
-    user can keep adding processes to the queue if they want
+  def __submit(self):
+    """
+    Private method to submit queued commands to the pool.
+    Called from run(), addProc(), and whenever a process in the batch
+    finishes, so no thread is needed to watch the batch. After SIGINT or
+    SIGTERM, nothing more is submitted and the rest of the batch is cancelled.
 
     """
 
-    self.__n = 0;                                                               # Ensure the counter is at zero
-    while (not _sigintEvent.is_set()) and (not _sigtermEvent.is_set()) and (len(self.__queue) > 0): # While there are commands in the queue
-      if len(self.__procs) == self.threads:                                     # If the number of allowable subprocess are running
-        self.__procCheck();                                                     # Wait for a process to finish
-      args, kwargs = self.__queue.pop(0);                                       # Pop off first element of the _queue
-      self.__Popen( args, **kwargs );                                           # Call method to start a new subprocess
-    while (not _sigintEvent.is_set()) and (not _sigtermEvent.is_set()) and (len(self.__procs) > 0): # While there are processes running
-      self.__procCheck();                                                       # Wait for a process to finish
-    self.__runEvent.clear()                                                     # Clear the run event so the __exit thread quits
-    self.__procs = []                                                           # Clear out Popen instances
+    while True:
+      if not isRunning():                                                       # Interrupted; pool will not run more processes
+        self.__cancelQueued()
+        return
+      with self.__lock:
+        if not self.__queue or self.__nRunning >= self.threads: return          # Nothing to submit or batch at its limit
+        n, args, kwargs, future = self.__queue.pop(0);                          # Pop off first element of the _queue
+        if not future.set_running_or_notify_cancel(): continue                  # Future was cancelled; skip the command
+        self.__nRunning += 1                                                    # Reserve slot; submit outside lock as Popen_async may block
+      try:
+        proc = self.__Popen( n, args, **kwargs )
+      except Exception as err:                                                  # Pool closed
+        with self.__lock:
+          self.__nRunning -= 1
+        future.set_exception( err )
+        continue
+      with self.__lock:
+        self.__running.append( proc )
+      proc.addDoneCallback( lambda p, n=n, f=future: self.__done(p, n, f) )     # Runs right away if process already done
+
   ##############################################################################
-  def __Popen( self, args, **kwargs ):    
+  def __Popen( self, n, args, **kwargs ):
     """
-    Method for starting subprocess and applying cpu limiting
+    Method for submitting subprocess to the pool
 
     Arguments:
+      n     : Number of the process in the batch
       args  : Same as Popen args
 
     Keyword arguments:
@@ -182,103 +210,44 @@ class SubprocManager(object):
 
     """
 
-    if _sigintEvent.is_set() or _sigtermEvent.is_set(): return
-    self.__n += 1;                                                              # Increment n by one
     single = kwargs.pop('single', False);                                       # Pop off the 'single' keyword argument, or get False if not keyword
-    stdout = kwargs.pop('stdout', DEVNULL);                                     # Set default stdout to DEVNULL
-    stderr = kwargs.pop('stderr', STDOUT);                                      # Set default stderr to STDOUT, which will be DEVNULL if default stdout is used
-    
-    logType = 0;                                                                # Variable that will determine what type of logging is required; (0) no files, (1) stdout file, (2), stderr file, (3), both (1) and (2)
-    if type(stdout) is str:                                                     # If stdout is string type
-      if self.__makedirs( stdout, True ):                                       # Try to make directory tree
-        logType += 1;                                                           # Increment log type by 1
-      else:                                                                     # Else, make failed
-        stdout = DEVNULL;                                                       # Set stdout to DEVNULL
-
-    if type(stderr) is str:                                                     # If stderr is string type
-      if self.__makedirs( stderr ):                                             # Try to make directory tree
-        logType += 2;                                                           # Increment log type by 2
-      else:                                                                     # Else, make failed
-        stderr = STDOUT;                                                        # Set stderr to STDOUT
-
-    if logType == 0:                                                            # If no log files are needed
-      proc = Popen( args, stdout = stdout, stderr = stderr, **kwargs );         # Start the process
-    elif logType == 1:                                                          # Else, if stdout is a file
-      with open( stdout, 'w' ) as stdout:                                       # Open file for writing
-        proc = Popen( args, stdout = stdout, stderr = stderr, **kwargs );       # Start the process
-    elif logType == 2:                                                          # Else, if stderr is a file
-      with open( stderr, 'w' ) as stderr:                                       # Open file for writing
-        proc = Popen( args, stdout = stdout, stderr = stderr, **kwargs );       # Start the process
-    else:                                                                       # Else, both stdout and stderr must be files
-      with open( stdout, 'w' ) as stdout:                                       # Open stdout file for writing
-        with open( stderr, 'w' ) as stderr:                                     # Open stderr file for writing
-          proc = Popen( args, stdout = stdout, stderr = stderr, **kwargs );     # Start the process
-
-    self.__log.info( self._logFMT.format(self.__n, self.__nPopen, 'Started!') ); # Logging information
-
-    self.__procs.append( (proc, self.__n) );                                    # Append handle and process number tuple to the _procs attribute
-    if cpulimitInstalled and (self.cpulimit > 0) and (self.cpulimit < 100):     # If the cpulimit CLI is installed AND the cpulimit is greater than zero (0) AND less than 100
-      limit = self.cpulimit if single else self.cpulimit * self.threads;        # Set the cpu limit to threads times the current cpulimit percentage
-      # limit = '200' if limit > 200 else str( limit );                           # Make sure not more than 200
-      # limit = [ 'cpulimit', '-p', str( proc.pid ), '-l', limit ];               # Set up the cpulimit command
-      limit = [ 'cpulimit', '-p', str( proc.pid ), '-l', str(limit) ];            # Set up the cpulimit command
-      self.__cpuProcs.append( Popen(limit, stdout=DEVNULL, stderr=STDOUT) );    # Start new subprocess for CPU limit command and append handle to _cpuProcs
+    for key in ('stdout', 'stderr'):                                            # Make directories for log files, fall back to default if fails
+      if isinstance(kwargs.get(key, None), str) and not self.__makedirs( n, kwargs[key], key ):
+        kwargs.pop( key )
+    kwargs['threads']  = 1 if single else self.threads                          # Single threaded processes need only one thread
+    kwargs['priority'] = self.priority
+    if self.cpulimit is not None:                                               # If cpulimit set for batch, override pool cpulimit
+      kwargs['cpulimit'] = self.cpulimit if (self.cpulimit > 0) and (self.cpulimit < 100) else None
+    self.__log.info( self._logFMT.format(n, self.__nPopen, 'Queued!') );        # Logging information
+    return POPENPOOL.Popen_async( args, **kwargs )
 
   ##############################################################################
-  def __procCheck(self):
-    """Private method to check for finished processes"""
-
-    while all( [proc[0].poll() is None for proc in self.__procs] ):             # While all of the processes are working (remember _procs contains tuples)
-      time.sleep(self.interval);                                                # Sleep for the interval defined
-    for i in range( len(self.__procs) ):                                        # Iterate over all the process
-      if self.__procs[i][0].returncode is not None:                             # If the process has finished (remember _procs contains tuples)
-        proc, n = self.__procs.pop( i );                                        # Pop off the (process, #) tuple
-        proc.communicate();                                                     # Ensure processes finished, just good practice
-        self.__log.info( self._logFMT.format( n, self.__nPopen, 'Finished!' ) );  # Log some information
-        try:                                                                    # Try to
-          cpuProc = self.__cpuProcs.pop( i );                                   # Pop off the cpulimit Popen handle for the process
-        except:                                                                 # If there is an exception
-          pass;                                                                 # Do nothing, cpulimiting must be disabled
-        else:                                                                   # Else, cpulimiting must be enabled
-          cpuProc.communicate();                                                # Ensure processes finished, just good practice 
-        self.__returncodes.append( proc.returncode );                           # Append the return code to the __returcodes attribute
-        if proc.returncode != 0:                                                # If a non-zero returncode
-          self.__log.warning( 
-            self._logFMT.format( n, self.__nPopen, 'Non-zero returncode!!!' ) 
-          );                                                                    # Log some information
-        break;                                                                  # Break out of the for loop  
-
-   ##############################################################################
-  def __makedirs( self, path, stdout = False ):
-    """A private method to try to make parent directory for log files"""
+  def __done(self, proc, n, future):
+    """Private method called by the pool when a process in the batch finishes"""
+
+    with self.__lock:
+      self.__running.remove( proc )
+      self.__nRunning -= 1
+    if proc.returncode != 0:                                                    # If a non-zero returncode
+      self.__log.warning( self._logFMT.format( n, self.__nPopen, 'Non-zero returncode!!!' ) )
+    else:
+      self.__log.info( self._logFMT.format( n, self.__nPopen, 'Finished!' ) )
+    future.set_result( proc.returncode )
+    self.__submit()                                                             # Room for another process from the batch
 
-    errFMT = 'Error making path to {} file: {}. Using default logging';         # Format for logging error
-    if stdout:                                                                  # If stdout True
-      errFMT = errFMT.format('stdout','{}');                                    # Update errFMT with stdout in first entry
-    else:                                                                       # Else, must be stderr
-      errFMT = errFMT.format('stderr','{}');                                    # Update errFMT with stderr in first entry
+  ##############################################################################
+  def __makedirs( self, n, path, key ):
+    """A private method to try to make parent directory for log files"""
 
     dir = os.path.dirname( path );                                              # Get the directory name
-    if not os.path.isdir( dir ):                                                # If the directory does NOT exist
+    if dir != '' and not os.path.isdir( dir ):                                  # If the directory does NOT exist
       try:                                                                      # Try to...
         os.makedirs( dir );                                                     # Make the directory tree
       except:                                                                   # On exception; likely no write permissions on dst
-        self.__log.warning( 
-          self._logFMT.format( self.__n, self.__nPopen, errFMT.format(path) ) 
-        );                                                                      # Log information
+        self.__log.warning( self._logFMT.format( n, self.__nPopen,
+          'Error making path to {} file: {}. Using default logging'.format(key, path) ) )
         return False;                                                           # Return False
     return True;                                                                # Return True
-  ##############################################################################
-  def __exit(self, *args, **kwargs):
-    """ 
-    Private method for killing everything (cleanly). 
-    Intended to be called when SIGINT or something else occurs
-
-    """
-    while self.__runEvent.is_set():
-      if _sigintEvent.wait( timeout = 0.5 ) or _sigtermEvent.wait( timeout = 0.5 ):
-        self.__runEvent.clear()
-        for proc in self.__procs: proc[0].terminate()                               # Terminate all of the processes 
 
   ##############################################################################
   @property
@@ -286,25 +255,32 @@ class SubprocManager(object):
     return self.__cpulimit;                                                     # return _cpulimit
   @cpulimit.setter
   def cpulimit(self, value):
-    self.__cpulimit = 75 if (value is None) else int(value);                    # Set _cpulimit to defulat if value if value is None, else set to integer of value
+    self.__cpulimit = None if (value is None) else int(value);                  # Set _cpulimit to None, i.e., use pool value, if value is None, else set to integer of value
   ##############################################################################
   @property
   def threads(self):
     return self.__threads;                                                      # return _threads
   @threads.setter
   def threads(self, value):
-    self.__threads = nthreads if (value is None) else int(value);               # Set _threads to default if value is None, else set to integer of value
-    if self.__threads < 1: self.__threads = 1;                                  # If _threads is less than one (1), set to one (1)
+    self.__threads = HALFTHREADS if (value is None) else threadCheck( int(value) ) # Set _threads to default if value is None, else check integer of value
   ##############################################################################
   @property
   def interval(self):
-    return self.__interval;                                                     # return _cpulimit
+    return self.__interval;                                                     # return _interval
   @interval.setter
   def interval(self, value):
     self.__interval = 0.5 if (value is None) else float(value);                 # Set _interval to default if value is None, else set to float of value
-    if self.__interval < 0.01: self.__interval = 0.01;                          # If _interval is less than 0.01, set to 0.01
-    if self.__interval > 0.50: self.__interval = 0.50;                          # If _interval is greater than 0.5, set to 0.5; we want things to stay responsive
+  ##############################################################################
+  @property
+  def futures(self):
+    """List of futures for all commands, in the order they were added"""
+
+    with self.__lock:
+      return list( self.__futures )
   ##############################################################################
   @property
   def returncodes(self):
-    return self.__returncodes;                                                  # return _cpulimit
+    """Return codes for all commands, in the order they were added; None for commands that have not finished or never ran"""
+
+    return [f.result() if f.done() and not f.cancelled() and not f.exception() else None
+              for f in self.futures]
@@ -1,23 +1,33 @@
 import logging
-import os, time
+import os, signal, time
+import asyncio
 import atexit
+import selectors
+import heapq, itertools
+import queue
+import psutil
 from subprocess import Popen, STDOUT, DEVNULL 
-from queue import Queue
-from threading import Thread, Lock, Event
+from threading import Thread, Lock, Event, Condition
 from .checkCLI import checkCLI
 from .threadCheck import threadCheck
-from .. import isRunning, _sigtermEvent
-
-TIMEOUT = 1.0
+from .cgroups import CGROUPS
+from .procStats import ProcStats, readProcIO, collect
+from .. import isRunning, _sigtermEvent, _sigCallbacks
 
 try:
   CPULIMIT = checkCLI( 'cpulimit' )
 except:
   logging.getLogger(__name__).warning(
-    'cpulimit NOT found! Cannot limit CPU usage!'
+    'cpulimit NOT found! Can only limit CPU usage through cgroups!'
   )
   CPULIMIT = None
 
+PRIORITY_INTERACTIVE = 0                                                                # Priority for jobs a user is waiting on
+PRIORITY_DVR         = 1                                                                # Priority for DVR post-processing; should finish before next airing
+PRIORITY_BATCH       = 2                                                                # Priority for bulk work; e.g., MakeMKV rips
+AGING                = 1800.0                                                           # Seconds a job must wait to gain one priority level
+MEMORY_RECHECK       =    5.0                                                           # Seconds between free memory checks when a job is waiting for memory
+
 def makeDirs( path ):
   """
   Try to make all directories in input path
@@ -41,65 +51,39 @@ def makeDirs( path ):
   return os.path.isdir( dirName )
 
 ########################################################################################
-class NLock( object ):                                                          
+class WeightedSemaphore( object ):
   """
   Semaphore-like class that allows acquire to decrement by arbitrary number
 
-  This class is designed to mimic a semaphore object, with the aquried and release
+  This class is designed to mimic a semaphore object, with the acquire and release
   methods decrementing and incrementing, respectively, an internal counter. The
   difference is that the acquire and release methods can be passed a 'threads'
-  value to increment/decrement by a number larget than one (1). This allows
+  value to increment/decrement by a number larger than one (1). This allows
   locking for processes that require more than one thread to run.
 
-  Note:
-    This is not perfect and, because of how events are 'queue', more
-    threads than specified could start. For example, say 2 threads are allowed
-    in the NLock object:
-    code-block::
-
-       LOCK = NLock(2)
-
-    Now, image two (2) processes, each requiring one (1) thread, acquire the lock
-    code-block::
-
-       if LOCK.acquire( threads = 1 ):
-         ...process1...
-       if LOCK.acquire( threads = 1 ):
-         ...process2...
-
-    While those are running, say a third (3rd) process that requries two (2) threads
-    tries to get the lock
-    code-block::
-
-        if LOCK.acquire( threads = 2 ):
-          ...process3...
-
-    Now, this call to acquire() for process3 will block, but only until one (1)
-    of the single threaded processes finish (process1 or process2). Say process1
-    is very long running and process2 is fairly short. In this case, process2
-    will finish, releasing the lock, allowing process3 to start.
-
-    The issue in this case is that the NLock object has now allowed three (3) threads 
-    to run instead of only allowing two (2).
-
-    This issue will only be encountered if acquire is called with varying thread
-    counts.
+  Requests are admitted strictly in order: by priority (lower value first) and
+  then first-in, first-out. A request is only admitted once all requests ahead of
+  it have been admitted and enough threads are free, so the number of threads in
+  use never exceeds the `threads` value, and requests for many threads are never
+  starved by a stream of requests for only a few. The one exception is a single
+  request for more threads than are allowed in total; it is admitted once no other
+  threads are in use.
 
   """
 
-  __n       = 0                                                                    
-  __threads = 0                                                                    
   def __init__(self, threads = None):                                                 
-    self.__lock1 = Lock()                                                       
-    self.__lock2 = Lock()                                                       
-    self.threads = threads 
+    self.__cond    = Condition( Lock() )
+    self.__used    = 0                                                                  # Number of threads currently acquired
+    self.__waiters = []                                                                 # Heap of (priority, sequence) tuples for blocked acquires
+    self.__seq     = itertools.count()                                                  # Counter to keep FIFO order within priority
+    self.threads   = threads 
 
   @property                                                                     
   def n(self):                                                                  
-    """Count of threads trying to acquire lock"""
+    """Number of threads currently acquired"""
+
+    return self.__used
 
-    return self.__n                                                             
-                                                                                
   @property                                                                     
   def threads(self):                                                               
     """Number of thread acquires allowed"""
@@ -108,97 +92,322 @@ class NLock( object ):
                                         
   @threads.setter                                                                  
   def threads(self, val):                                                          
-    self.__threads = threadCheck( val ) 
+    with self.__cond:
+      self.__threads = threadCheck( val ) 
+      self.__cond.notify_all()                                                          # More threads may now be available
 
   def __enter__(self, *args, **kwargs):                                         
     self.acquire( *args, **kwargs )                                             
                                                                                 
   def __exit__(self, *args, **kwargs):                                          
-    self.release(*args, **kwargs)                                               
+    self.release()
 
   def locked(self):
-    """Returns True if locked, False otherwise"""
+    """Returns True if all threads are acquired, False otherwise"""
 
-    return self.__lock2.locked()
+    return self.__used >= self.__threads
                                                                                 
-  def acquire(self, *args, **kwargs):                                           
+  def acquire(self, blocking = True, timeout = None, threads = None, priority = 0):
     """
-    Similar to threading.Lock.acquire(), however, allows for n grabs to lock
-
-    Alows for n grabs to lock before it will block. For example, say n = 10, then
-    the acquire() can be called 10 times before it will block. Just as with 
-    threading.Lock.acquire(), it will block forever unless keywords are passed
-
-    Arguments:
-      *args: Accepts all inputs from threading.Lock.aquire()
+    Similar to threading.Semaphore.acquire(), however, allows for n grabs at once
 
     Keyword arguments:
+      blocking (bool): If False, return immediately if the threads cannot be acquired
+      timeout (float): Maximum time, in seconds, to block for
       threads (int): Specifies the number of 'locks' to acquire; default 1.
                  When using this class to block number of processes,
                  this is used when a process will use more than one
                  thread.
-      **kwargs: All other keywords for threading.Lock.aquire()
+      priority (int,float): Priority of request; lower values are admitted first.
+                 Requests with the same priority are admitted in the order
+                 they were made.
 
     Returns:
       bool: True if lock acquired, False otherwise
 
     """
 
-    threads = kwargs.pop('threads', None)                                                  # Get threads keyword for number of processes to reserver, default is 1 
-    if not isinstance(threads, int):
-      threads = 1
-    elif threads < 1:
-      threads = 1
-
-    with self.__lock1:                                                          
-      self.__n += threads                                                               # Increment number of locks to grab
-      check     = self.__n >= self.__threads                                       
-    if check and not self.__lock2.acquire(*args, **kwargs):                             # If check is true and fail to acqurie the lock 
-      with self.__lock1:                                                                # Grab lock for n grabs
-        self.__n -= threads                                                             # Decement n grabs
-      return False                                                                      # Return false
-    return True                                                                         # Return True; this happens when (check == False) or (check == True) and (grabbed lock)
+    threads = self.__weight( threads )
+    with self.__cond:
+      if not self.__waiters and self.__fits( threads ):                                 # If nobody waiting and enough threads free
+        self.__used += threads
+        return True
+      if not blocking:
+        return False
+
+      entry = (priority, next(self.__seq),)                                             # Place in line
+      heapq.heappush( self.__waiters, entry )
+      admit = lambda: self.__waiters[0] == entry and self.__fits( threads )             # Admit only when first in line and threads free
+      if self.__cond.wait_for( admit, timeout = timeout ):
+        heapq.heappop( self.__waiters )
+        self.__used += threads
+        status = True
+      else:                                                                             # Timed out; get out of line
+        self.__waiters.remove( entry )
+        heapq.heapify( self.__waiters )
+        status = False
+      self.__cond.notify_all()                                                          # Next in line may now be admitted
+      return status
 
   def release(self, threads = None):
     """
-    This method acts the same as a normal threading.Lock.release()
+    This method acts the same as a normal threading.Semaphore.release()
 
     Arguments:
       None
 
     Keyword arguments:
       threads (int): Specifies the number of 'locks' to release; default 1.
-                 When using this class to block number of processes,
-                 this is used when a process will use more than one
-                 thread.
+                 Must match value used in call to acquire()
+
     Returns:
       None
 
     """
 
-    with self.__lock1:                                                                  # Get lock1 to ensure no other process changes __n 
-      if not isinstance(threads, int):                                                  # If threads is NOT an integer instance
-        threads = 1                                                                     # Set threads to 1
-      elif threads < 1:                                                                 # Else, if threads is less than 1
-        threads = 1                                                                     # Set threads to 1
-      self.__n -= threads                                                               # Decrement __n by threads
-      if self.__lock2.locked():                                                         # If lock2 is locked 
-        self.__lock2.release()                                                          # Then release it
-                                
+    threads = self.__weight( threads )
+    with self.__cond:
+      self.__used = max( self.__used - threads, 0 )
+      self.__cond.notify_all()
+
+  def __weight(self, threads):
+    """Ensure number of threads is integer greater than zero"""
+
+    if not isinstance(threads, int) or threads < 1:
+      return 1
+    return threads
+
+  def __fits(self, threads):
+    """Check if threads can be acquired; lock must be held"""
+
+    return (self.__used + threads <= self.__threads) or (self.__used == 0)
+
 ########################################################################################
-PROCLOCK = NLock()                                                                      # Initialize NLock for use in all classes
+class ProcReaper( Thread ):
+  """
+  Single thread that reaps subprocesses the moment they exit
+
+  On Linux, a pidfd is opened for every registered process and all of them are
+  watched by one selector, so this thread sleeps until a child exits or until
+  it is woken up by the wake() method (e.g., on SIGINT/SIGTERM). On platforms
+  without pidfd support, a small waiter thread that blocks in Popen.wait() is
+  used for each process instead. In neither case are processes polled.
+
+  """
+
+  def __init__(self):
+    super().__init__( daemon = True )
+    self.__log       = logging.getLogger(__name__)
+    self.__lock      = Lock()
+    self.__procs     = {}                                                               # Running processes keyed by pid
+    self.__toAdd     = []                                                               # pidfds waiting to be added to selector
+    self.__callbacks = []                                                               # Functions to call when interrupted
+    self.__selector  = selectors.DefaultSelector()
+    self.__rfd, self.__wfd = os.pipe()                                                  # Self-pipe used to wake the selector
+    os.set_blocking( self.__rfd, False )
+    os.set_blocking( self.__wfd, False )
+    self.__selector.register( self.__rfd, selectors.EVENT_READ, None )
+    self.start()
+
+  def wake(self):
+    """Wake the reaper thread; safe to call from a signal handler"""
+
+    try:
+      os.write( self.__wfd, b'\0' )
+    except OSError:                                                                     # Pipe full; reaper will wake anyway
+      pass
+
+  def addInterruptCallback(self, func):
+    """Add function to call, from reaper thread, after SIGINT/SIGTERM"""
+
+    self.__callbacks.append( func )
+
+  def register(self, proc, callback):
+    """
+    Register a process to be reaped
+
+    Arguments:
+      proc (Popen): Running subprocess.Popen instance
+      callback: Function to call once process has exited. Called with the
+        Popen instance, the resource usage from os.wait4() (None if not
+        available), and the /proc I/O counters (None if not available)
+
+    Keyword arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    try:
+      pidfd = os.pidfd_open( proc.pid )                                                 # Open pidfd; becomes readable when process exits
+    except (AttributeError, OSError):                                                   # Not Linux, or kernel too old
+      pidfd = None
+
+    with self.__lock:
+      self.__procs[ proc.pid ] = proc
+      if pidfd is not None:
+        self.__toAdd.append( (pidfd, proc, callback,) )
+
+    if pidfd is None:
+      Thread( target = self.__waiter, args = (proc, callback,), daemon = True ).start()
+    else:
+      self.wake()                                                                       # Wake thread so that pidfd is added to selector
+
+  def track(self, proc):
+    """
+    Track process that is reaped elsewhere; e.g., by asyncio
+
+    The process is not waited on, but is terminated by killAll()
+
+    """
+
+    with self.__lock:
+      self.__procs[ proc.pid ] = proc
+
+  def untrack(self, proc):
+    """Stop tracking process added with track()"""
+
+    with self.__lock:
+      self.__procs.pop( proc.pid, None )
+
+  def killAll(self):
+    """Terminate all processes that have not been reaped yet"""
+
+    with self.__lock:
+      procs = list( self.__procs.values() )
+    for proc in procs:
+      self.__log.debug('Terminating process')
+      try:
+        proc.terminate()
+      except:
+        pass
+
+  def run(self):
+    """Wait on all pidfds and wake pipe, reaping processes as they exit"""
+
+    while True:
+      for key, _ in self.__selector.select():
+        if key.data is None:                                                            # Wake pipe
+          self.__drain()
+        else:                                                                           # A process exited
+          self.__selector.unregister( key.fileobj )
+          os.close( key.fileobj )
+          self.__reap( *key.data )
+
+      with self.__lock:
+        toAdd, self.__toAdd = self.__toAdd, []
+      for pidfd, proc, callback in toAdd:
+        self.__selector.register( pidfd, selectors.EVENT_READ, (proc, callback,) )
+
+      if not isRunning():                                                               # If SIGINT or SIGTERM caught
+        self.killAll()
+        for func in self.__callbacks:
+          func()
+
+  def __drain(self):
+    """Read all bytes from wake pipe"""
+
+    try:
+      while os.read( self.__rfd, 512 ): pass
+    except OSError:
+      pass
+
+  def __waiter(self, proc, callback):
+    """Fallback for when pidfd not available; block until process exits"""
+
+    try:
+      os.waitid( os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT )                          # Wait for exit, but leave process to be reaped by __reap
+    except (AttributeError, OSError):                                                   # No waitid; e.g., Windows
+      proc.wait()
+    self.__reap( proc, callback )
+
+  def __reap(self, proc, callback):
+    """Collect exit status and resource usage of finished process and run callback"""
+
+    io     = readProcIO( proc.pid )                                                     # Must read before reaping
+    rusage = None
+    if hasattr(os, 'wait4'):
+      with proc._waitpid_lock:                                                          # Keep Popen.poll() from reaping at same time
+        if proc.returncode is None:
+          try:
+            _, status, rusage = os.wait4( proc.pid, 0 )                                 # Process has exited, so will not block
+          except ChildProcessError:                                                     # Already reaped
+            pass
+          else:
+            proc.returncode = os.waitstatus_to_exitcode( status )
+    proc.wait()                                                                         # No-op if reaped above
+    with self.__lock:
+      self.__procs.pop( proc.pid, None )
+    try:
+      callback( proc, rusage, io )
+    except:
+      self.__log.exception('Error in reaper callback')
 
 ########################################################################################
-class PopenThread( Thread ):
+class CallbackRunner( Thread ):
+  """
+  Thread that runs done callbacks of finished processes
+
+  Processes finish on the REAPER thread (or an asyncio event loop), which
+  must never block; otherwise no other process is reaped and no threads are
+  released to the pool. Callbacks may do anything, including submitting
+  more processes to a full pool or writing to a database, so they are
+  handed to this thread instead. Callbacks are run in the order they are
+  added.
+
+  """
+
+  def __init__(self):
+    super().__init__( daemon = True )
+    self.__log   = logging.getLogger(__name__)
+    self.__queue = queue.SimpleQueue()
+    self.start()
+    atexit.register( self.close )
+
+  def submit(self, func, *args):
+    """Run func(*args) on the callback thread; returns right away"""
+
+    self.__queue.put( (func, args,) )
+
+  def close(self, timeout = 30.0):
+    """Run callbacks already added, then stop the thread"""
+
+    if not self.is_alive(): return
+    self.__queue.put( None )
+    self.join( timeout = timeout )
+
+  def run(self):
+    while True:
+      item = self.__queue.get()
+      if item is None: break
+      func, args = item
+      try:
+        func( *args )
+      except:
+        self.__log.exception('Error in done callback')
+
+########################################################################################
+PROCLOCK = WeightedSemaphore()                                                          # Initialize WeightedSemaphore for use in all classes
+REAPER   = ProcReaper()                                                                 # Initialize process reaper for use in all classes
+CALLBACKS = CallbackRunner()                                                            # Runs done callbacks so that the reaper never blocks
+_sigCallbacks.append( REAPER.wake )                                                     # Wake reaper on SIGINT/SIGTERM so that processes are killed
+
+########################################################################################
+class PopenThread( object ):
   """
   Wrapper class for subprocess.Popen that allows starting process in future
 
   This class is designed to allow for starting a subprocess.Popen instance in
-  the future by initializing the Popen instance within the Thread.run method.
-  Thus, the subprocess does not start until the Thread.start method is called.
+  the future by initializing the Popen instance within the start method.
+  Thus, the subprocess does not start until the PopenPool calls start(), which
+  happens once enough threads are free.
 
   Note:
-    The thread will run until the subprocess finishes, fails, or is killed
+    Instances are not threads; the global REAPER signals when the subprocess
+    finishes, so no thread is tied up while the subprocess runs. The name is
+    kept for backwards compatibility.
 
   """
 
@@ -211,7 +420,17 @@ class PopenThread( Thread ):
 
     Keywords arguments:
       cpulimit (int): Percentage of CPU to all the subprocess to use
+      memory (int): Memory, in bytes, the subprocess is expected to use; used
+        by PopenPool to wait for free memory before starting it. This is an
+        estimate and is never enforced
+      memoryLimit (int): Memory, in bytes, above which the subprocess is
+        throttled. Only enforced when cgroup delegation is available;
+        default is no limit
       threads (int): Specify number of threads the subprocess will use; default is one (1)
+      priority (int): Priority of the subprocess; lower values start first.
+        Default is PRIORITY_BATCH
+      outputs (list): Paths to files the subprocess creates; used by the
+        pool journal to skip the subprocess if it already finished
       **kwargs: All keyword arguments accepted by subprocess.Popen.
 
     Returns:
@@ -222,13 +441,35 @@ class PopenThread( Thread ):
     super().__init__()
     self.__log         = logging.getLogger(__name__)
     self._cpulimit     = kwargs.pop('cpulimit', None)
+    self._memory       = kwargs.pop('memory',   None)
+    self._memoryLimit  = kwargs.pop('memoryLimit', None)
     threads            = kwargs.pop('threads',  None) 
+    priority           = kwargs.pop('priority', None)
+    self._outputs      = list( kwargs.pop('outputs', None) or () )
     self._threads      = threadCheck( threads )
+    self._priority     = PRIORITY_BATCH if priority is None else priority
     self._args         = args
     self._kwargs       = kwargs
     self._returncode   = None
     self._proc         = None
+    self._limit        = None
+    self._cgroup       = None
+    self._files        = ()
+    self._callbacks    = []
+    self._cbLock       = Lock()
+    self._poolCallback = None                                                           # Pool bookkeeping; run on finishing thread, so must not block
+    self._killed       = False                                                          # Set by kill(); process is cancelled instead of started
     self._proc_started = Event()
+    self._proc_done    = Event()
+    self._tQueued      = time.monotonic()                                               # When instance created; i.e., queued in pool
+    self._tHead        = None                                                           # When first at head of queue, waiting for threads/memory
+    self._tStart       = None                                                           # When process started
+    self._jobKey       = None                                                           # Key in pool journal, if recorded
+    self.stats         = ProcStats( name      = self.__name(),
+                                    priority  = self._priority,
+                                    threads   = self._threads,
+                                    submitted = time.time() )                           # Resource usage; filled in when process finishes
+    collect( self.stats )                                                               # Add to stage timing of calling thread, if any
 
   @property
   def threads(self):
@@ -236,6 +477,54 @@ class PopenThread( Thread ):
 
     return self._threads
 
+  @property
+  def priority(self):
+    """Priority of process; lower values are started first"""
+
+    return self._priority
+
+  @property
+  def cpulimit(self):
+    """Percentage of CPU the process is allowed to use, per thread"""
+
+    return self._cpulimit
+
+  @property
+  def memory(self):
+    """Memory, in bytes, the subprocess is expected to use"""
+
+    return self._memory
+
+  @property
+  def memoryLimit(self):
+    """Memory, in bytes, above which the subprocess is throttled"""
+
+    return self._memoryLimit
+
+  @property
+  def cmd(self):
+    """Command the subprocess runs"""
+
+    return self._args[0] if self._args else self._kwargs.get('args', None)
+
+  @property
+  def outputs(self):
+    """Paths to files the subprocess creates"""
+
+    return self._outputs
+
+  @property
+  def rss(self):
+    """Memory, in bytes, used by the subprocess; zero (0) if not running"""
+
+    if self._cgroup:                                                                    # Includes children of the subprocess
+      usage = self._cgroup.memoryCurrent()
+      if usage is not None: return usage
+    try:
+      return psutil.Process( self._proc.pid ).memory_info().rss
+    except:
+      return 0
+
   @property
   def returncode(self):
     """Return code of subprocess; see subprocess.Popen()"""
@@ -243,31 +532,84 @@ class PopenThread( Thread ):
     return self._returncode
 
   def poll(self):
-    """Poll subprocess to see if finished; see subprocess.Popen()"""
+    """Check if subprocess finished; see subprocess.Popen()"""
+
+    return self._returncode
+
+  def done(self):
+    """Return True if the subprocess has finished (or was never started)"""
 
-    if self._proc:                                                                      # If process
-      code = self._proc.poll()                                                          # Poll the process
-      if code is not None:                                                              # If return value is not None
-        self._returncode = code                                                         # Set return code
-      return code                                                                       # Return return code
-    return None                                                                         # Return None; only makes it here if not _proc
+    return self._proc_done.is_set()
+
+  def addDoneCallback(self, func):
+    """
+    Add function to call when subprocess finishes
+
+    Arguments:
+      func: Function to call; must accept PopenThread instance as only argument.
+        Callbacks are run, in order, on the CALLBACKS thread. If the
+        subprocess has already finished, the function is called immediately.
+
+    Keyword arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    with self._cbLock:
+      if not self._proc_done.is_set():                                                  # If not done, callback run by _finish
+        self._callbacks.append( func )
+        return
+    func( self )
 
   def startWait(self, timeout = None):
-    """Wait for subprocess to start; waits for global NLOCK to be acquried"""
+    """Wait for subprocess to start; waits for global PROCLOCK to be acquried"""
 
     return self._proc_started.wait( timeout = timeout )
 
   def wait(self, timeout = None):
-    """Wait for subprocess to finish; see subprocess.Popen()"""
+    """
+    Wait for subprocess to finish; see subprocess.Popen()
 
-    self.startWait()                                                                    # Make sure thread is started
-    self.join( timeout = timeout )
-    return not self.is_alive()
+    Keyword arguments:
+      timeout (float): Time, in seconds, to wait for process to finish
+
+    Returns:
+      bool: True if finished, False on timeout
+
+    """
+
+    return self._proc_done.wait( timeout = timeout )
+
+  async def wait_aio(self, timeout = None):
+    """
+    Wait for subprocess to finish without blocking the event loop
+
+    Keyword arguments:
+      timeout (float): Time, in seconds, to wait for process to finish
+
+    Returns:
+      bool: True if finished, False on timeout
+
+    """
+
+    loop   = asyncio.get_running_loop()
+    future = loop.create_future()
+    def done(proc):
+      loop.call_soon_threadsafe( lambda: future.done() or future.set_result(True) )
+    self.addDoneCallback( done )
+    try:
+      return await asyncio.wait_for( asyncio.shield(future), timeout )
+    except asyncio.TimeoutError:
+      return False
 
   def kill(self):
-    """Kill the subprocess; see subprocess.Popen()"""
+    """Kill the subprocess; see subprocess.Popen(). If not started yet, it never will be"""
 
-    if self._proc:
+    self._killed = True
+    if self._proc and self._returncode is None:
       self._proc.terminate()
 
   def applyFunc(self, func, *args, **kwargs):
@@ -291,23 +633,22 @@ class PopenThread( Thread ):
       return True
     return False
 
-  def run(self):
-    """Overload run method"""
+  def start(self):
+    """
+    Start the subprocess
 
-    PROCLOCK.acquire( threads = self._threads )                                         # Acquire lock
-    self._proc_started.set()                                                            # Set _proc_started event after lock is acquired
-    kwargs = self._kwargs.copy()                                                        # Get copy of keyword arguments; don't want to change the originals
-    stdout = kwargs.get('stdout', DEVNULL)                                              # Get the stdout keyword, use DEVNULL as default
-    stderr = kwargs.get('stderr', STDOUT)                                               # Get the stderr keyword, use STDOUT as default
+    Should only be called by PopenPool once the threads for the process are
+    acquired. Returns right away; the REAPER calls back when the process exits.
 
-    if isinstance(stdout, str):                                                         # If stdout is str instance, assume is file path
-      if makeDirs( stdout ):                                                            # If make directory for stdout file
-        stdout = open(stdout, 'w')                                                      # Open file for writing
-    if isinstance(stderr, str):                                                         # Same as above but for stderr
-      if makeDirs( stderr ):
-        stderr = open(stderr, 'w')
+    """
 
-    kwargs.update( {'stdout' : stdout, 'stderr' : stderr} )                             # Update the stdout and stderr keywords
+    self._proc_started.set()                                                            # Set _proc_started event
+    self._tStart = time.monotonic()
+    if not isRunning() or self._killed:                                                 # If interupt already caught, or killed, don't bother starting
+      self.cancel()
+      return
+
+    kwargs = self._popenKwargs()
     try:                                                                                # Try to start the process
       self._proc = Popen( *self._args, **kwargs )                                       # Start the process
     except FileNotFoundError as err:                                                    # On command not exist error
@@ -318,35 +659,142 @@ class PopenThread( Thread ):
       self._returncode = 256                                                            # Set to out-of-range code on any other error
     else:                                                                               # On sucess
       self.__log.debug('Process started')                                               # Inform that process running
-      limit = self.__cpulimit( )                                                        # Maybe cpulimit
-      while isRunning():                                                                # While not interupts
-        if self.poll() is None:                                                         # If process not done
-          time.sleep( TIMEOUT )                                                         # Sleep
-        else:                                                                           # Else
-          break                                                                         # Break while loop
-      if self.poll() is None:                                                           # If process still not done; then assume interupt encounterd
-        self.__log.debug('Terminating process')                                         # Log debug info
-        self.kill()                                                                     # Terminate process
-        if limit: limit.terminate()                                                     # Maybe termiate cpulimit
-      elif self.returncode != 0:
-        self.__log.warning('Non-zero exit status from process!')
-      self._proc.communicate()                                                          # Wait for process to finish
-      self.poll()                                                                       # Poll one last time to ensure returncode is set
+      self._applyLimits( )                                                              # Maybe limit CPU/memory usage
+      REAPER.register( self._proc, self._reaped )                                       # Reaper will call _reaped when process exits
+      if self._killed: self._proc.terminate()                                           # Killed while starting
+      return
 
-    try:
-      kwargs['stdout'].close()
-    except:
-      pass
-    try:
-      kwargs['stderr'].close()
-    except:
-      pass
+    self._finish()
+
+  def cancel(self):
+    """Mark process as terminated without ever starting it"""
+
+    self.__log.debug('Process cancelled')
+    self._proc_started.set()
+    self._returncode = -signal.SIGTERM                                                  # Same code as if process had been terminated
+    self._closeGiven()
+    self._finish()
+
+  def skip(self):
+    """Mark process as finished successfully without ever starting it"""
+
+    self.__log.debug('Process skipped; outputs exist from previous run')
+    self._proc_started.set()
+    self._returncode = 0
+    self._closeGiven()
+    self._finish()
+
+  def _closeGiven(self):
+    """
+    Have _finish() close stdout/stderr given as open files when process never started
+
+    Files given by path are only opened when the process starts, but open
+    files (e.g., the write end of a pipe) are owned by the process once
+    submitted; if they were not closed, a reader would wait forever.
+
+    """
+
+    if self._files: return                                                              # Set by _popenKwargs(); process was started
+    self._files = tuple( self._kwargs[key] for key in ('stdout', 'stderr')
+                           if hasattr( self._kwargs.get(key, None), 'close' ) )
+
+  def _popenKwargs(self):
+    """
+    Build keyword arguments for starting the process
+
+    Copies the keyword arguments so the originals are not changed, sets
+    default stdout/stderr, and opens any stdout/stderr given as file paths.
+
+    """
+
+    kwargs = self._kwargs.copy()                                                        # Get copy of keyword arguments; don't want to change the originals
+    stdout = kwargs.get('stdout', DEVNULL)                                              # Get the stdout keyword, use DEVNULL as default
+    stderr = kwargs.get('stderr', STDOUT)                                               # Get the stderr keyword, use STDOUT as default
+
+    if isinstance(stdout, str):                                                         # If stdout is str instance, assume is file path
+      if makeDirs( stdout ):                                                            # If make directory for stdout file
+        stdout = open(stdout, 'w')                                                      # Open file for writing
+    if isinstance(stderr, str):                                                         # Same as above but for stderr
+      if makeDirs( stderr ):
+        stderr = open(stderr, 'w')
+
+    kwargs.update( {'stdout' : stdout, 'stderr' : stderr} )                             # Update the stdout and stderr keywords
+    self._files = (stdout, stderr,)                                                     # Files to close when process finishes
+    return kwargs
+
+  def _reaped(self, proc, rusage = None, io = None):
+    """Called once the process has exited"""
+
+    self._returncode = proc.returncode                                                  # Set return code
+    self.stats.update( rusage = rusage, io = io )
+    if self._limit:                                                                     # If cpulimit was started
+      if self._limit.poll() is None: self._limit.terminate()                            # Terminate it if still running
+      self._limit.wait()                                                                # Reap it
+    if self._cgroup:                                                                    # If process was put in cgroup
+      self._cgroup.close()                                                              # Remove the cgroup
+    if isRunning() and self._returncode != 0:
+      self.__log.warning('Non-zero exit status from process!')
+    self._finish()
+
+  def _finish(self):
+    """Close output files, update statistics, set done event, and run callbacks"""
+
+    self.__updateStats()
+    for fid in self._files:
+      try:
+        fid.close()
+      except:
+        pass
+    with self._cbLock:
+      self._proc_done.set()
+      callbacks = self._callbacks                                                       # No callbacks added once done is set
+    if callbacks:                                                                       # Run off this thread, in order
+      CALLBACKS.submit( self.__runCallbacks, callbacks )
+    if self._poolCallback:                                                              # Release threads right away so pool keeps going
+      try:
+        self._poolCallback( self )
+      except:
+        self.__log.exception('Error in pool callback')
 
-    PROCLOCK.release( threads = self._threads )                                         # Release lock
+  def __runCallbacks(self, callbacks):
+    """Run done callbacks; called on the CALLBACKS thread"""
 
-  def __cpulimit(self):
+    for func in callbacks:
+      try:
+        func( self )
+      except:
+        self.__log.exception('Error in done callback')
+
+  def __name(self):
+    """Name of program being run; used in statistics"""
+
+    cmd = self._kwargs.get('args', self._args[0] if self._args else '')
+    if isinstance(cmd, (list, tuple,)):
+      cmd = cmd[0] if len(cmd) > 0 else ''
+    else:
+      cmd = str(cmd).split(' ')[0]
+    return os.path.basename( str(cmd) )
+
+  def __updateStats(self):
+    """Set timing and exit information in statistics"""
+
+    now   = time.monotonic()
+    stats = self.stats
+    start = self._tStart or now                                                         # Never started if None
+    head  = self._tHead  or start                                                       # Never waited at head of queue if None
+    stats.pid        = self._proc.pid if self._proc else None
+    stats.returncode = self._returncode
+    stats.queue_wait = head  - self._tQueued
+    stats.lock_wait  = start - head
+    stats.wall       = (now - self._tStart) if self._tStart else 0.0
+
+  def _applyLimits(self):
     """
-    Method to apply cpulimit CLI to process
+    Method to limit CPU and memory usage of the process
+
+    If cgroup v2 delegation is available, the process is moved into its own
+    cgroup and the kernel enforces the limits; this also covers any children
+    of the process. Otherwise, the cpulimit CLI is used to limit CPU usage.
 
     Arguments:
       None
@@ -355,20 +803,140 @@ class PopenThread( Thread ):
       None
 
     Returns:
-      Popen instance for cpulimit if started, else None
+      None; sets the _cgroup or _limit attribute
 
     """
 
-    if self._proc and CPULIMIT and self.cpulimit:                                       # If process and cpulimit CLI found and cpulimit set
-      limit = self.threads * self.cpulimit                                              # Set the limit as theads*cpulimit
+    if not self._proc or not (self.cpulimit or self.memoryLimit): return                # Nothing to do
+    limit = self.threads * self.cpulimit if self.cpulimit else None                     # Set the limit as theads*cpulimit
+
+    if CGROUPS:                                                                         # If cgroup delegation available
+      cgroup = CGROUPS.create( cpulimit = limit, memory = self.memoryLimit )
+      if cgroup and cgroup.addProcess( self._proc.pid ):                                # If created and process moved into it
+        self._cgroup = cgroup
+        return
+      elif cgroup:                                                                      # Failed to move process into cgroup; clean up
+        cgroup.close()
+
+    if CPULIMIT and limit:                                                              # If cpulimit CLI found and cpulimit set
       cmd = [ CPULIMIT, '-p', str( self._proc.pid ), '-l', str(limit) ]                 # Build command
       try:                                                                              # Try to 
-        proc = Popen(cmd, stdout = DEVNULL, stderr = STDOUT)                            # Start command; stdout/stderr piped to devnull
+        self._limit = Popen(cmd, stdout = DEVNULL, stderr = STDOUT)                     # Start command; stdout/stderr piped to devnull
       except:
         self.__log.warning('Failed to start cpu limiting')                              # Log warning on exception
-      else:
-        return proc                                                                     # Return Popen instance if started
-    return None                                                                         # Return None as nothing started
+
+########################################################################################
+class AsyncPopenThread( PopenThread ):
+  """
+  PopenThread whose subprocess runs on an asyncio event loop
+
+  The subprocess is started with asyncio.create_subprocess_exec once the
+  PopenPool has acquired threads for it, so it counts against the same PROCLOCK
+  as every other subprocess. When stdout and/or stderr are set to
+  asyncio.subprocess.PIPE, the stdout/stderr attributes are asyncio.StreamReader
+  instances that can be read on the loop; no RotatingFile thread is needed to
+  parse progress.
+
+  Instances should be created with PopenPool.Popen_aio.
+
+  """
+
+  def __init__(self, loop, *args, **kwargs):
+    """
+    Arguments:
+      loop: asyncio event loop to run the subprocess on
+      *args: Command to run; see PopenThread
+
+    Keyword arguments:
+      **kwargs: See PopenThread
+
+    Returns:
+      An AsyncPopenThread instance
+
+    """
+
+    super().__init__(*args, **kwargs)
+    self.__log     = logging.getLogger(__name__)
+    self._loop     = loop
+    self._task     = None
+    self._spawned  = asyncio.Event()                                                    # Set once process started, or finished without starting
+
+  @property
+  def pid(self):
+    """Process ID of subprocess; None if not started"""
+
+    return self._proc.pid if self._proc else None
+
+  @property
+  def stdout(self):
+    """asyncio.StreamReader for stdout if PIPE used, else None"""
+
+    return self._proc.stdout if self._proc else None
+
+  @property
+  def stderr(self):
+    """asyncio.StreamReader for stderr if PIPE used, else None"""
+
+    return self._proc.stderr if self._proc else None
+
+  async def spawnWait(self):
+    """Wait until the subprocess is started, or finished without starting"""
+
+    await self._spawned.wait()
+
+  def start(self):
+    """
+    Start the subprocess on the event loop
+
+    Called by PopenPool from the dispatcher thread once the threads for the
+    process are acquired. Returns right away.
+
+    """
+
+    self._proc_started.set()
+    self._tStart = time.monotonic()
+    if not isRunning() or self._killed:
+      self.cancel()
+      return
+    try:
+      self._task = asyncio.run_coroutine_threadsafe( self.__run(), self._loop )
+    except RuntimeError as err:                                                         # Event loop closed
+      self.__log.error( 'Failed to start process: {}'.format(err) )
+      self._returncode = 256
+      self._finish()
+
+  async def __run(self):
+    """Start process, wait for it to exit, and clean up"""
+
+    cmd    = self._args[0]
+    cmd    = [cmd] if isinstance(cmd, str) else list(cmd)
+    kwargs = self._popenKwargs()
+    try:
+      self._proc = await asyncio.create_subprocess_exec( *cmd, **kwargs )
+    except FileNotFoundError as err:
+      self.__log.error('Setting returncode to 127 (command not found): {}'.format(err))
+      self._returncode = 127
+    except Exception as err:
+      self.__log.error( 'Failed to start process: {}'.format(err) )
+      self._returncode = 256
+    else:
+      self.__log.debug('Process started')
+      REAPER.track( self._proc )                                                        # Terminated by REAPER on SIGINT/SIGTERM; reaped by asyncio
+      self._applyLimits( )
+      if self._killed: self._proc.terminate()                                           # Killed while starting
+      self._spawned.set()
+      await self._proc.wait()
+      REAPER.untrack( self._proc )
+      self._reaped( self._proc )
+      return
+    self._finish()
+
+  def _finish(self):
+    super()._finish()
+    try:
+      self._loop.call_soon_threadsafe( self._spawned.set )                              # May be called from dispatcher thread
+    except RuntimeError:                                                                # Event loop closed
+      pass
 
 ########################################################################################
 class PopenPool(Thread):
@@ -377,7 +945,7 @@ class PopenPool(Thread):
   __threads  =    1
   __cpulimit = None
 
-  def __init__(self, threads = None, cpulimit = None, queueDepth = None, *args, **kwargs):
+  def __init__(self, threads = None, cpulimit = None, queueDepth = None, aging = None, journal = None, *args, **kwargs):
     """
     Arguments:
       *args: All arguments accepted by threading.Thread
@@ -386,6 +954,10 @@ class PopenPool(Thread):
       threads (int): Number of threads to allow to run at one time
       cpulimit (int): Percentage of CPU to allow each subprocess to use
       queueDepth (int): Number of subprocesses that can be queued before the Popen_async method blocks
+      aging (float): Seconds a queued subprocess must wait to gain one priority
+        level; ensures low priority subprocesses still start. Default is AGING
+      journal (JobJournal): Journal to record subprocesses in so that those
+        that finished are skipped after a restart; see jobJournal.JobJournal
       **kwargs: All keyword arguments accepted by threading.Thread
 
     Returns:
@@ -397,10 +969,20 @@ class PopenPool(Thread):
     super().__init__(*args, **kwargs)
     self.__log         = logging.getLogger(__name__)
     self.__closed      = Event()
+    self.__stopped     = False                                                          # Set once dispatcher exits; no process would ever start
     if not isinstance(queueDepth, int): queueDepth = 50
-    self.__threadQueue = Queue( maxsize = queueDepth )
+    self.__queueDepth  = queueDepth
+    self.__aging       = AGING if aging is None else float(aging)
+    self.__threadQueue = []                                                             # Heap of PopenThreads waiting to start
+    self.__seq         = itertools.count()                                              # Counter to keep FIFO order for equal keys
+    self.__running     = set()                                                          # PopenThreads that have acquired PROCLOCK
+    self.__pending     = 0                                                              # Number of PopenThreads submitted that have not finished
+    self.__cond        = Condition()                                                    # Signals changes to queue and running processes
+    self.__sinks       = []                                                             # Functions to send statistics of finished processes to
+    self.journal       = journal
     self.threads       = threads
     self.cpulimit      = cpulimit
+    REAPER.addInterruptCallback( self.__notify )                                        # Wake dispatcher on SIGTERM
     self.start()
     atexit.register( self.close )
 
@@ -414,6 +996,7 @@ class PopenPool(Thread):
   def threads(self, val):
     self.__threads = threadCheck( val )
     PROCLOCK.threads = self.__threads
+    self.__notify()                                                                     # Dispatcher may be able to start more processes
 
   @property
   def cpulimit(self):
@@ -423,7 +1006,7 @@ class PopenPool(Thread):
 
   @cpulimit.setter
   def cpulimit(self, val):
-    if CPULIMIT and isinstance(val, int):
+    if isinstance(val, int) and (CPULIMIT or CGROUPS):
       if (val > 0) and (val < 100):
         self.__cpulimit = val
       else:
@@ -439,6 +1022,32 @@ class PopenPool(Thread):
     """
 
     self.__closed.set()
+    self.__notify()
+
+  def cancel(self, thread):
+    """
+    Remove a process from the queue and mark it cancelled, if not started yet
+
+    Arguments:
+      thread (PopenThread): Process returned by Popen_async()
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if cancelled, False if not in queue; i.e., already started
+        or finished. Use the kill() method of the process in that case
+
+    """
+
+    with self.__cond:
+      queue = [item for item in self.__threadQueue if item[-1] is not thread]
+      if len(queue) == len(self.__threadQueue): return False
+      self.__threadQueue = queue
+      heapq.heapify( self.__threadQueue )
+      self.__cond.notify_all()                                                          # Room in queue; head may have changed
+    thread.cancel()
+    return True
 
   def wait(self, timeout = None):
     """
@@ -455,17 +1064,8 @@ class PopenPool(Thread):
 
     """
 
-    endtime = None                                                                      # Initialize endTime to None
-    while PROCLOCK.n > 0 or self.__threadQueue.unfinished_tasks > 0:                    # While process(es) have the lock or there are unfinished tasks from the queue
-      if timeout is not None:                                                           # If timeout is not None; i.e., it is set
-        if endtime is None:                                                             # If endtime is None; i.e., first time through loop
-          endtime = time.monotonic() + timeout                                          # set endtime to current time plus the timeout value; i.e., time in the future
-        else:                                                                           # Else, endtime was set in previous loop
-          timeout = endtime - time.monotonic()                                          # Compute timeout as endtime - current time
-          if timout <= 0.0:                                                             # If timeout is <= 0.0
-            break                                                                       # break the while loop
-      time.sleep( TIMEOUT )                                                             # Sleep for TIMEOUT seconds
-    return PROCLOCK.n == 0                                                              # Return values signifies whether all processes finished; i.e., no processes have the PROCLOCK
+    with self.__cond:
+      return self.__cond.wait_for( lambda: self.__pending == 0, timeout = timeout )     # Wait for all submitted processes to finish; woken every time one finishes
 
   def Popen_async(self, *args, **kwargs):
     """
@@ -477,6 +1077,22 @@ class PopenPool(Thread):
     Keyword arguments:
       threads (int): Specify the number of threads the process will use.
                 Default is one (1)
+      memory (int): Memory, in bytes, the process is expected to use. The
+                process is not started until that much memory is free,
+                less memory reserved by running processes but not yet used.
+                A process is always started if nothing else is running.
+                Only used to decide when to start the process; see memoryLimit
+      memoryLimit (int): Memory, in bytes, above which the process is
+                throttled by its cgroup, if cgroup delegation is available.
+                Default is no limit
+      priority (int): Priority of the process; one of PRIORITY_INTERACTIVE,
+                PRIORITY_DVR, or PRIORITY_BATCH (default). Higher priority
+                processes start before lower priority ones, however, every
+                `aging` seconds spent in the queue raises a process one level
+                so that low priority processes still start eventually.
+      outputs (list): Paths to files the process creates. If the pool has a
+                journal, the process is recorded in it, and is not run again
+                if it finished before and all outputs still exist unchanged
       **kwargs All keywords for subprocess.Popen
 
     Returns:
@@ -491,57 +1107,233 @@ class PopenPool(Thread):
       raise Exception('Cannot add process to closed pool')                              # Raise exception
     kwargs['cpulimit'] = self.cpulimit                                                  # Set cpulimit in kwargs dictionary
     proc = PopenThread(*args, **kwargs)                                                 # Create PopenThread instance
-    self.__threadQueue.put( proc )                                                      # Add instance to queue
+    self.__submit( proc )
     return proc                                                                         # Return instance
 
+  async def Popen_aio(self, *args, **kwargs):
+    """
+    Coroutine to run subprocess with asyncio.create_subprocess_exec
+
+    Processes are queued and admitted exactly like those from Popen_async, so
+    both share the pool threads. The coroutine returns once the process has
+    started, so its stdout/stderr streams can be read right away.
+
+    Arguments:
+      *args: Command to run, as for Popen_async
+
+    Keyword arguments:
+      threads (int): Specify the number of threads the process will use.
+                Default is one (1)
+      priority (int): Priority of the process; see Popen_async
+      **kwargs All keywords for asyncio.create_subprocess_exec; use
+                asyncio.subprocess.PIPE for stdout/stderr to get streams
+
+    Returns:
+      An AsyncPopenThread instance; use the wait_aio() method to wait for
+      the process to finish
+
+    Example:
+      >>> proc = await POPENPOOL.Popen_aio( ['ffprobe', path], stdout = PIPE )
+      >>> async for line in proc.stdout: ...
+      >>> await proc.wait_aio()
+
+    """
+
+    if self.__closed.is_set():
+      raise Exception('Cannot add process to closed pool')
+    loop = asyncio.get_running_loop()
+    kwargs['cpulimit'] = self.cpulimit
+    proc = AsyncPopenThread(loop, *args, **kwargs)
+    if not self.__submit( proc, blocking = False ):                                     # If queue full
+      await loop.run_in_executor( None, self.__submit, proc )                           # Wait for room without blocking the event loop
+    await proc.spawnWait()
+    return proc
+
+  def __submit(self, proc, blocking = True):
+    """
+    Add process to the queue
+
+    Arguments:
+      proc (PopenThread): Process to queue
+
+    Keyword arguments:
+      blocking (bool): If set, wait for room in queue when queue full
+
+    Returns:
+      bool: True if queued (or skipped, or cancelled because the pool has
+        stopped), False if queue full and not blocking
+
+    """
+
+    if self.__stopped:                                                                  # Dispatcher gone; nothing would start the process
+      proc.cancel()
+      return True
+    if self.__journaled( proc ):                                                        # Finished in a previous run
+      return True
+    key = proc.priority * self.__aging + time.monotonic()                               # Sort key; older processes 'age' into higher priority
+    with self.__cond:
+      if not blocking and len(self.__threadQueue) >= self.__queueDepth and not self.__stopped:
+        return False
+      self.__cond.wait_for( lambda: len(self.__threadQueue) < self.__queueDepth or self.__stopped ) # Block while queue full
+      stopped = self.__stopped
+      if not stopped:
+        proc._poolCallback = self.__finished                                            # Pool is notified when process finishes
+        heapq.heappush( self.__threadQueue, (key, next(self.__seq), proc,) )            # Add instance to queue
+        self.__pending += 1
+        self.__cond.notify_all()
+    if stopped:                                                                         # Stopped while waiting for room
+      proc.cancel()
+    return True
+
   def run(self):
     """Run as Thread that handles dequeuing and starting Popen processes."""
 
     self.__log.debug('PopenPool open')
-    thread = None                                                                       # Initialize thread as None
-    while not _sigtermEvent.is_set():                                                   # Loop while a terminate has NOT been called
-      if thread is None:                                                                # If PopenThread is None, we will try to get a thread object from the queue
-        try:                                                                            # Try to get left most element from queue list
-          thread = self.__threadQueue.get(timeout=TIMEOUT)                              # Get first element of threads list queue
-        except:                                                                         # On exception
-          pass                                                                          # Pass
-        else:                                                                           # Else, we got a thread from the Queue
-          thread = self._Popen( thread )                                                # Try to run the thread; the _Popen method will return None if the process was started, otherwise return input
-      else:                                                                             # Else, there is already a thread running
-        thread = self._Popen( thread )                                                  # Try to run the thread; the _Popen method will return None if the process was started, otherwise return input
-
-      if self.__closed.is_set() and self.__threadQueue.empty() and not thread:          # If pool has been closed, no more proesses in list, and no process trying to start, break while loop
-        break
-
-    while not self.__threadQueue.empty():                                               # While the Queue is not empty
-      _ = self.__threadQueue.get()                                                      # Pop off a value
-      self.__threadQueue.task_done()                                                    # Call task_done()
+    while True:
+      with self.__cond:
+        self.__cond.wait_for( self.__wakeDispatcher )                                   # Sleep until process queued, pool closed, or SIGTERM
+        if _sigtermEvent.is_set() or not self.__threadQueue:                            # If terminate caught, or closed with empty queue
+          break
+        thread = self.__threadQueue[0][-1]                                              # Highest priority process; may change while waiting for threads
+        if thread._tHead is None: thread._tHead = time.monotonic()                      # Time from here to start is time spent waiting for lock
+        if not self.__memoryFits( thread ):                                             # If not enough free memory
+          self.__cond.wait( timeout = MEMORY_RECHECK )                                  # Memory may be freed by other programs, so check again later
+          continue
+        if not PROCLOCK.acquire( threads = thread.threads, blocking = False ):          # If not enough threads free
+          self.__cond.wait()                                                            # Sleep until process finishes, new process queued, or threads changed
+          continue
+        heapq.heappop( self.__threadQueue )
+        self.__running.add( thread )
+        self.__cond.notify_all()                                                        # Signal that there is room in the queue
+      thread.start()                                                                    # Start process; returns right away
+
+    with self.__cond:
+      self.__stopped = True                                                             # Processes submitted from now on are cancelled
+      threads, self.__threadQueue = self.__threadQueue, []
+      self.__cond.notify_all()
+    for _, _, thread in threads:                                                        # Processes never started must still be marked as done
+      thread.cancel()
 
     self.__log.debug('PopenPool closed')
 
-  def _Popen(self, thread):
+  def __memoryFits(self, thread):
+    """
+    Check if there is enough free memory to start process
+
+    Memory that running processes have declared, but are not yet using, is
+    treated as used so that processes still ramping up are accounted for.
+
+    """
+
+    if not thread.memory or not self.__running:                                         # No memory declared or nothing running
+      return True
+    reserved = 0
+    for proc in self.__running:
+      if proc.memory:
+        reserved += max( proc.memory - proc.rss, 0 )
+    free = psutil.virtual_memory().available - reserved
+    if free < thread.memory:
+      self.__log.debug( 'Waiting for memory; need {} MB, have {} MB'.format(
+        thread.memory // 1024**2, free // 1024**2) )
+      return False
+    return True
+
+  def __journaled(self, proc):
+    """
+    Record process in journal; skip it if it already finished
+
+    Returns:
+      bool: True if process was skipped
+
+    """
+
+    journal = self.journal
+    if journal is None or not proc.outputs or proc._jobKey is not None:                 # No journal, nothing to check, or already recorded
+      return False
+    try:
+      if journal.completed( proc.cmd, proc.outputs ):
+        self.__log.info( 'Outputs exist from previous run, skipping: {}'.format(proc.outputs) )
+        proc.skip()
+        return True
+      proc._jobKey = journal.queued( proc.cmd, proc.outputs )
+    except:
+      self.__log.exception( 'Failed to update job journal' )
+      return False
+    proc.addDoneCallback( lambda p: self.__journalFinished( journal, p ) )
+    return False
+
+  def __journalFinished(self, journal, thread):
+    """Record in journal that process finished"""
+
+    try:
+      journal.finished( thread._jobKey, thread.returncode, interrupted = not isRunning() )
+    except:
+      self.__log.exception( 'Failed to update job journal' )
+
+  def __wakeDispatcher(self):
+    """Condition for the dispatcher thread to wake up"""
+
+    return len(self.__threadQueue) > 0 or self.__closed.is_set() or _sigtermEvent.is_set()
+
+  def __notify(self):
+    """Wake up all threads waiting on pool condition"""
+
+    with self.__cond:
+      self.__cond.notify_all()
+
+  def __finished(self, thread):
+    """
+    Called when PopenThread finishes; release threads and update counters
+
+    Runs on the thread that finished the process (e.g., the REAPER), so must
+    not block. The process is only counted as finished once its done
+    callbacks, which run first on the CALLBACKS thread, have returned, so
+    wait() does not return before e.g. the journal is updated.
+
     """
-    Wrapper to tart PopenThreads
 
-    This method allows for specifying number of threads to .acquire() method when
-    trying to obtain the NLOCK
+    with self.__cond:
+      if thread in self.__running:
+        self.__running.remove( thread )
+        PROCLOCK.release( threads = thread.threads )                                    # Release lock
+      self.__cond.notify_all()
+    CALLBACKS.submit( self.__retired, thread.stats )
+
+  def __retired(self, stats):
+    """Update pending count and pass statistics to sinks; run on CALLBACKS thread"""
+
+    with self.__cond:
+      self.__pending -= 1
+      self.__cond.notify_all()
+    for sink in self.__sinks:
+      try:
+        sink( stats )
+      except:
+        self.__log.exception('Error in statistics sink')
+
+  def addStatsSink(self, sink):
+    """
+    Add sink for resource usage of finished processes
 
     Arguments:
-      thread: A PopenThread object
+      sink: Function called with a ProcStats instance every time a process
+        finishes; e.g., a procStats.JSONLinesSink or procStats.LoggingSink
+        instance, or any other callable
 
     Keyword arguments:
       None
 
     Returns:
-      None if the lock acquired and process started.
-      thread (input object) if the lock not acqurie and process not started.
+      None
 
     """
 
-    if PROCLOCK.acquire(timeout = TIMEOUT, threads = thread.threads):                   # Grab lock specifying theads and with timeout
-      thread.start()                                                                    # If got lock, start the thread; note that the thread might get stuck as it tries to acquire the lock, but that is fine
-      PROCLOCK.release(threads = thread.threads)                                        # Release lock
-      thread.startWait()                                                                # Wait for thread to really start; an event in the object will be set after the lock is acquired
-      self.__threadQueue.task_done()                                                    # Signal that work on dequeued item finished; this will decrement the Queue.unfinished_tasks value
-      return None                                                                       # Return None to signal thread started
-    return thread                                                                       # Return thread to signal NOT started
+    self.__sinks.append( sink )
+
+  def removeStatsSink(self, sink):
+    """Remove sink added with addStatsSink"""
+
+    try:
+      self.__sinks.remove( sink )
+    except ValueError:
+      pass
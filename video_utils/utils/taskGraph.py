@@ -0,0 +1,135 @@
+import logging
+from threading import Thread, Condition
+
+from .. import isRunning
+
+class Task( object ):
+  """Single node in a TaskGraph"""
+
+  PENDING, RUNNING, DONE, FAILED, SKIPPED = range(5)
+
+  def __init__(self, name, func, args, kwargs, after):
+    self.name    = name
+    self.func    = func
+    self.args    = args
+    self.kwargs  = kwargs
+    self.after   = tuple(after)
+    self.status  = self.PENDING
+    self.result  = None
+    self.error   = None
+
+  def __repr__(self):
+    return '<Task : {}>'.format(self.name)
+
+class TaskGraph( object ):
+  """
+  Run functions concurrently based on their dependencies
+
+  Each task runs in its own thread as soon as all the tasks it depends on have
+  finished, so independent tasks run at the same time. Tasks are expected to
+  spend most of their time waiting on subprocesses submitted to the global
+  POPENPOOL, which decides how many of those actually run at once.
+
+  A task fails if it raises an exception; tasks that depend on a failed task
+  are skipped.
+
+  Example:
+    >>> graph = TaskGraph()
+    >>> graph.addTask( 'crop',   cropdetect, inFile )
+    >>> graph.addTask( 'encode', encode, after = ('crop',) )
+    >>> graph.run()
+
+  """
+
+  def __init__(self):
+    self.__log     = logging.getLogger(__name__)
+    self.__tasks   = {}
+    self.__order   = []
+    self.__cond    = Condition()
+    self.__running = 0
+
+  def __contains__(self, name):
+    return name in self.__tasks
+
+  def addTask(self, name, func, *args, after = (), **kwargs):
+    """
+    Add a task to the graph
+
+    Arguments:
+      name (str): Unique name for the task
+      func: Function to run
+      *args: Arguments passed to func
+
+    Keyword arguments:
+      after (tuple): Names of tasks that must finish before this one starts.
+        Tasks must be added before the tasks that depend on them
+      **kwargs: Keyword arguments passed to func
+
+    Returns:
+      None
+
+    """
+
+    if name in self.__tasks:
+      raise Exception( 'Task already exists: {}'.format(name) )
+    for dep in after:
+      if dep not in self.__tasks:
+        raise Exception( 'Unknown dependency for {}: {}'.format(name, dep) )
+    self.__tasks[name] = Task( name, func, args, kwargs, after )
+    self.__order.append( name )
+
+  def run(self):
+    """
+    Run all tasks and wait for them to finish
+
+    Returns:
+      bool: True if all tasks finished without error, False otherwise
+
+    """
+
+    with self.__cond:
+      self.__schedule()
+      self.__cond.wait_for( lambda: self.__running == 0 )
+    return all( task.status == Task.DONE for task in self.__tasks.values() )
+
+  def result(self, name):
+    """Return value of task; None if task did not finish"""
+
+    return self.__tasks[name].result
+
+  def failed(self, name):
+    """Check if task failed or was skipped"""
+
+    return self.__tasks[name].status in (Task.FAILED, Task.SKIPPED)
+
+  def __schedule(self):
+    """Start all tasks whose dependencies are done; must hold condition"""
+
+    for name in self.__order:
+      task = self.__tasks[name]
+      if task.status != Task.PENDING: continue
+      deps = [self.__tasks[dep].status for dep in task.after]
+      if any( s in (Task.FAILED, Task.SKIPPED) for s in deps ) or not isRunning():
+        self.__log.debug( 'Skipping task: {}'.format(name) )
+        task.status = Task.SKIPPED
+      elif all( s == Task.DONE for s in deps ):
+        task.status     = Task.RUNNING
+        self.__running += 1
+        Thread( target = self.__run, args = (task,), daemon = True ).start()
+
+  def __run(self, task):
+    """Run a task in thread, then start any tasks that depended on it"""
+
+    self.__log.debug( 'Starting task: {}'.format(task.name) )
+    try:
+      result = task.func( *task.args, **task.kwargs )
+    except Exception as err:
+      self.__log.error( 'Task failed: {} : {}'.format(task.name, err) )
+      status, task.error = Task.FAILED, err
+    else:
+      status, task.result = Task.DONE, result
+    with self.__cond:
+      task.status     = status
+      self.__running -= 1
+      self.__schedule()                                                                 # May skip tasks, so must run before signaling
+      self.__cond.notify_all()
@@ -0,0 +1,228 @@
+import logging
+import os, json, time
+from threading import Lock, local, current_thread
+
+from .procStats import Collector, readThreadIO
+
+class Span( object ):
+  """
+  Timing and resource usage of one stage of processing a file
+
+  Times are in seconds and I/O in bytes. CPU time and I/O include the thread
+  that ran the stage and all pool subprocesses it submitted that finished
+  before the stage ended; values that could not be measured are None.
+
+  """
+
+  FIELDS = ('name', 'parent', 'thread', 'start', 'wall', 'cpu', 'cpu_children',
+            'read_bytes', 'write_bytes', 'processes', 'args')
+
+  def __init__(self, **kwargs):
+    for key in self.FIELDS:
+      setattr( self, key, kwargs.get(key, None) )
+
+  def __repr__(self):
+    return '<Span : {} {:0.3f}s>'.format( self.name, self.wall or 0.0 )
+
+  def asdict(self):
+    """Return values as a dictionary"""
+
+    return {key : getattr(self, key) for key in self.FIELDS}
+
+def _add( *vals ):
+  """Sum values, ignoring None; None if all are None"""
+
+  vals = [val for val in vals if val is not None]
+  return sum( vals ) if vals else None
+
+class _SpanContext( object ):
+  """Context manager that measures a Span and adds it to a Timeline"""
+
+  def __init__(self, timeline, name, args):
+    self.timeline = timeline
+    self.name     = name
+    self.args     = args
+
+  def __enter__(self):
+    stack = self.timeline._stack()
+    self.parent    = stack[-1] if stack else None
+    stack.append( self.name )
+    self.collector = Collector().__enter__()
+    self.io        = readThreadIO()
+    self.cpu       = time.thread_time()
+    self.start     = time.time()
+    self.t0        = time.monotonic()
+    return self
+
+  def __exit__(self, *args):
+    wall = time.monotonic() - self.t0
+    cpu  = time.thread_time() - self.cpu
+    io   = readThreadIO()
+    self.collector.__exit__()
+    self.timeline._stack().pop()
+
+    procs    = [stats for stats in self.collector if stats.cpu is not None]           # Finished before end of span
+    children = _add( *[stats.cpu for stats in procs] )
+    reads    = [stats.read_bytes  for stats in procs]
+    writes   = [stats.write_bytes for stats in procs]
+    if self.io and io:
+      reads.append(  io.get('read_bytes',  0) - self.io.get('read_bytes',  0) )
+      writes.append( io.get('write_bytes', 0) - self.io.get('write_bytes', 0) )
+
+    span = Span( name         = self.name,
+                 parent       = self.parent,
+                 thread       = current_thread().name,
+                 start        = self.start,
+                 wall         = wall,
+                 cpu          = _add( cpu, children ),
+                 cpu_children = children,
+                 read_bytes   = _add( *reads ),
+                 write_bytes  = _add( *writes ),
+                 processes    = len( self.collector ),
+                 args         = self.args or None )
+    self.timeline._add( span )
+
+class Timeline( object ):
+  """
+  Spans of the stages of processing one file
+
+  Stages may run in different threads (e.g., in a TaskGraph); spans are
+  nested per thread, so a span started inside another in the same thread
+  has that span as its parent. The timeline can be saved as JSON or as a
+  Chrome trace file, which can be opened in chrome://tracing or Perfetto.
+
+  Example:
+    >>> timeline = Timeline( 'show.ts' )
+    >>> with timeline.span( 'cropdetect' ):
+    ...   cropdetect( 'show.ts' )
+
+  """
+
+  def __init__(self, name = None):
+    """
+    Keyword arguments:
+      name (str): Name of the timeline; e.g., the input file
+
+    Returns:
+      Timeline instance
+
+    """
+
+    self.__log   = logging.getLogger(__name__)
+    self.__lock  = Lock()
+    self.__local = local()
+    self.name    = name
+    self.start   = time.time()
+    self.spans   = []
+
+  def span(self, name, **kwargs):
+    """
+    Return context manager that times a stage
+
+    Arguments:
+      name (str): Name of the stage
+
+    Keyword arguments:
+      Any keyword is stored with the span; e.g., file names
+
+    Returns:
+      Context manager
+
+    """
+
+    return _SpanContext( self, name, kwargs )
+
+  def asdict(self):
+    """Return timeline as a dictionary; spans are sorted by start time"""
+
+    with self.__lock:
+      spans = sorted( self.spans, key = lambda span: span.start )
+    return {'name'  : self.name,
+            'start' : self.start,
+            'wall'  : time.time() - self.start,
+            'spans' : [span.asdict() for span in spans]}
+
+  def summary(self):
+    """Return one line with wall time of each top level span"""
+
+    info = ['{} {:0.1f}s'.format(span['name'], span['wall'])
+              for span in self.asdict()['spans'] if span['parent'] is None]
+    return ', '.join( info )
+
+  def save(self, path):
+    """
+    Write timeline to JSON file
+
+    Arguments:
+      path (str): File to write
+
+    Keyword arguments:
+      None
+
+    Returns:
+      str: The path
+
+    """
+
+    return self.__write( path, self.asdict() )
+
+  def saveTrace(self, path):
+    """
+    Write timeline in Chrome trace event format
+
+    Each span is a complete ('X') event with times in microseconds; threads
+    are named after the threads that ran the stages.
+
+    Arguments:
+      path (str): File to write
+
+    Keyword arguments:
+      None
+
+    Returns:
+      str: The path
+
+    """
+
+    pid     = os.getpid()
+    tids    = {}
+    events  = []
+    for span in self.asdict()['spans']:
+      tid  = tids.setdefault( span['thread'], len(tids) + 1 )
+      args = {key : span[key] for key in Span.FIELDS[4:-1]}
+      args.update( span['args'] or {} )
+      events.append( {'name' : span['name'],
+                      'cat'  : 'video_utils',
+                      'ph'   : 'X',
+                      'ts'   : round( (span['start'] - self.start) * 1.0e6 ),
+                      'dur'  : round( span['wall'] * 1.0e6 ),
+                      'pid'  : pid,
+                      'tid'  : tid,
+                      'args' : args} )
+    for thread, tid in tids.items():
+      events.append( {'name' : 'thread_name', 'ph' : 'M', 'pid' : pid, 'tid' : tid,
+                      'args' : {'name' : thread}} )
+    events.append( {'name' : 'process_name', 'ph' : 'M', 'pid' : pid,
+                    'args' : {'name' : os.path.basename( self.name or '' )}} )
+    return self.__write( path, {'traceEvents' : events, 'displayTimeUnit' : 'ms'} )
+
+  def _stack(self):
+    """Names of open spans in the calling thread"""
+
+    if not hasattr( self.__local, 'stack' ): self.__local.stack = []
+    return self.__local.stack
+
+  def _add(self, span):
+    with self.__lock:
+      self.spans.append( span )
+
+  def __write(self, path, data):
+    fdir = os.path.dirname( path )
+    if fdir != '': os.makedirs( fdir, exist_ok = True )
+    try:
+      with open(path, 'w') as fid:
+        json.dump( data, fid, indent = 1 )
+    except:
+      self.__log.exception( 'Failed to write timeline: {}'.format(path) )
+      return None
+    return path
@@ -0,0 +1,284 @@
+import logging
+import os, json, time, shutil, hashlib
+import fcntl
+from threading import Lock
+
+from ..config import CACHEDIR, CONFIG
+
+CACHE    = os.path.join( CACHEDIR, 'transcodes' )                                       # Default cache directory
+MAXBYTES = float( CONFIG.get('TRANSCODE_CACHE_GB',   None) or 500 ) * 1024**3           # Largest total size of cached files
+MAXAGE   = float( CONFIG.get('TRANSCODE_CACHE_DAYS', None) or 90  ) * 86400            # Cached files not used for this many seconds are removed
+SAMPLE   = 1024**2                                                                      # Bytes read from each part of a file for its fingerprint
+FICLONE  = 0x40049409                                                                   # Linux ioctl for reflink copy; e.g., on Btrfs and XFS
+
+def fingerprint( path ):
+  """
+  Fast fingerprint of file contents
+
+  Hashes the file size plus SAMPLE bytes from the beginning, middle, and end
+  of the file, so that even very large files are fingerprinted quickly.
+  Two rips of the same disc are byte identical, so this is enough to tell
+  them apart from different files.
+
+  Arguments:
+    path (str): Path to file
+
+  Keyword arguments:
+    None
+
+  Returns:
+    str: Hex digest
+
+  """
+
+  size = os.path.getsize( path )
+  hsh  = hashlib.sha1( str(size).encode() )
+  with open(path, 'rb') as fid:
+    for offset in sorted( set( [0, max(size // 2 - SAMPLE // 2, 0), max(size - SAMPLE, 0)] ) ):
+      fid.seek( offset )
+      hsh.update( fid.read( SAMPLE ) )
+  return hsh.hexdigest()
+
+def normalize( cmd, inFile, outFile ):
+  """
+  Normalize ffmpeg command so it is the same for any input/output location
+
+  The input and output paths are replaced by placeholders, other input files
+  (e.g., chapter file or cut list) are replaced by fingerprints of their
+  contents, and -threads is removed as it only changes how fast the file is
+  encoded.
+
+  Arguments:
+    cmd (list): ffmpeg command
+    inFile (str): Input file in the command
+    outFile (str): Output file in the command
+
+  Keyword arguments:
+    None
+
+  Returns:
+    list: Normalized command
+
+  """
+
+  out  = []
+  args = iter( cmd )
+  for arg in args:
+    if arg == '-threads':
+      next( args, None )
+    elif arg == inFile:
+      out.append( '{input}' )
+    elif arg == outFile:
+      out.append( '{output}' )
+    elif out and out[-1] == '-i' and os.path.isfile( arg ):
+      with open(arg, 'rb') as fid:
+        data = fid.read().replace( os.path.abspath(inFile).encode(), b'{input}' )      # Cut lists contain input path
+      out.append( hashlib.sha1( data ).hexdigest() )
+    else:
+      out.append( arg )
+  return out
+
+def linkFile( src, dst ):
+  """
+  Make dst a copy of src as cheaply as possible
+
+  Tries a reflink (copy-on-write) copy first, then a plain copy. Hard links
+  are never used: tags are written to files in place after they are stored
+  or fetched, and with a shared file that would change the cached copy too.
+
+  Arguments:
+    src (str): Existing file
+    dst (str): Path to create
+
+  Keyword arguments:
+    None
+
+  Returns:
+    str: 'reflink' or 'copy'
+
+  """
+
+  fdir = os.path.dirname( dst )
+  if fdir != '': os.makedirs( fdir, exist_ok = True )
+  try:
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+      fcntl.ioctl( fout.fileno(), FICLONE, fin.fileno() )
+    return 'reflink'
+  except:
+    if os.path.exists( dst ): os.remove( dst )
+  shutil.copyfile( src, dst )
+  return 'copy'
+
+class TranscodeCache( object ):
+  """
+  Content-addressed cache of transcoded files
+
+  Files are stored under a key made from the fingerprint of the input file
+  and the normalized ffmpeg command, so the same rip converted with the
+  same settings is found no matter where either file is. The index is a
+  JSON sidecar file in the cache directory; it is locked while being changed
+  so several watchdogs can share a cache.
+
+  """
+
+  def __init__(self, path = None, maxBytes = None, maxAge = None):
+    """
+    Keyword arguments:
+      path (str): Cache directory; default is CACHE
+      maxBytes (float): Largest total size of cached files; default is MAXBYTES
+      maxAge (float): Remove files not used for this many seconds; default is MAXAGE
+
+    Returns:
+      TranscodeCache instance
+
+    """
+
+    self.__log    = logging.getLogger(__name__)
+    self.__lock   = Lock()
+    self.path     = path or CACHE
+    self.maxBytes = MAXBYTES if maxBytes is None else maxBytes
+    self.maxAge   = MAXAGE   if maxAge   is None else maxAge
+    self.index    = os.path.join( self.path, 'index.json' )
+    os.makedirs( self.path, exist_ok = True )
+
+  def key(self, inFile, cmd, outFile):
+    """
+    Cache key for converting inFile with an ffmpeg command
+
+    Arguments:
+      inFile (str): Input file
+      cmd (list): ffmpeg command that creates outFile from inFile
+      outFile (str): Output file
+
+    Keyword arguments:
+      None
+
+    Returns:
+      str: Key
+
+    """
+
+    data = [fingerprint( inFile )] + normalize( cmd, inFile, outFile )
+    return hashlib.sha1( json.dumps( data ).encode() ).hexdigest()
+
+  def fetch(self, key, outFile):
+    """
+    Create outFile from cache
+
+    Arguments:
+      key (str): Key from key()
+      outFile (str): Path to create
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: True if found in cache and outFile created
+
+    """
+
+    with self.__update() as index:
+      entry = index.get( key, None )
+      if entry is None: return False
+      src = os.path.join( self.path, entry['file'] )
+      if not os.path.isfile( src ):                                                     # Cached file removed outside of cache
+        index.pop( key )
+        return False
+      entry['used'] = time.time()
+    try:
+      how = linkFile( src, outFile )                                                    # Outside lock; another process may evict src meanwhile
+    except:
+      self.__log.warning( 'Failed to copy file from cache; encoding instead: {}'.format(outFile) )
+      try:
+        if os.path.exists( outFile ): os.remove( outFile )                              # Remove partial copy
+      except OSError:
+        pass
+      return False
+    self.__log.info( 'Found in cache ({}): {}'.format(how, outFile) )
+    return True
+
+  def store(self, key, outFile):
+    """
+    Add a transcoded file to cache, then remove old files if cache too big
+
+    Arguments:
+      key (str): Key from key()
+      outFile (str): Transcoded file
+
+    Keyword arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    name = key + os.path.splitext( outFile )[1]
+    dst  = os.path.join( self.path, name )
+    try:
+      if os.path.exists( dst ): os.remove( dst )
+      linkFile( outFile, dst )
+    except:
+      self.__log.exception( 'Failed to add file to cache: {}'.format(outFile) )
+      return
+    now = time.time()
+    with self.__update() as index:
+      index[key] = {'file'    : name,
+                    'size'    : os.path.getsize( dst ),
+                    'source'  : outFile,
+                    'created' : now,
+                    'used'    : now}
+      self.__evict( index )
+
+  def evict(self):
+    """Remove files not used in maxAge seconds, then least recently used until under maxBytes"""
+
+    with self.__update() as index:
+      self.__evict( index )
+
+  def __evict(self, index):
+    now   = time.time()
+    keys  = sorted( index, key = lambda key: index[key]['used'] )                       # Least recently used first
+    total = sum( entry['size'] for entry in index.values() )
+    for key in keys:
+      entry = index[key]
+      if total <= self.maxBytes and now - entry['used'] <= self.maxAge:
+        continue
+      try:
+        os.remove( os.path.join( self.path, entry['file'] ) )
+      except OSError:
+        pass
+      total -= entry['size']
+      index.pop( key )
+      self.__log.debug( 'Removed from cache: {}'.format(entry['source']) )
+
+  def __update(self):
+    return _Index( self.index, self.__lock )
+
+class _Index( object ):
+  """Context manager that locks, loads, and on exit saves the cache index"""
+
+  def __init__(self, path, lock):
+    self.path = path
+    self.lock = lock
+
+  def __enter__(self):
+    self.lock.acquire()
+    self.fid = open(self.path + '.lock', 'w')
+    fcntl.flock( self.fid, fcntl.LOCK_EX )                                              # Other processes using cache
+    try:
+      with open(self.path, 'r') as fid:
+        self.data = json.load( fid )
+    except:
+      self.data = {}
+    return self.data
+
+  def __exit__(self, *args):
+    try:
+      with open(self.path + '.tmp', 'w') as fid:
+        json.dump( self.data, fid )
+      os.replace( self.path + '.tmp', self.path )
+    finally:
+      fcntl.flock( self.fid, fcntl.LOCK_UN )
+      self.fid.close()
+      self.lock.release()
@@ -1,36 +1,59 @@
 # Built-in imports
 import logging
-import os, re, time
-from datetime import datetime
+import os, re, time, shutil, json
+from datetime import datetime, timedelta
 from subprocess import PIPE, STDOUT
+from collections import deque
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 
 from . import __name__ as __pkg_name__
 from . import __version__ as __pkg_version__
 from . import _sigintEvent, _sigtermEvent, isRunning
 
 # Parent classes
-from .mediainfo import MediaInfo
+from .mediainfo import MediaInfo, ENCODE, REMUX, CRF
 from .comremove import ComRemove
 from .utils.handlers import RotatingFile
-from .utils.ffmpeg_utils   import cropdetect, FFmpegProgress, progress
+from .utils.ffmpeg_utils   import cropdetect, FFmpegProgress, progress, estimateMemory
+from .utils.ffmpeg_utils   import splitKeyframes, concatSegments, readCutList, getVideoLength
+from .utils.ffmpeg_utils   import readSegmentList, ProgressPipe, PROGRESS
 from .utils.threadCheck import threadCheck 
+from .utils.taskGraph import TaskGraph
+from .utils.presetTuner import PresetTuner
+from .utils.transcodeCache import TranscodeCache
+from .utils.timeline import Timeline
 
 # Subtitle imports
 from .subtitles.opensubtitles import OpenSubtitles
 from .subtitles import vobsub_extract
 from .subtitles import vobsub_to_srt
 from .subtitles import ccextract 
+from .subtitles.srtUtils import srtCut
 
 # Metadata imports
 from .videotagger import getMetaData
 
 # Logging formatter
-from .config import getComskipLog, getTranscodeLog, fileFMT
+from .config import getComskipLog, getTranscodeLog, fileFMT, renditionConflicts
 
 from . import POPENPOOL
 
 _sePat = re.compile( r'[sS](\d{2,})[eE](\d{2,})' );                              # Matching pattern for season/episode files; lower/upper case 's' followed by 2 or more digits followed by upper/lower 'e' followed by 2 or more digits followed by ' - ' string
 
+POLICIES = ('sjf', 'deadline', 'fifo')                                                  # Orders for transcode_many()
+BATCH    = 2                                                                            # Files transcode_many() converts at the same time
+TUNE     = ('-tune', 'zerolatency')                                                     # Encoder options; enable faster streaming
+
+def probe( path ):
+  """Return duration, in seconds, and video height of file from mediainfo; None on error"""
+
+  try:
+    info = MediaInfo( path )
+    return info['General'][0]['Duration'] / 1000.0, info['Video'][0]['Height']         # mediainfo duration is in milliseconds
+  except:
+    return None
+
 class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
   """
   For converting video files h264 encoded files in either the MKV or MP4 container.
@@ -59,6 +82,14 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
                vobsub        = False, 
                srt           = False,
                vobsub_delete = False,
+               chunks        = None,
+               tune          = False,
+               checkpoint    = None,
+               cache         = False,
+               remux         = False,
+               renditions    = None,
+               progress_callback = None,
+               trace         = False,
                **kwargs):
     """
     Keyword arguments:
@@ -78,6 +109,9 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
                         is multiplied by number of threads to use.
                         DEFAULT: 75 per cent.
                         TO DISABLE LIMITING - set to 0.
+       priority (int): Priority of subprocesses in the POPENPOOL queue; one of
+                        the PRIORITY_* values in video_utils.utils.subprocPool.
+                        DEFAULT: PRIORITY_BATCH
        remove (bool): Set to True to remove mkv file after transcode
        vobsub (bool): Set to extract VobSub file(s). If SRT is set, then
                         this keyword is also set. Setting this will NOT
@@ -89,6 +123,50 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
        vobsub_delete (bool): Set to delete VobSub file(s) after they have been 
                         converted to SRT format. Used in conjunction with
                         srt keyword.
+       chunks (int): Set to split the video into this many segments at
+                        keyframes and encode them at the same time; the
+                        threads are divided between the segments.
+                        DEFAULT: one (1); i.e., encode in one piece
+       tune (bool): Set to choose the encoder preset by encoding short
+                        samples of the input with several presets; see
+                        video_utils.utils.presetTuner. Encode is skipped if
+                        the predicted size does not fit on disk.
+                        DEFAULT: Always use the 'slow' preset
+       cache (bool,TranscodeCache): Set to keep transcoded files in a
+                        content-addressed cache, so converting the same
+                        source with the same settings again copies the
+                        cached file into place instead of encoding; may
+                        also be a TranscodeCache instance.
+                        DEFAULT: No cache
+       remux (bool): Set to copy the video stream, instead of
+                        re-encoding it, when the source already has the
+                        target codec, level, and bit rate and needs no
+                        cropping or filters; see MediaInfo.get_policy().
+                        DEFAULT: Always re-encode video
+       renditions (list): Heights, in pixels, of extra lower resolution
+                        copies to create, e.g., [720] for a mobile copy.
+                        All outputs are encoded by one ffmpeg command from
+                        one decode of the source, are named like the main
+                        output with their own resolution, and are tagged.
+                        Heights not below the source are ignored. Cannot
+                        be used with chunks, tune, checkpoint, cache, or
+                        remux; those are ignored when renditions are set.
+                        DEFAULT: No extra copies
+       progress_callback : Function, or list of functions, called about
+                        twice a second during the encode with a
+                        ffmpeg_utils.Progress instance (out_time, fps,
+                        speed, bitrate, total_size, percent, remaining);
+                        e.g., for a dashboard.
+                        DEFAULT: Only log estimated completion time
+       trace (bool): Set to also write the timing of each stage of a file
+                        in Chrome trace format, next to the JSON timeline
+                        that is always written to the 'timelines' directory
+                        beside the transcode log.
+       checkpoint (float): Set to write the encoded video as closed-GOP
+                        segments of this many seconds, listed in a manifest,
+                        so an interrupted encode resumes after the last
+                        finished segment. Not used with chunks.
+                        DEFAULT: Encode in one piece; restart if interrupted
       username (str): User name for opensubtitles.org
       userpass (str): Password for opensubtitles.org. Recommend that
                         this be the md5 hash of the password and not
@@ -97,6 +175,11 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
 
     """
 
+    if not hasattr(self, '_initArgs'):                                                  # Not already recorded by a subclass
+      initKwargs = {key : val for key, val in locals().items()
+                      if key not in ('self', 'kwargs', '__class__')}
+      initKwargs.update( kwargs )
+      self._initArgs = (VideoConverter, initKwargs,)                                    # Used by transcode_many() to create more converters
     super().__init__(**kwargs);
     self.__log = logging.getLogger( __name__ );                                   # Set log to root logger for all instances
     self.container = container
@@ -122,6 +205,20 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     self.x265          = x265
     self.remove        = remove
     self.vobsub_delete = vobsub_delete
+    self.chunks        = max( int(chunks), 1 ) if chunks else 1
+    self.tune          = tune
+    self.checkpoint    = float(checkpoint) if checkpoint else None
+    self.cache         = (TranscodeCache() if cache is True else cache) or None
+    self.remux         = remux
+    self.renditions    = sorted( set( int(h) for h in renditions ), reverse = True ) if renditions else []
+    self.renditionFiles = []                                                            # (path, height) of renditions for current file
+    if self.renditions:
+      ignored = renditionConflicts( self.chunks, tune, self.checkpoint, self.cache, remux )
+      if ignored:
+        self.__log.warning( 'Renditions are encoded in one command; ignoring: {}'.format( ', '.join(ignored) ) )
+    if callable( progress_callback ): progress_callback = [progress_callback]
+    self.progressCallbacks = list( progress_callback or [] )
+    self.trace         = trace
     self.inFile       = None
 
     if transcode_log is None:
@@ -140,6 +237,7 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
       self.lang = ['eng']                                                       # Set default language to english 
     
     self.chapterFile      = None
+    self.cutFile          = None
 
     self.video_info       = None                                                # Set video_info to None by default
     self.audio_info       = None                                                # Set audio_info to None by default
@@ -182,6 +280,118 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     self.__container = val.lower();
 
 
+  ################################################################################
+  def transcode_many( self, paths, policy = 'sjf', deadlines = None,
+        concurrency = None, callback = None, factory = None, **kwargs):
+    """
+    Transcode many files, overlapping work on one file with another's encode
+
+    All files are probed up front, at the same time, and ordered by policy.
+    Then `concurrency` files are converted at once, each by its own
+    converter with the same settings as this one, so the probing,
+    metadata, subtitle, and tagging steps of one file run while another file
+    is encoding. The encodes themselves still go through POPENPOOL, which
+    limits the CPUs used.
+
+    Arguments:
+      paths (list): Paths of files to transcode
+
+    Keyword arguments:
+      policy (str): Order to convert files in; one of POLICIES
+          - sjf      : Shortest job first; by duration times resolution
+          - deadline : Earliest deadline first
+          - fifo     : In the order given
+      deadlines: dict of file path to deadline (e.g., time.time() value), or
+        function that returns deadline given file path. Files without a
+        deadline go last. Default is the file modification time; i.e.,
+        oldest file first
+      concurrency (int): Number of files to convert at the same time;
+        default is BATCH
+      callback: Function called as callback(path, converter, outFile) after
+        each file finishes; converter is the VideoConverter used
+      factory: Function, taking no arguments, that returns a new converter.
+        Default is to create one with the class and arguments recorded as
+        _initArgs in __init__; both VideoConverter and DVRconverter record
+        theirs. Subclasses with other arguments must record their own or
+        pass a factory, else a plain VideoConverter is used
+      **kwargs: Passed to transcode() for every file
+
+    Returns:
+      dict: Output file, or None/False if failed, keyed by input path
+
+    """
+
+    if policy not in POLICIES:
+      raise Exception( 'Unknown batch policy: {}'.format(policy) )
+    order = self._batchOrder( paths, policy, deadlines )
+    queue = deque( order )
+    lock  = Lock()
+    out   = {}
+
+    if factory is None:
+      cls, initKwargs = self._initArgs
+      factory = lambda: cls( **initKwargs )
+
+    def convert():
+      converter = factory()
+      while isRunning():
+        with lock:
+          if len(queue) == 0: return
+          path = queue.popleft()
+        try:
+          out[path] = converter.transcode( path, **kwargs )
+        except:
+          self.__log.exception( 'Failed to convert file: {}'.format(path) )
+          out[path] = None
+        if callback:
+          try:
+            callback( path, converter, out[path] )
+          except:
+            self.__log.exception( 'Error in callback for {}'.format(path) )
+
+    threads = [Thread( target = convert ) for i in range( min(concurrency or BATCH, len(order)) )]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return out
+
+  ################################################################################
+  def _batchOrder( self, paths, policy, deadlines = None ):
+    """
+    Probe files and sort them for transcode_many()
+
+    Arguments:
+      paths (list): Paths of files
+      policy (str): One of POLICIES
+
+    Keyword arguments:
+      deadlines: See transcode_many()
+
+    Returns:
+      list: Paths in the order they should be converted; files that could
+        not be probed are dropped
+
+    """
+
+    with ThreadPoolExecutor( max_workers = max(self.threads, 1) ) as pool:             # mediainfo is mostly waiting on disk
+      probes = dict( zip( paths, pool.map( probe, paths ) ) )
+    bad = [path for path in paths if probes[path] is None]
+    for path in bad:
+      self.__log.error( 'Failed to probe file, skipping: {}'.format(path) )
+    paths = [path for path in paths if probes[path] is not None]
+
+    if policy == 'sjf':
+      key = lambda path: probes[path][0] * probes[path][1]                              # Duration times height; proportional to encode work
+    elif policy == 'deadline':
+      if deadlines is None:
+        deadlines = os.path.getmtime
+      elif isinstance(deadlines, dict):
+        deadlines = deadlines.get
+      inf = float('inf')
+      key = lambda path: deadlines( path ) or inf
+    else:
+      return paths
+    return sorted( paths, key = key )                                                   # Sort is stable, so ties stay in given order
+
   ################################################################################
   def transcode( self, inFile,
         log_file          = None,
@@ -229,12 +439,26 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
       - 10 : No video OR no audio streams
 
     """
+
+    own = self.timeline.name is None                                                    # Else, part of a longer process; e.g., DVRconverter.convert()
+    if own: self.timeline = Timeline( inFile )
+    try:
+      with self.timeline.span( 'transcode' ):
+        return self._transcode( inFile, log_file, metaData, chapters, removeCommercials )
+    finally:
+      if own: self._saveTimeline()
+
+  ##############################################################################
+  def _transcode( self, inFile, log_file, metaData, chapters, removeCommercials ):
+    """Run all stages of transcode(); see that method for arguments"""
  
     if _sigtermEvent.is_set(): return False                                             # If _sigterm has been called, just quit
 
     _sigintEvent.clear()                                                                # Clear the 'global' kill event that may have been set by SIGINT
 
-    if not self.file_info( inFile, metaData = metaData ): return False                  # If there was an issue with the file_info function, just return
+    with self.timeline.span( 'file_info' ):
+      ok = self.file_info( inFile, metaData = metaData )
+    if not ok: return False                                                             # If there was an issue with the file_info function, just return
     self._init_logger( log_file )                                                       # Run method to initialize logging to file
     if self.video_info is None or self.audio_info is None:                              # If there is not video stream found OR no audio stream(s) found
       self.__log.critical('No video or no audio, transcode cancelled!')                 # Print log message
@@ -244,10 +468,12 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     start_time            = datetime.now()                                              # Set start date
     self.transcode_status = None                                                        # Reset transcode status to None
     self._createdFiles    = []                                                          # Reset created files list
+    self.renditionFiles   = []
 
     outFile   = '{}.{}'.format( self.outFile, self.container )                          # Set the output file path
     prog_file = self._inprogress_file( outFile )                                        # Get file name for inprogress conversion; maybe a previous conversion was cancelled
 
+    resume    = False                                                                   # Set if encode finished in a previous attempt
     self.__log.info( 'Output file: {}'.format( outFile ) )                              # Print the output file location
     if os.path.exists( outFile ):                                                       # IF the output file already exists
       if not os.path.exists( prog_file ):                                               # If the inprogress file does NOT exists, then conversion completed in previous attempt
@@ -256,10 +482,14 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
         if self.remove:
           self._cleanUp( self.inFile )                                                  # If remove is set, remove the source file
         self.chapterFile = self._cleanUp( self.chapterFile )
+        self.cutFile     = self._cleanUp( self.cutFile )
         return False;                                                                   # Return to halt the function
       elif self._being_converted( outFile ):                                            # Inprogress file exists, check if output file size is changing
         self.__log.info('It seems another process is creating the output file')         # The output file size is changing, so assume another process is interacting with it
         return False;
+      elif POPENPOOL.journal and POPENPOOL.journal.produced( outFile ):                  # Journal shows encode finished before the restart
+        self.__log.info( 'Output file finished in previous attempt; running remaining steps' )
+        resume = True
       else:
         msg  = 'It looks like there was a previous attempt to transcode ' + \
                'the file. Re-attempting transcode...' 
@@ -268,52 +498,49 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
 
     open(prog_file, 'a').close()                                                        # Touch inprogress file, acts as a kind of lock
 
-    if removeCommercials:                                                               # If the removeCommercials keywords is set
-      name = ''                                                                         # Default value for name keyword for removeCommercials method
-      if self.metaData is not None:                                                     # If metaData attribute is not None
-        if self.metaData.isEpisode:                                                     # If metaData for episode
-          name = str(self.metaData.Series)                                              # Get series information
-        else:                                                                           # Else
-          name = str(self.metaData)                                                     # Get movie information
-      if not self.removeCommercials( inFile, chapters = chapters, name = name ):        # Run the removeCommericals method
-        self.transcode_status = 5
-        if isRunning():
-          self.__log.error( 'Error cutting commercials, assuming bad file...' )
-          self._cleanUp( prog_file )
-        return None
-
-
-    self.ffmpeg_cmd = self._ffmpeg_command( outFile )                                   # Generate ffmpeg command list
-    self._createdFiles.append( outFile )                                                # Append outFile to list of created files
-
-    self.__log.info( 'Transcoding file...' )
-
-    progress = FFmpegProgress( nintervals = 10 )                                        # Initialize ffmpeg progress class
-    stderr   = RotatingFile( self.transcode_log, callback=progress.progress )
-    kwargs   = {'threads'            : self.threads,
-                'stderr'             : stderr,
-                'universal_newlines' : True}                                            # Initialzie keyword arguments from Popen_async method
-
-    self.__log.debug('ffmpeg cmd: {}'.format(' '.join(self.ffmpeg_cmd)))
-    try:
-      proc = POPENPOOL.Popen_async( self.ffmpeg_cmd, **kwargs )                         # Submit command to subprocess pool
-    except:
-      proc = None
+    # Stages that only read the source run at the same time; the encode waits
+    # for crop detection and commercial removal, subtitle extraction waits only
+    # for commercial removal (the cut changes timing) so it overlaps the encode
+    graph = TaskGraph()
+    if resume:                                                                          # File encoded in previous attempt
+      self.transcode_status = 0
+      self.renditionFiles   = [(file, h) for file, h in self._renditionFiles( outFile )
+                                 if os.path.isfile( file )]                             # Made by same command as outFile, so tagged too
+      if removeCommercials and not chapters and not self.vobsub:                        # Cut list was removed with previous attempt; run comskip again so subtitles are cut to match
+        graph.addTask( 'comremove', self._removeCommercials,
+            removeCommercials, chapters = chapters )
+      else:                                                                             # Subtitle timing not changed, or input file already cut
+        graph.addTask( 'comremove', lambda: None )
     else:
-      proc.wait()
+      graph.addTask( 'cropdetect', self._timed( 'cropdetect', cropdetect ),
+          self.inFile, priority = self.priority )                                       # Attempt to detect cropping
+      graph.addTask( 'comremove', self._removeCommercials, 
+          removeCommercials, chapters = chapters )
+      graph.addTask( 'encode', self._timed( 'encode', lambda: self._encode( outFile, graph.result('cropdetect') ) ),
+          after = ('cropdetect', 'comremove',) )
+    graph.addTask( 'subtitles', self._timed( 'subtitles', self.get_subtitles ),
+        after = ('comremove',) )                                                        # Extract subtitles
+    graph.run()
+
+    if graph.failed( 'comremove' ):
+      self.transcode_status = 5
+      if isRunning():
+        self.__log.error( 'Error cutting commercials, assuming bad file...' )
+        self._createdFiles = self._cleanUp( *self._createdFiles ) 
+        self._cleanUp( prog_file )
+      self.cutFile = self._cleanUp( self.cutFile )
+      return None
 
     self.chapterFile = self._cleanUp( self.chapterFile )                                # Clean up chapter file
-
-    try: 
-      self.transcode_status = proc.returncode                                           # Set transcode_status      
-    except:
-      self.transcode_status = -1
+    self.cutFile     = self._cleanUp( self.cutFile )                                    # Clean up cut list
 
     if self.transcode_status == 0:                                                      # If the transcode_status IS zero (0)
       self.__log.info( 'Transcode SUCCESSFUL!' )                                        # Print information
       if self.metaData:
-        self.metaData.writeTags( outFile )
-      self.get_subtitles( )                                                             # Extract subtitles
+        with self.timeline.span( 'writeTags' ):
+          self.metaData.writeTags( outFile )
+          for file, _ in self.renditionFiles:
+            self.metaData.writeTags( file )
 
       inSize  = os.stat(self.inFile).st_size;                                           # Size of inFile
       outSize = os.stat(outFile).st_size;                                               # Size of out_file
@@ -337,6 +564,468 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
 
     return outFile                                                              # Return output file from function, i.e., transcode was success
 
+  ##############################################################################
+  def _removeCommercials(self, remove, chapters = False):
+    """
+    Remove or mark commercials in the input file; run as task in transcode
+
+    Arguments:
+      remove (bool): Set to remove/mark commercials; if False, nothing done
+
+    Keyword arguments:
+      chapters (bool): Set to mark commercials with chapters instead of cutting
+
+    Returns:
+      None; raises exception if commercial removal failed
+
+    """
+
+    if not remove: return
+    name = ''                                                                           # Default value for name keyword for removeCommercials method
+    if self.metaData is not None:                                                       # If metaData attribute is not None
+      if self.metaData.isEpisode:                                                       # If metaData for episode
+        name = str(self.metaData.Series)                                                # Get series information
+      else:                                                                             # Else
+        name = str(self.metaData)                                                       # Get movie information
+    cutList = not self.vobsub                                                           # VobSub files cannot be shifted, so cut to new file for them
+    if not self.removeCommercials( self.inFile, chapters = chapters, name = name, cutList = cutList ):
+      raise Exception( 'comskip failed' )
+
+  ##############################################################################
+  def _encode(self, outFile, cropVals):
+    """
+    Run the ffmpeg encode; run as task in transcode
+
+    Arguments:
+      outFile (str): Full output file path
+      cropVals (str): Crop filter for video; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      None; sets transcode_status
+
+    """
+
+    self._createdFiles.append( outFile )                                                # Append outFile to list of created files
+    self.renditionFiles = self._renditionFiles( outFile )
+    if self.renditionFiles:                                                             # One command, so one decode, for all outputs
+      self._createdFiles.extend( [file for file, _ in self.renditionFiles] )
+      self.transcode_status = self._encodeSingle( outFile, cropVals )
+      return
+
+    if self.remux and cropVals is None:                                                 # Cannot crop without encoding
+      policy = self.get_policy( self.video_info, self.audio_info )
+      if policy != ENCODE:
+        self.transcode_status = self._encodeCopy( outFile, policy )
+        return
+
+    key = None
+    if self.cache:                                                                      # Key from settings before tuning, so tuning is skipped too
+      recipe = self._ffmpeg_command( outFile, cropVals ) + (['tune'] if self.tune else [])
+      key    = self.cache.key( self.inFile, recipe, outFile )
+      if self.cache.fetch( key, outFile ):
+        self.transcode_status = 0
+        return
+
+    if self.tune and not self._tunePreset( outFile, cropVals ):
+      self.transcode_status = -1
+    elif self.chunks > 1:
+      self.transcode_status = self._encodeChunked( outFile, cropVals )
+    elif self.checkpoint:
+      self.transcode_status = self._encodeCheckpointed( outFile, cropVals )
+    else:
+      self.transcode_status = self._encodeSingle( outFile, cropVals )
+
+    if key and self.transcode_status == 0:
+      self.cache.store( key, outFile )                                                  # Stored untagged, as tags are written on every fetch; copied, so tagging does not change it
+
+  ##############################################################################
+  def _encodeCopy(self, outFile, policy):
+    """
+    Copy video stream to output instead of encoding it
+
+    Arguments:
+      outFile (str): Full output file path
+      policy (str): COPY to select and label audio streams as for an encode,
+        or REMUX to copy all audio streams as they are
+
+    Keyword arguments:
+      None
+
+    Returns:
+      int: Zero (0) on success, non-zero otherwise
+
+    """
+
+    cmd = self._ffmpeg_base( encoderOpts = False )                                      # Streams are copied, so no encoder options
+    cmd += list( self.video_info['-map'] ) + ['-c:v', 'copy']
+    if policy == REMUX:
+      cmd += ['-map', '0:a', '-c:a', 'copy']
+    else:
+      for key in self._audioKeys():
+        cmd.extend( self.audio_info[key] )
+    cmd.append( outFile )
+    self.ffmpeg_cmd = cmd
+
+    self.__log.info( 'Source video meets target; {} instead of transcoding...'.format(
+      'remuxing' if policy == REMUX else 'copying video') )
+    self.__log.debug('ffmpeg cmd: {}'.format(' '.join(cmd)))
+    stderr = RotatingFile( self.transcode_log )
+    proc   = POPENPOOL.Popen_async( cmd, priority = self.priority, stderr = stderr,
+               universal_newlines = True, outputs = [outFile] )
+    proc.wait()
+    return proc.returncode
+
+  ##############################################################################
+  def _encodeSingle(self, outFile, cropVals):
+    """
+    Encode video and copy audio in one ffmpeg command
+
+    Arguments:
+      outFile (str): Full output file path
+      cropVals (str): Crop filter for video; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      int: Zero (0) on success, non-zero otherwise
+
+    """
+
+    if self.renditionFiles:
+      self.ffmpeg_cmd = self._rendition_command( outFile, cropVals )
+    else:
+      self.ffmpeg_cmd = self._ffmpeg_command( outFile, cropVals )                       # Generate ffmpeg command list
+
+    self.__log.info( 'Transcoding file...' )
+
+    stdout   = self._progressPipe( self._duration() )
+    stderr   = RotatingFile( self.transcode_log )
+    height, encoder = self.video_info['file_info']                                      # Resolution and encoder; e.g., ['1080p', 'x264']
+    memory   = estimateMemory( int(height[:-1]), encoder, self.v_preset )
+    memory  += sum( estimateMemory( h, 'x264', self.v_preset ) for _, h in self.renditionFiles )
+    kwargs   = {'threads'            : self.threads,
+                'priority'           : self.priority,
+                'memory'             : memory,                                          # Pool waits for this much free memory
+                'stdout'             : stdout,
+                'stderr'             : stderr,
+                'outputs'            : [outFile] + [file for file, _ in self.renditionFiles], # Recorded in pool journal, if any, so a restart can resume
+                'universal_newlines' : True}                                            # Initialzie keyword arguments from Popen_async method
+
+    self.__log.debug('ffmpeg cmd: {}'.format(' '.join(self.ffmpeg_cmd)))
+    try:
+      cmd  = self.ffmpeg_cmd[:1] + PROGRESS + self.ffmpeg_cmd[1:]                       # Progress options kept out of ffmpeg_cmd; do not change output
+      proc = POPENPOOL.Popen_async( cmd, **kwargs )                                     # Submit command to subprocess pool
+    except:
+      proc = None
+    else:
+      proc.wait()
+
+    try: 
+      return proc.returncode
+    except:
+      return -1
+
+  ##############################################################################
+  def _encodeChunked(self, outFile, cropVals):
+    """
+    Encode the video in segments at the same time; run in place of single encode
+
+    The video stream is split at keyframes into `chunks` segments, which are
+    encoded with the same settings through the POPENPOOL, each using its
+    share of the threads. The encoded segments are joined without
+    re-encoding, and muxed with the audio and chapters of the source.
+    Segments are kept in a directory next to the output file until done, so
+    that an interrupted encode only redoes unfinished segments when the pool
+    has a journal.
+
+    Arguments:
+      outFile (str): Full output file path
+      cropVals (str): Crop filter for video; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      int: Zero (0) on success, non-zero otherwise
+
+    """
+
+    chunkDir = '{}.chunks'.format( os.path.splitext(outFile)[0] )
+    self.__log.info( 'Splitting video into {} segments...'.format(self.chunks) )
+    segments = splitKeyframes( self.inFile, chunkDir, self.chunks,
+                 stream = self.video_info['-map'][1], priority = self.priority,
+                 inputOpts = self._inputArgs(), duration = self._duration() )
+    if not segments:
+      return self._chunkCleanUp( chunkDir, 1 )
+
+    nSeg            = len(segments)
+    threads         = max( self.threads // nSeg, 1 )                                    # Segments share the threads
+    height, encoder = self.video_info['file_info']
+    memory          = estimateMemory( int(height[:-1]), encoder, self.v_preset )
+    opts            = self._videoOpts( cropVals )
+    self.__log.info( 'Transcoding {} segments, {} thread(s) each...'.format(nSeg, threads) )
+    procs   = []
+    encoded = []
+    for i, seg in enumerate( segments ):
+      encFile = '{}.enc.mkv'.format( os.path.splitext(seg)[0] )
+      cmd     = ['ffmpeg', '-nostdin', '-y', '-v', 'error', '-i', seg]
+      cmd    += ['-map', '0:v:0', '-threads', str(threads)] + opts + [encFile]
+      proc    = POPENPOOL.Popen_async( cmd, threads = threads, priority = self.priority,
+                  memory = memory, outputs = [encFile] )
+      proc.addDoneCallback( lambda p, i=i: self.__log.info(
+                  'Segment {} of {} finished; return code {}'.format(i+1, nSeg, p.returncode) ) )
+      procs.append( proc )
+      encoded.append( encFile )
+    for proc in procs: proc.wait()
+    failed = [proc.returncode for proc in procs if proc.returncode != 0]
+    if failed:
+      self.__log.error( '{} segment(s) failed to transcode'.format(len(failed)) )
+      return self._chunkCleanUp( chunkDir, failed[0] )
+
+    videoFile = os.path.join( chunkDir, 'video.mkv' )
+    if not concatSegments( videoFile, encoded, priority = self.priority ):
+      self.__log.error( 'Failed to join transcoded segments' )
+      return self._chunkCleanUp( chunkDir, 1 )
+
+    self.ffmpeg_cmd = self._mux_command( outFile, videoFile )
+    self.__log.debug('ffmpeg cmd: {}'.format(' '.join(self.ffmpeg_cmd)))
+    stderr = RotatingFile( self.transcode_log )
+    proc   = POPENPOOL.Popen_async( self.ffmpeg_cmd, priority = self.priority,
+               stderr = stderr, universal_newlines = True, outputs = [outFile] )
+    proc.wait()
+    return self._chunkCleanUp( chunkDir, proc.returncode )
+
+  ##############################################################################
+  def _encodeCheckpointed(self, outFile, cropVals):
+    """
+    Encode video as segments that survive interruption, then mux with audio
+
+    The encoder writes closed GOPs with a keyframe forced every `checkpoint`
+    seconds, and the segment muxer closes a segment at each one and adds it
+    to a csv list. A manifest in the segment directory records the settings
+    and the list written by each attempt. If the encode is interrupted, the
+    next attempt with the same source and settings seeks to the end of the
+    last listed segment and continues from there; otherwise, the segments
+    are discarded and the encode starts over.
+
+    Arguments:
+      outFile (str): Full output file path
+      cropVals (str): Crop filter for video; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      int: Zero (0) on success, non-zero otherwise
+
+    """
+
+    segDir   = '{}.segments'.format( os.path.splitext(outFile)[0] )
+    manifest = os.path.join( segDir, 'manifest.json' )
+    opts     = self._videoOpts( cropVals )
+    opts    += ['-flags', '+cgop', '-force_key_frames', 'expr:gte(t,n_forced*{})'.format(self.checkpoint)]
+    st       = os.stat( self.inFile )
+    settings = {'source'     : [self.inFile, st.st_size, st.st_mtime_ns],
+                'cut'        : readCutList( self.cutFile ) if os.path.isfile( self.cutFile ) else None,
+                'options'    : opts,
+                'checkpoint' : self.checkpoint}
+
+    state = None
+    try:
+      with open(manifest, 'r') as fid:
+        state = json.load( fid )
+    except:
+      pass
+    if state is None or state.get('settings') != json.loads( json.dumps(settings) ):    # Compare as stored in JSON; e.g., tuples become lists
+      if os.path.isdir( segDir ):
+        self.__log.info( 'Discarding segments from previous attempt with different settings' )
+        shutil.rmtree( segDir, ignore_errors = True )
+      state = {'settings' : settings, 'lists' : [], 'complete' : False}
+
+    files = []                                                                          # Finished segments from previous attempts
+    start = 0.0                                                                         # Time in source after last finished segment
+    for listName, offset in state['lists']:
+      for path, _, end in readSegmentList( os.path.join(segDir, listName) ):
+        files.append( path )
+        start = offset + end
+
+    if state['complete']:
+      self.__log.info( 'Encode finished in previous attempt; joining segments' )
+    else:
+      if files:
+        self.__log.info( 'Resuming encode at {} after {} finished segment(s)'.format(
+          timedelta(seconds = int(start)), len(files)) )
+      listName = 'segments_{:03d}.csv'.format( len(state['lists']) )
+      state['lists'].append( (listName, start) )
+      self._writeManifest( manifest, state )
+
+      height, encoder = self.video_info['file_info']
+      cmd  = ['ffmpeg', '-nostdin', '-y']
+      if start > 0.0: cmd += ['-ss', '{:0.6f}'.format(start)]                           # Accurate seek; frames before start are decoded, not encoded
+      cmd += self._inputArgs()
+      cmd += ['-map', self.video_info['-map'][1], '-threads', str(self.threads)] + opts
+      cmd += ['-f', 'segment', '-segment_format', 'matroska', '-reset_timestamps', '1']
+      cmd += ['-segment_time', str(self.checkpoint), '-segment_start_number', str(len(files))]
+      cmd += ['-segment_list', os.path.join( segDir, listName ), '-segment_list_type', 'csv']
+      cmd += [os.path.join( segDir, 'segment_%05d.mkv' )]
+      self.ffmpeg_cmd = cmd
+
+      self.__log.info( 'Transcoding file...' )
+      self.__log.debug('ffmpeg cmd: {}'.format(' '.join(cmd)))
+      stdout   = self._progressPipe( max( self._duration() - start, 0.0 ) )
+      stderr   = RotatingFile( self.transcode_log )
+      proc     = POPENPOOL.Popen_async( cmd[:1] + PROGRESS + cmd[1:], threads = self.threads,
+                   priority = self.priority,
+                   memory = estimateMemory( int(height[:-1]), encoder, self.v_preset ),
+                   stdout = stdout, stderr = stderr, universal_newlines = True )
+      proc.wait()
+      if proc.returncode != 0:
+        return self._chunkCleanUp( segDir, proc.returncode )                            # Segments kept if interrupted
+
+      files += [path for path, _, _ in readSegmentList( os.path.join(segDir, listName) )]
+      state['complete'] = True                                                          # Only the join and mux are left
+      self._writeManifest( manifest, state )
+
+    videoFile = os.path.join( segDir, 'video.mkv' )
+    if not concatSegments( videoFile, files, priority = self.priority ):
+      self.__log.error( 'Failed to join transcoded segments' )
+      return self._chunkCleanUp( segDir, 1 )
+
+    self.ffmpeg_cmd = self._mux_command( outFile, videoFile )
+    self.__log.debug('ffmpeg cmd: {}'.format(' '.join(self.ffmpeg_cmd)))
+    stderr = RotatingFile( self.transcode_log )
+    proc   = POPENPOOL.Popen_async( self.ffmpeg_cmd, priority = self.priority,
+               stderr = stderr, universal_newlines = True, outputs = [outFile] )
+    proc.wait()
+    return self._chunkCleanUp( segDir, proc.returncode )
+
+  ##############################################################################
+  def _writeManifest(self, manifest, state):
+    """Write segment manifest; done through temporary file so it is never left half written"""
+
+    os.makedirs( os.path.dirname(manifest), exist_ok = True )
+    with open(manifest + '.tmp', 'w') as fid:
+      json.dump( state, fid )
+    os.replace( manifest + '.tmp', manifest )
+
+  ##############################################################################
+  def _tunePreset(self, outFile, cropVals):
+    """
+    Choose encoder preset from sample encodes and check output fits on disk
+
+    Sets the -preset option in video_info and the v_preset attribute. If
+    sampling fails, the current preset is kept.
+
+    Arguments:
+      outFile (str): Full output file path
+      cropVals (str): Crop filter for video; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      bool: False if predicted output size is larger than free disk space
+
+    """
+
+    tuner  = PresetTuner( self.inFile, self._videoOpts( cropVals ), self._duration(),
+               threads  = self.threads,
+               mapping  = self.video_info['-map'][1],
+               priority = self.priority,
+               workDir  = '{}.tune'.format( os.path.splitext(outFile)[0] ) )
+    tuner.calibrate()
+    preset = tuner.choose()
+    if preset is None:
+      self.__log.warning( 'Preset tuning failed; using preset {}'.format(self.v_preset) )
+      return True
+
+    self.v_preset = preset
+    opts = self.video_info['-opts']
+    opts[ opts.index('-preset')+1 ] = preset
+    size, seconds = tuner.estimate( preset )
+    self.__log.info( 'Predicted output: {:0.1f} MB in {}'.format(
+      size / 1024**2, timedelta(seconds = int(seconds)) ) )
+    free = shutil.disk_usage( os.path.dirname( os.path.abspath(outFile) ) ).free
+    if size > free:
+      self.__log.error( 'Not enough disk space for output; {:0.1f} MB free'.format(free / 1024**2) )
+      return False
+    return True
+
+  ##############################################################################
+  def _duration(self):
+    """Length, in seconds, of the video that is encoded; i.e., without commercials if cut list exists"""
+
+    if self.cutFile and os.path.isfile( self.cutFile ):
+      total = None
+      segs  = readCutList( self.cutFile )
+      if segs and segs[-1][1] is None: total = getVideoLength( self.inFile )
+      return sum( (end or total) - start for start, end in segs )
+    return getVideoLength( self.inFile )
+
+  ##############################################################################
+  def _progressPipe(self, duration = None):
+    """
+    Create stdout for an ffmpeg command with PROGRESS options
+
+    Estimated completion time is logged from each update, and each update is
+    also passed to the progress callbacks.
+
+    Arguments:
+      None
+
+    Keyword arguments:
+      duration (float): Length, in seconds, of the output
+
+    Returns:
+      ProgressPipe: Use as stdout of the ffmpeg command
+
+    """
+
+    logger = FFmpegProgress( nintervals = 10 )
+    return ProgressPipe( duration, [logger.update] + self.progressCallbacks )
+
+  ##############################################################################
+  def _timed(self, name, func):
+    """Wrap func so that each call is a span of the timeline; e.g., for TaskGraph tasks"""
+
+    def timed(*args, **kwargs):
+      with self.timeline.span( name ):
+        return func( *args, **kwargs )
+    return timed
+
+  ##############################################################################
+  def _saveTimeline(self):
+    """
+    Log stage times and write timeline of current file; starts a new timeline
+
+    The JSON timeline, and Chrome trace if trace is set, are written to the
+    'timelines' directory next to the transcode log, named after the input
+    file.
+
+    """
+
+    timeline      = self.timeline
+    self.timeline = Timeline()
+    if timeline.name is None or len(timeline.spans) == 0: return
+    self.__log.info( 'Stage times: {}'.format( timeline.summary() ) )
+    base = os.path.splitext( os.path.basename( timeline.name ) )[0]
+    base = os.path.join( os.path.dirname( self.transcode_log ), 'timelines', base )
+    timeline.save( base + '.timeline.json' )
+    if self.trace:
+      timeline.saveTrace( base + '.trace.json' )
+
+  ##############################################################################
+  def _chunkCleanUp(self, chunkDir, status):
+    """Remove segments unless interrupted, so they can be reused; returns status"""
+
+    if isRunning() and os.path.isdir( chunkDir ):
+      shutil.rmtree( chunkDir, ignore_errors = True )
+    return status
+
   ##############################################################################
   def file_info( self, inFile, metaData = None):
     """
@@ -358,7 +1047,8 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     self.__log.info('Setting up some file information...');
 
     # Set up file/directory information
-    self.inFile  = inFile if os.path.exists( inFile ) else None;                        # Set the inFile attribute for the class to the file input IF it exists, else, set the inFile to None
+    with self.timeline.span( 'mediainfo' ):
+      self.inFile = inFile if os.path.exists( inFile ) else None;                       # Set the inFile attribute for the class to the file input IF it exists, else, set the inFile to None
     if self.inFile is None:                                                             # IF the input file does NOT exist
       self.__log.info( 'File requested does NOT exist. Exitting...' );
       self.__log.info( '   {}'.format(inFile) )
@@ -366,13 +1056,21 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
 
     self.__log.info( 'Input file: {}'.format( self.inFile ) )                           # Print out the path to the input file
     self.chapterFile = os.path.splitext( self.inFile )[0] + '.chap'                     # Set chapter file name; same name as source file, but with .chap extension; should be generated by comremove.comchapters()
+    self.cutFile     = os.path.splitext( self.inFile )[0] + '.cut.ffconcat'             # Set cut list name; should be generated by comremove.comcutlist()
 
     self.__log.info('Getting video, audio, information...');                            # If verbose is set, print some output
 
-    self.video_info = self.get_video_info( x265 = self.x265 )                           # Get and parse video information from the file
+    graph = TaskGraph()                                                                 # Metadata lookup is network bound, so run while parsing stream info
+    graph.addTask( 'video', self.get_video_info, x265 = self.x265 )                     # Get and parse video information from the file
+    graph.addTask( 'audio', self.get_audio_info, self.lang )                            # Get and parse audio information from the file
+    if metaData is None:                                                                # If metaData is None
+      graph.addTask( 'metadata', self._timed( 'getMetaData', getMetaData ), self.inFile ) # Try to get metaData
+    graph.run()
+
+    self.video_info = graph.result( 'video' )
     if self.video_info is None:
       return 
-    self.audio_info = self.get_audio_info( self.lang )                                  # Get and parse audio information from the file
+    self.audio_info = graph.result( 'audio' )
     if self.audio_info is None:
       return
 
@@ -381,13 +1079,10 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     else:                                                                               # Else, set outDir to self.outDir
       outDir = self.outDir                                                              # Set outDir to self.outDir
 
-    if metaData is None:                                                                # If metaData is None
-      self.metaData = getMetaData( self.inFile )                                        # Try to get metaData
-    else:
-      self.metaData = metaData
+    self.metaData = graph.result( 'metadata' ) if metaData is None else metaData
 
     if self.metaData:                                                                   # If metaData is valid
-      metaData.addComment( 
+      self.metaData.addComment( 
         'File converted and tagged using {} version {}'.format(
           __pkg_name__, __pkg_version__
         )
@@ -402,6 +1097,7 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
       os.makedirs( outDir )
 
     outFile      = os.path.join( outDir, outFile )                                      # Create full path to output file; no extension
+    self.outBase = outFile                                                              # Without stream information; for rendition names
     extraInfo    = self.video_info['file_info'] + self.audio_info['file_info']
     self.outFile = '.'.join( [outFile] + extraInfo ) 
     return True 
@@ -446,15 +1142,16 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     def opensubs_all():
       '''Local function to download all subtitles from opensubtitles'''
       self.__log.info('Attempting opensubtitles.org search...')                         # Logging information
-      self.login()                                                                      # Login to the opensubtitles.org API
-      self.searchSubs()                                                                 # Search for subtitles
-      if (self.subs is not None):                                                       # If no subtitles are found
-        found = 0;                                                                      # Initialize found to zero (0)
-        for lang in self.subs:                                                          # Iterate over all languages in the sub titles dictionary
-          if self.subs[lang] is not None: found+=1                                      # If one of the keys under that language is NOT None, then increment found
-        if (found > 0):                                                                 # If found is greater than zero (0), then subtitles were found
-          self.saveSRT( self.outFile )                                                  # Download the subtitles
-      self.logout()                                                                     # Log out of the opensubtitles.org API
+      with self.timeline.span( 'opensubtitles' ):
+        self.login()                                                                    # Login to the opensubtitles.org API
+        self.searchSubs()                                                               # Search for subtitles
+        if (self.subs is not None):                                                     # If no subtitles are found
+          found = 0;                                                                    # Initialize found to zero (0)
+          for lang in self.subs:                                                        # Iterate over all languages in the sub titles dictionary
+            if self.subs[lang] is not None: found+=1                                    # If one of the keys under that language is NOT None, then increment found
+          if (found > 0):                                                               # If found is greater than zero (0), then subtitles were found
+            self.saveSRT( self.outFile )                                                # Download the subtitles
+        self.logout()                                                                   # Log out of the opensubtitles.org API
 
     ######
     if (not self.vobsub) and (not self.srt):                                            # If both vobsub AND srt are False
@@ -467,7 +1164,9 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     elif self.vobsub or self.srt:                                                       # Else, if vobsub or srt is set
       if self.format == "MPEG-TS":                                                      # If the input file format is MPEG-TS, then must use CCExtractor
         if ccextract.CLI:                                                               # If the ccextract function import successfully
-          status = ccextract.ccextract( self.inFile, self.outFile, self.text_info )     # Run ccextractor
+          with self.timeline.span( 'ccextract' ):
+            status = ccextract.ccextract( self.inFile, self.outFile, self.text_info )   # Run ccextractor
+          if status: self._cutSRT( self.outFile + self.text_info[0]['ext'] + '.srt' )
         else:
           self.__log.warning('ccextractor failed to import, falling back to opensubtitles.org');
           opensubs_all()                                                                # Run local function
@@ -478,36 +1177,41 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
             self.__log.info('Falling back to opensubtitles.org for SRT files')
             opensubs_all()                                                              # Run local function
         else:
-          self.vobsub_status, vobsub_files = vobsub_extract.vobsub_extract( 
-            self.inFile, self.outFile, self.text_info, 
-            vobsub = self.vobsub,
-            srt    = self.srt )                                                         # Extract VobSub(s) from the input file and convert to SRT file(s).
+          with self.timeline.span( 'vobsub_extract' ):
+            self.vobsub_status, vobsub_files = vobsub_extract.vobsub_extract( 
+              self.inFile, self.outFile, self.text_info, 
+              vobsub = self.vobsub,
+              srt    = self.srt )                                                       # Extract VobSub(s) from the input file and convert to SRT file(s).
           self._createdFiles.extend( vobsub_files )                                     # Add list of files created by vobsub_extract to list of created files
           if (self.vobsub_status < 2) and self.srt:                                     # If there weren't nay major errors in the vobsub extraction
             if not vobsub_to_srt.CLI:                                                   # If SRT output is enabled AND vobsub_to_srt imported correctly
               self.__log.warning('vobsub2srt conversion not possible. Leaving vobsub files.')
             else:
-              self.srt_status, srt_files = vobsub_to_srt.vobsub_to_srt(   
-                self.outFile, self.text_info,   
-                vobsub_delete = self.vobsub_delete,   
-                cpulimit      = self.cpulimit,   
-                threads       = self.threads )                                  # Convert vobsub to SRT files
+              with self.timeline.span( 'vobsub_to_srt' ):
+                self.srt_status, srt_files = vobsub_to_srt.vobsub_to_srt(   
+                  self.outFile, self.text_info,   
+                  vobsub_delete = self.vobsub_delete,   
+                  cpulimit      = self.cpulimit,   
+                  threads       = self.threads,
+                  priority      = self.priority )                               # Convert vobsub to SRT files
               self._createdFiles.extend( srt_files )
+              self._cutSRT( *srt_files )
             failed = [i for i in self.text_info if i['srt'] is False];		# Check for missing srt files
             if len(failed) > 0:							# If missing files found
               self.__log.info('Attempting opensubtitles.org search...')         # Logging information
-              self.login()							# Log into opensubtitles
-              for i in range(len(self.text_info)):				# Iterate over all entries in text_info
-                if self.text_info[i]['srt']: continue;				# If the srt file exists, skip
-                self.track_num  = self.text_info[i]['track']
-                self.get_forced = self.text_info[i]['forced']
-                self.searchSubs( lang = self.text_info[i]['lang3'] )		# Search for subtitles, use lang keyword to override class attribute; do so won't erase self.lang
-                tmpOut = self.saveSRT( file = self.outFile )			# Save subtitles, note that this may not actually work if noting was found
-                if tmpOut and (len(tmpOut) == 1):
-                  if os.path.isfile(tmpOut[0]):					# If the subtitle file exists
-                    self.text_info[i]['srt'] = True				# update the srt presence flag
-                    self._createdFiles.extend( tmpOut )				# Add subtitle file to list of created files
-              self.logout()						        # Log out to of opensubtitles
+              with self.timeline.span( 'opensubtitles' ):
+                self.login()							# Log into opensubtitles
+                for i in range(len(self.text_info)):				# Iterate over all entries in text_info
+                  if self.text_info[i]['srt']: continue;				# If the srt file exists, skip
+                  self.track_num  = self.text_info[i]['track']
+                  self.get_forced = self.text_info[i]['forced']
+                  self.searchSubs( lang = self.text_info[i]['lang3'] )		# Search for subtitles, use lang keyword to override class attribute; do so won't erase self.lang
+                  tmpOut = self.saveSRT( file = self.outFile )			# Save subtitles, note that this may not actually work if noting was found
+                  if tmpOut and (len(tmpOut) == 1):
+                    if os.path.isfile(tmpOut[0]):					# If the subtitle file exists
+                      self.text_info[i]['srt'] = True				# update the srt presence flag
+                      self._createdFiles.extend( tmpOut )				# Add subtitle file to list of created files
+                self.logout()						        # Log out to of opensubtitles
     else:                                                                       # Else, not subtitle candidates were returned
       self.__log.debug('No subtitle options set')                               # Log some information
 
@@ -525,12 +1229,13 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     return None
 
   ##############################################################################
-  def _ffmpeg_command(self, outFile): 
+  def _ffmpeg_command(self, outFile, cropVals = None): 
     """
     A method to generate full ffmpeg command list
 
     Arguments:
       outFile (str): Full output file path that ffmpeg will create
+      cropVals (str): Crop filter from cropdetect; None for no cropping
 
     Keyword arguments:
       None
@@ -542,7 +1247,6 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
 
     cmd = self._ffmpeg_base( )                                                  # Call method to generate base command for ffmpeg
 
-    cropVals  = cropdetect( self.inFile, threads = self.threads )               # Attempt to detect cropping
     videoKeys = self._videoKeys();                                              # Generator for orderer keys in video_info
     audioKeys = self._audioKeys();                                              # Generator for orderer keys in audio_info
     avOpts    = [True, True];                                                   # Booleans for if all av options have been parsed
@@ -574,9 +1278,99 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
     return cmd
 
   ##############################################################################
-  def _ffmpeg_base(self, strict = 'experimental',
+  def _videoOpts(self, cropVals = None):
+    """
+    Return video filter and codec options, without stream mapping
+
+    Arguments:
+      None
+
+    Keyword arguments:
+      cropVals (str): Crop filter from cropdetect; None for no cropping
+
+    Returns:
+      list: ffmpeg options
+
+    """
+
+    opts   = list( self.video_info['-filter'] )
+    if cropVals is not None:
+      if len(opts) != 0:
+        opts[-1] = '{},{}'.format(opts[-1], cropVals)                           # Add cropping to video filter
+      else:
+        opts = ['-vf', cropVals]
+    opts  += list( TUNE )                                                       # Same as _ffmpeg_base
+    return opts + list( self.video_info['-opts'] )
+
+  ##############################################################################
+  def _mux_command(self, outFile, videoFile, strict = 'experimental',
        max_muxing_queue_size = 2048):
     """
+    Generate ffmpeg command to mux encoded video with audio and chapters of source
+
+    Arguments:
+      outFile (str): Full output file path that ffmpeg will create
+      videoFile (str): File with encoded video stream
+
+    Keyword arguments:
+      strict (str): See _ffmpeg_base()
+      max_muxing_queue_size (int): See _ffmpeg_base()
+
+    Returns:
+      list: Full ffmpeg command to run
+
+    """
+
+    cmd  = ['ffmpeg', '-nostdin', '-i', videoFile] + self._inputArgs()
+    if os.path.isfile(self.chapterFile):                                        # If the chapter file exits
+      self.__log.info( 'Adding chapters from file : {}'.format(self.chapterFile) )
+      cmd += ['-i', self.chapterFile, '-map_metadata', '2']
+    else:
+      cmd += ['-map_metadata', '1', '-map_chapters', '1']                       # Metadata and chapters from source file
+    cmd += ['-f', self.container, '-strict', strict]
+    cmd += ['-max_muxing_queue_size', str(max_muxing_queue_size)]
+    cmd += ['-map', '0:v:0', '-c:v', 'copy']
+    for key in self._audioKeys():
+      opts = list( self.audio_info[key] )
+      if key == '-map':                                                         # Audio streams now come from second input
+        opts = [re.sub( r'^0:', '1:', opt ) for opt in opts]
+      cmd.extend( opts )
+    cmd.append( outFile )
+    return cmd
+
+  ##############################################################################
+  def _inputArgs(self):
+    """
+    Return ffmpeg input options for the source file
+
+    If commercials were marked in a cut list (see ComRemove.comcutlist), the
+    source is read through the concat demuxer so that commercials are skipped
+    while decoding and no cut copy of the file is written.
+
+    Returns:
+      list: Input options for ffmpeg
+
+    """
+
+    if self.cutFile and os.path.isfile( self.cutFile ):
+      return ['-f', 'concat', '-safe', '0', '-i', self.cutFile]
+    return ['-i', self.inFile]
+
+  ##############################################################################
+  def _cutSRT(self, *files):
+    """Remove commercials from SRT files made from uncut source; no-op if no cut list"""
+
+    if not (self.cutFile and os.path.isfile( self.cutFile )): return
+    segments = readCutList( self.cutFile )
+    for file in files:
+      if file.endswith('.srt') and os.path.isfile( file ):
+        self.__log.debug( 'Removing commercials from subtitles: {}'.format(file) )
+        srtCut( file, segments )
+
+  ##############################################################################
+  def _ffmpeg_base(self, strict = 'experimental',
+       max_muxing_queue_size = 2048, encoderOpts = True):
+    """
     A method to generate basic ffmpeg command
 
     Arguments:
@@ -591,24 +1385,96 @@ class VideoConverter( ComRemove, MediaInfo, OpenSubtitles ):
           - ‘unofficial’ : allow unofficial extensions 
           - ‘experimental’ : allow non standardized experimental things, experimental (unfinished/work in progress/not well tested) decoders and encoders. Note: experimental decoders can pose a security risk, do not use this for decoding untrusted input. 
       max_muxing_queue_size (int): Should not have to change; see https://trac.ffmpeg.org/ticket/6375
+      encoderOpts (bool): Include encoder options (TUNE); set False when
+        all streams are copied
 
     Returns:
       List containing base ffmpeg command for converting
 
     """
 
-    cmd  = ['ffmpeg', '-nostdin', '-i', self.inFile]
+    cmd  = ['ffmpeg', '-nostdin'] + self._inputArgs()
     if os.path.isfile(self.chapterFile):                                        # If the chapter file exits
       self.__log.info( 'Adding chapters from file : {}'.format(self.chapterFile) )
-      cmd += ['-i', self.chapterFile, '-map_metadata', '1']                     # Append to command and set meta data mapping from file
+      cmd += ['-i', self.chapterFile]
+    return cmd + self._outputOpts( strict, max_muxing_queue_size, encoderOpts )
+
+  ##############################################################################
+  def _outputOpts(self, strict = 'experimental', max_muxing_queue_size = 2048,
+       encoderOpts = True):
+    """
+    Options that apply to each output file; see _ffmpeg_base() for keywords
+
+    Returns:
+      list: ffmpeg options
+
+    """
+
+    if os.path.isfile(self.chapterFile):                                        # If the chapter file exits
+      opts = ['-map_metadata', '1']                                             # Set meta data mapping from file
     else:
-      cmd += ['-map_chapters', '0']                                             # Else, enable mapping of chapters from source file
+      opts = ['-map_chapters', '0']                                             # Else, enable mapping of chapters from source file
 
-    cmd += ['-tune', 'zerolatency']                                             # Enable faster streaming
-    cmd += ['-f', self.container, '-threads', str(self.threads)]                # Set container and number of threads to use
-    cmd += ['-strict', strict]
-    cmd += ['-max_muxing_queue_size', str(max_muxing_queue_size)]
-    return cmd                                                                  # Return command
+    if encoderOpts:
+      opts += list( TUNE )                                                      # Enable faster streaming
+    opts += ['-f', self.container, '-threads', str(self.threads)]               # Set container and number of threads to use
+    opts += ['-strict', strict]
+    opts += ['-max_muxing_queue_size', str(max_muxing_queue_size)]
+    return opts
+
+  ##############################################################################
+  def _renditionFiles(self, outFile):
+    """Return (path, height) of each rendition to create, named like outFile"""
+
+    height = int( self.video_info['file_info'][0][:-1] )
+    files  = []
+    for h in self.renditions:
+      if h >= height: continue
+      info = ['{}p'.format(h), 'x264'] + self.audio_info['file_info']
+      files.append( ('.'.join( [self.outBase] + info + [self.container] ), h) )
+    return files
+
+  ##############################################################################
+  def _rendition_command(self, outFile, cropVals = None):
+    """
+    Generate ffmpeg command that writes main output and all renditions
+
+    The source is decoded and filtered once, then split to the main encoder
+    and to a scale filter and x264 encoder for each rendition. Audio is
+    copied into every output.
+
+    Arguments:
+      outFile (str): Full output file path that ffmpeg will create
+      cropVals (str): Crop filter from cropdetect; None for no cropping
+
+    Keyword arguments:
+      None
+
+    Returns:
+      list: Full ffmpeg command to run
+
+    """
+
+    audio = []
+    for key in self._audioKeys():
+      audio.extend( self.audio_info[key] )
+
+    filters = self.video_info['-filter'][1:] + ([cropVals] if cropVals else [])        # Drop the '-vf'
+    nOut    = len(self.renditionFiles) + 1
+    graph   = '[{}]'.format( self.video_info['-map'][1] )
+    graph  += ''.join( f + ',' for f in filters )
+    graph  += 'split={}[v0]'.format( nOut ) + ''.join( '[s{}]'.format(i) for i in range(1, nOut) )
+    for i, (_, h) in enumerate( self.renditionFiles, 1 ):
+      graph += ';[s{}]scale=-2:{}[v{}]'.format( i, h, i )                               # Width keeps aspect ratio; must be even
+
+    cmd  = self._ffmpeg_base() + ['-filter_complex', graph]
+    cmd += ['-map', '[v0]'] + self.video_info['-opts'] + audio + [outFile]
+    for i, (file, h) in enumerate( self.renditionFiles, 1 ):
+      crf  = CRF[ min( [r for r in CRF if r >= h] or [max(CRF)] ) ]
+      cmd += ['-map', '[v{}]'.format(i), '-c:v', 'libx264', '-preset', self.v_preset]
+      cmd += ['-profile:v', 'high', '-level', '4.0', '-crf', str(crf)]
+      cmd += self._outputOpts() + audio + [file]
+    return cmd
 
   ##############################################################################
   def _videoKeys(self):